@@ -69,10 +69,20 @@ class DataProcessingConfig(ComponentConfig):
     Args:
         data_reader_config (UtilityClassConfig): The data reader config to be used with this component
         output_data_columns (list): List of columns (subset of input columns) to keep in the transformed data output file
+        output_format (str): Optional. Format of the transformed data output file, "jsonl" (default), "parquet" or
+            "arrow". Readers and data loaders configured with the path of transformed_data.jsonl load the parquet or
+            arrow file instead
+        jsonl_side_output (bool): Optional. If True, transformed_data.jsonl is also written when the output format is
+            parquet or arrow, for inspection
+        chunk_size (int): Optional. If set, the DataProcessing component reads, transforms and writes the data chunk
+            by chunk of this many input rows, for datasets that do not fit in memory once transformed
     """
 
     data_reader_config: UtilityClassConfigType = None
     output_data_columns: List[str] = None
+    output_format: str = "jsonl"
+    jsonl_side_output: bool = False
+    chunk_size: int = None
 
 
 @dataclass
@@ -106,6 +116,21 @@ class InferenceConfig(ComponentConfig):
         data_loader_config (UtilityClassConfig): The data loader config to be used with this component
         model_config (UtilityClassConfig): The model config to be used with this component
         resume_from (str): Optional. Path to the file where previous inference results are stored
+        new_columns (list): Optional. List of new columns to be added to resume_from data to match the current inference response
+        requests_per_minute (int): Optional. Number of inference requests to be made per minute, used for rate limiting
+        max_concurrent (int): Optional. Maximum number of concurrent inferences to run
+        chat_mode (bool): Optional. If True, a history of messages will be maintained in the "previous_messages" column
+        max_in_flight (int): Optional. Maximum number of records read from the data loader and not yet written out.
+            Defaults to 2 * max_concurrent
+        tokens_per_minute (int): Optional. Number of tokens to be consumed per minute, used for rate limiting
+        response_cache_path (str): Optional. Path to a SQLite file used to cache model responses across runs
+        adaptive_concurrency (bool): Optional. If True, the number of concurrent requests is adapted between 1 and
+            max_concurrent based on latency and throttling errors
+        samples_per_request (int): Optional. Maximum number of repeats of a data point sampled with a single request,
+            for models that support n sampling
+        batch_size (int): Optional. Maximum number of records run as a single batch, for models that support batching
+        max_batch_tokens (int): Optional. Maximum number of prompt tokens in a batch, padding included
+        share_cache_across_repeats (bool): Optional. If True, the repeats of a data point share one cached response
     """
 
     data_loader_config: UtilityClassConfigType = None
@@ -115,6 +140,14 @@ class InferenceConfig(ComponentConfig):
     requests_per_minute: int = None
     max_concurrent: int = 1
     chat_mode: bool = False
+    max_in_flight: int = None
+    tokens_per_minute: int = None
+    response_cache_path: str = None
+    adaptive_concurrency: bool = False
+    samples_per_request: int = 1
+    batch_size: int = 1
+    max_batch_tokens: int = None
+    share_cache_across_repeats: bool = False
 
 
 @dataclass
@@ -125,12 +158,17 @@ class EvalReportingConfig(ComponentConfig):
         metric_config (UtilityClassConfig): The metric config
         aggregator_configs (list): List of aggregator configs
         visualizer_configs (list): List of visualizer configs
+        output_format (str): Optional. Format of the metric results file, "jsonl" (default), "parquet" or "arrow"
+        jsonl_side_output (bool): Optional. If True, metric_results.jsonl is also written when the output format is
+            parquet or arrow
     """
 
     data_reader_config: UtilityClassConfigType = None
     metric_config: UtilityClassConfigType = None
     aggregator_configs: List[UtilityClassConfigType] = field(default_factory=list)
     visualizer_configs: List[UtilityClassConfigType] = field(default_factory=list)
+    output_format: str = "jsonl"
+    jsonl_side_output: bool = False
 
 
 """ Config class for the pipeline class """
@@ -1,3 +1,4 @@
+from .async_inference import AsyncInference
 from .data_join import DataJoin
 from .data_processing import DataProcessing
 from .eval_reporting import EvalReporting
@@ -9,6 +10,7 @@ __all__ = [
     "Component",
     "Pipeline",
     "Inference",
+    "AsyncInference",
     "EvalReporting",
     "DataProcessing",
     "PromptProcessing",
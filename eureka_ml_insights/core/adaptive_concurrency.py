@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+import urllib.error
+
+# http status codes returned by endpoints that are throttling or overloaded
+THROTTLING_STATUS_CODES = (408, 429, 503, 504)
+
+
+def is_throttling_error(e):
+    """Whether an exception raised while calling a model means that the endpoint is throttling or overloaded:
+    http 429/503 responses, rate limit errors of the model client libraries and timeouts."""
+    if isinstance(e, TimeoutError):
+        return True
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code in THROTTLING_STATUS_CODES
+    # errors of the openai and anthropic clients carry the http status code
+    status_code = getattr(e, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in THROTTLING_STATUS_CODES
+    error_name = type(e).__name__
+    return "RateLimit" in error_name or "Timeout" in error_name or "ResourceExhausted" in error_name
+
+
+class AdaptiveConcurrencyController:
+    """
+    Thread-safe additive-increase/multiplicative-decrease (AIMD) controller of the number of concurrent requests.
+
+    The concurrency limit starts at initial_concurrent. Every time a full window of requests (as many as the current
+    limit) completes without throttling and with a median latency within latency_tolerance times the lowest median
+    latency seen so far, the limit grows by increase_step. Whenever a throttling error or a timeout is reported, the
+    limit is multiplied by decrease_factor. Decreases are at least one median latency apart, since the requests that
+    were already in flight when the limit was decreased are likely to be throttled as well.
+    """
+
+    def __init__(
+        self,
+        max_concurrent,
+        min_concurrent=1,
+        initial_concurrent=None,
+        increase_step=1,
+        decrease_factor=0.5,
+        latency_tolerance=2.0,
+    ):
+        """
+        args:
+            max_concurrent (int): upper bound of the concurrency limit.
+            min_concurrent (int): optional. Lower bound of the concurrency limit. Default is 1.
+            initial_concurrent (int): optional. Initial concurrency limit. Default is min_concurrent.
+            increase_step (int): optional. Number of requests added to the limit after a successful window. Default is 1.
+            decrease_factor (float): optional. Factor applied to the limit on throttling. Default is 0.5.
+            latency_tolerance (float): optional. The limit does not grow while the median latency of the last window
+                is above latency_tolerance times the lowest median latency seen so far. Default is 2.
+        """
+        if not 1 <= min_concurrent <= max_concurrent:
+            raise ValueError("min_concurrent must be between 1 and max_concurrent.")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1.")
+        self.max_concurrent = max_concurrent
+        self.min_concurrent = min_concurrent
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+
+        self.limit = min(max(initial_concurrent or min_concurrent, min_concurrent), max_concurrent)
+        self.in_flight = 0
+        self.window_latencies = []
+        self.window_throttled = False
+        self.baseline_latency = None
+        self.last_decrease = None
+        self.start_time = time.monotonic()
+        self.history = []
+        self.condition = threading.Condition()
+        self._record_limit("initial")
+
+    def try_acquire(self):
+        """Takes a request slot if the current limit allows it. returns: True if a slot was taken."""
+        with self.condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        """Blocks until a request slot is available and takes it."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def acquire_async(self, poll_interval=0.05):
+        """Same as acquire(), but yields to the event loop while waiting."""
+        while not self.try_acquire():
+            await asyncio.sleep(poll_interval)
+
+    def release(self, latency=None, throttled=False):
+        """
+        Gives a request slot back and records the outcome of the request.
+        args:
+            latency (float): optional. Duration of the request in seconds, None if unknown.
+            throttled (bool): optional. Whether the request eventually failed because of throttling.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease()
+            elif latency is not None:
+                self.window_latencies.append(latency)
+                if len(self.window_latencies) >= self.limit:
+                    self._end_window()
+            self.condition.notify_all()
+
+    def record_throttling(self, e=None):
+        """Reports a throttling error or a timeout, can be registered as a request error listener of a model."""
+        if e is not None and not is_throttling_error(e):
+            return
+        with self.condition:
+            self._decrease()
+            self.condition.notify_all()
+
+    def _end_window(self):
+        median_latency = statistics.median(self.window_latencies)
+        self.window_latencies = []
+        if self.window_throttled:
+            self.window_throttled = False
+            return
+        if self.baseline_latency is None or median_latency < self.baseline_latency:
+            self.baseline_latency = median_latency
+        if median_latency <= self.latency_tolerance * self.baseline_latency and self.limit < self.max_concurrent:
+            self.limit = min(self.limit + self.increase_step, self.max_concurrent)
+            self._record_limit("increase", median_latency)
+
+    def _decrease(self):
+        now = time.monotonic()
+        self.window_throttled = True
+        cooldown = self.baseline_latency or 0
+        if self.last_decrease is not None and now - self.last_decrease < cooldown:
+            return
+        self.last_decrease = now
+        self.window_latencies = []
+        new_limit = max(int(self.limit * self.decrease_factor), self.min_concurrent)
+        if new_limit != self.limit:
+            self.limit = new_limit
+            self._record_limit("decrease")
+
+    def _record_limit(self, reason, median_latency=None):
+        self.history.append(
+            {
+                "time": round(time.monotonic() - self.start_time, 3),
+                "concurrency": self.limit,
+                "reason": reason,
+                "median_latency": median_latency,
+            }
+        )
+        logging.info(f"Adaptive concurrency: {reason} to {self.limit} concurrent requests.")
+
+    def write_history(self, output_dir):
+        with self.condition:
+            history = list(self.history)
+        with open(os.path.join(output_dir, "adaptive_concurrency.json"), "w") as f:
+            json.dump(history, f, indent=4)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from tqdm import tqdm
+
+from eureka_ml_insights.models.telemetry import (
+    RequestTimings,
+    collect_timings,
+    record_time,
+    run_in_thread,
+    timed,
+)
+
+from .inference import Inference
+
+
+class AsyncInference(Inference):
+    """Inference component that runs all requests on a single asyncio event loop instead of a thread pool.
+    Models that implement agenerate() (see EndpointModel) are awaited natively, which allows thousands of
+    concurrent requests without one OS thread per request. Models without agenerate() are run in worker threads.
+
+    Takes the same arguments as the Inference component; max_concurrent is the number of requests that are
+    awaited at the same time and can be set much higher than for the thread based component.
+    """
+
+    # every record is sent as its own request, see samples_per_request and batch_size
+    def _groups_samples(self):
+        return False
+
+    def _batches_records(self):
+        return False
+
+    def _run(self):
+        asyncio.run(self._run_async())
+
+    async def _run_async(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        try:
+            with self.data_loader as loader:
+                progress_bar = tqdm(total=len(loader), mininterval=2.0, desc="Inference Progress: ")
+                # in-flight tasks and the timings of their records
+                in_flight = {}
+                for timings, record in self._read_records(loader):
+                    in_flight[asyncio.create_task(self._run_single_async(record, timings))] = timings
+                    if len(in_flight) >= self.max_in_flight:
+                        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                        self._write_completed(done, in_flight, progress_bar)
+                if in_flight:
+                    done, _ = await asyncio.wait(in_flight)
+                    self._write_completed(done, in_flight, progress_bar)
+                progress_bar.close()
+        finally:
+            if hasattr(self.model, "close_async_client"):
+                await self.model.close_async_client()
+
+    async def _run_single_async(self, record: tuple[dict, tuple, dict], timings=None):
+        """Awaits model.agenerate() with respect to a single element of the dataloader."""
+
+        timings = timings or RequestTimings()
+        timings.stop("queue_wait")
+        # every task runs in its own copy of the context, so the timings are only collected for this record
+        with collect_timings(timings):
+            data, model_args, model_kwargs = record
+            if self._skip_record(data):
+                return None
+            prev_result = self._get_previous_result(data)
+            if prev_result:
+                timings.source = "resume"
+                return prev_result
+
+            response_dict = await self._agenerate(data, model_args, model_kwargs)
+            return self._merge_response(data, response_dict)
+
+    async def _agenerate(self, data, model_args, model_kwargs):
+        if not self.response_cache:
+            return await self._acall_model(model_args, model_kwargs)
+        key = self.response_cache.get_key(data, model_args, model_kwargs)
+        async with self.response_cache.alock(key):
+            response_dict = self.response_cache.get(key)
+            if response_dict is None:
+                response_dict = await self._acall_model(model_args, model_kwargs)
+                self.response_cache.put(key, response_dict)
+            else:
+                self._set_source("cache")
+        return response_dict
+
+    async def _acall_model(self, model_args, model_kwargs):
+        self._set_source("model")
+        if self.concurrency_controller:
+            with timed("concurrency_wait"):
+                await self.concurrency_controller.acquire_async()
+        latency = None
+        try:
+            with timed("concurrency_wait"):
+                await self.semaphore.acquire()
+            try:
+                if self.rate_limiter:
+                    record_time("rate_limiter_wait", await self.rate_limiter.acquire_async())
+                start_time = time.monotonic()
+                if hasattr(self.model, "agenerate"):
+                    response_dict = await self.model.agenerate(*model_args, **model_kwargs)
+                else:
+                    response_dict = await run_in_thread(self.model.generate, *model_args, **model_kwargs)
+                if response_dict.get("is_valid"):
+                    latency = time.monotonic() - start_time
+            finally:
+                self.semaphore.release()
+        finally:
+            if self.concurrency_controller:
+                self.concurrency_controller.release(latency)
+        if self.rate_limiter:
+            self.rate_limiter.record_usage(response_dict)
+        return response_dict
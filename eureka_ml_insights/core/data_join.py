@@ -15,6 +15,8 @@ class DataJoin(DataProcessing):
         other_data_reader_config,
         pandas_merge_args: dict,
         output_data_columns: Optional[List[str]] = None,
+        output_format: str = "jsonl",
+        jsonl_side_output: bool = False,
     ) -> None:
         """
         args:
@@ -24,8 +26,10 @@ class DataJoin(DataProcessing):
             pandas_merge_args: dict arguments to be passed to pandas merge function.
             output_data_columns: Optional[List[str]] list of columns (subset of input columns)
                                       to keep in the transformed data output file.
+            output_format: str format of the transformed data output file, "jsonl", "parquet" or "arrow".
+            jsonl_side_output: bool whether to also write transformed_data.jsonl when the output format is columnar.
         """
-        super().__init__(data_reader_config, output_dir, output_data_columns)
+        super().__init__(data_reader_config, output_dir, output_data_columns, output_format, jsonl_side_output)
         self.other_data_reader = other_data_reader_config.class_name(**other_data_reader_config.init_args)
         self.pandas_merge_args = pandas_merge_args
         allowed_join_types = {"inner", "outer", "left", "right", "cross"}
@@ -43,6 +47,8 @@ class DataJoin(DataProcessing):
             config.other_data_reader_config,
             config.pandas_merge_args,
             config.output_data_columns,
+            config.output_format,
+            config.jsonl_side_output,
         )
 
     def run(self):
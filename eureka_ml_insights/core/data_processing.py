@@ -1,10 +1,9 @@
-import json
 import logging
 import os
 from hashlib import md5
 from typing import List, Optional
 
-from eureka_ml_insights.data_utils import NumpyEncoder
+from eureka_ml_insights.data_utils import DataFrameChunkWriter, write_dataframe
 
 from .pipeline import Component
 from .reserved_names import (
@@ -27,6 +26,9 @@ class DataProcessing(Component):
             config.data_reader_config,
             config.output_dir,
             config.output_data_columns,
+            config.output_format,
+            config.jsonl_side_output,
+            config.chunk_size,
         )
 
     def __init__(
@@ -34,6 +36,9 @@ class DataProcessing(Component):
         data_reader_config,
         output_dir: str,
         output_data_columns: Optional[List[str]] = None,
+        output_format: str = "jsonl",
+        jsonl_side_output: bool = False,
+        chunk_size: Optional[int] = None,
     ) -> None:
         """
         args:
@@ -42,19 +47,25 @@ class DataProcessing(Component):
             output_data_columns: Optional[List[str]] list of columns (subset of input columns)
                                  to keep in the transformed data output file. The columns reserved for the Eureka framework
                                  will automatically be added to the output_data_columns if not provided.
+            output_format: str format of the transformed data output file, "jsonl", "parquet" or "arrow". Readers that
+                           are given the path of transformed_data.jsonl load the parquet or arrow file instead.
+            jsonl_side_output: bool whether to also write transformed_data.jsonl when the output format is columnar.
+            chunk_size: Optional[int] if set, the data is read, transformed and written chunk by chunk of this many
+                        input rows, so that datasets whose transformed data frame does not fit in memory can be
+                        processed. See DataReader.iter_dataset_chunks() for the transforms that still need all the
+                        rows in memory.
         """
         super().__init__(output_dir)
         self.data_reader = data_reader_config.class_name(**data_reader_config.init_args)
         self.output_data_columns = output_data_columns
+        self.output_format = output_format
+        self.jsonl_side_output = jsonl_side_output
+        self.chunk_size = chunk_size
 
     def write_output(self, df):
         logging.info(f"About to save transformed_data_file with columns: {df.columns}.")
         transformed_data_file = os.path.join(self.output_dir, "transformed_data.jsonl")
-
-        with open(transformed_data_file, "w", encoding="utf-8") as writer:
-            for _, row in df.iterrows():
-                content = row.to_dict()
-                writer.write(json.dumps(content, ensure_ascii=False, separators=(",", ":"), cls=NumpyEncoder) + "\n")
+        write_dataframe(df, transformed_data_file, self.output_format, self.jsonl_side_output)
 
     def get_desired_columns(self, df):
         if self.output_data_columns is None:
@@ -62,14 +73,40 @@ class DataProcessing(Component):
         self.output_data_columns = list(self.output_data_columns)
         # if the data was multiplied, keep the columns that are needed to identify datapoint and replicates
         # (just in case the user forgot to specify these columns in output_data_columns)
-        cols_to_keep = set(INFERENCE_RESERVED_NAMES + PROMPT_PROC_RESERVED_NAMES)
-        self.output_data_columns.extend([col for col in cols_to_keep if col in df.columns])
+        self.output_data_columns.extend(self.get_reserved_columns(df))
         self.output_data_columns = list(set(self.output_data_columns))
         return df[self.output_data_columns]
 
+    @staticmethod
+    def get_reserved_columns(df):
+        cols_to_keep = set(INFERENCE_RESERVED_NAMES + PROMPT_PROC_RESERVED_NAMES)
+        return [col for col in cols_to_keep if col in df.columns]
+
     def run(self) -> None:
+        if self.chunk_size:
+            self.run_chunked()
+            return
         # data reader loads data into a pandas dataframe and applies any transformations
         input_df = self.data_reader.load_dataset()
         logging.info(f"input has: {len(input_df)} rows, and the columns are: {input_df.columns}.")
         input_df = self.get_desired_columns(input_df)
         self.write_output(input_df)
+
+    def run_chunked(self) -> None:
+        transformed_data_file = os.path.join(self.output_dir, "transformed_data.jsonl")
+        columns = []
+        n_rows = 0
+        with DataFrameChunkWriter(transformed_data_file, self.output_format, self.jsonl_side_output) as writer:
+            for chunk in self.data_reader.iter_dataset_chunks(self.chunk_size):
+                # without output_data_columns, the columns are all the columns of the chunks so far, e.g. keys that
+                # only the records of a later chunk have are added when it is written, see DataFrameChunkWriter
+                chunk_columns = chunk.columns if self.output_data_columns is None else self.output_data_columns
+                new_columns = [c for c in chunk_columns if c not in columns]
+                new_columns += [c for c in self.get_reserved_columns(chunk) if c not in columns + new_columns]
+                if new_columns:
+                    columns.extend(new_columns)
+                    logging.info(f"About to save transformed_data_file with columns: {columns}.")
+                # columns that are missing from a chunk, e.g. keys that none of its jsonl records have, are filled in
+                writer.write(chunk.reindex(columns=columns))
+                n_rows += len(chunk)
+        logging.info(f"Wrote {n_rows} rows to transformed_data_file.")
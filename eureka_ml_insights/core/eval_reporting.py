@@ -1,8 +1,7 @@
 # report component has data reader, list of metrics, list of visualizers, and list of writers
-import json
 import os
 
-from eureka_ml_insights.data_utils import NumpyEncoder
+from eureka_ml_insights.data_utils import write_dataframe
 from eureka_ml_insights.metrics import Reporter
 
 from .pipeline import Component
@@ -13,9 +12,18 @@ class EvalReporting(Component):
     and passes the results to reporter."""
 
     def __init__(
-        self, data_reader_config, output_dir, metric_config=None, aggregator_configs=None, visualizer_configs=None
+        self,
+        data_reader_config,
+        output_dir,
+        metric_config=None,
+        aggregator_configs=None,
+        visualizer_configs=None,
+        output_format="jsonl",
+        jsonl_side_output=False,
     ):
         super().__init__(output_dir)
+        self.output_format = output_format
+        self.jsonl_side_output = jsonl_side_output
         self.data_reader = data_reader_config.class_name(**data_reader_config.init_args)
         self.metric = None
         if metric_config is not None:
@@ -30,6 +38,8 @@ class EvalReporting(Component):
             metric_config=config.metric_config,
             aggregator_configs=config.aggregator_configs,
             visualizer_configs=config.visualizer_configs,
+            output_format=config.output_format,
+            jsonl_side_output=config.jsonl_side_output,
         )
 
     def run(self):
@@ -39,11 +49,6 @@ class EvalReporting(Component):
             metric_result = self.metric.evaluate(df)
             # write results in the output directory in a file names metric_resutls.jsonl
             metric_results_file = os.path.join(self.output_dir, "metric_results.jsonl")
-            with open(metric_results_file, "w", encoding="utf-8") as writer:
-                for _, row in metric_result.iterrows():
-                    content = row.to_dict()
-                    writer.write(
-                        json.dumps(content, ensure_ascii=False, separators=(",", ":"), cls=NumpyEncoder) + "\n"
-                    )
+            write_dataframe(metric_result, metric_results_file, self.output_format, self.jsonl_side_output)
         # generate reports
         self.reporter.generate_report(metric_result)
@@ -1,21 +1,28 @@
 import logging
 import os
-import threading
 import time
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor
-from concurrent.futures import as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 
 from tqdm import tqdm
 
 from eureka_ml_insights.configs.config import DataSetConfig, ModelConfig
-from eureka_ml_insights.data_utils.data import DataReader, JsonLinesWriter
+from eureka_ml_insights.data_utils.data import BufferedJsonLinesWriter, IndexedJsonLinesReader
 from eureka_ml_insights.models.models import Model
+from eureka_ml_insights.models.telemetry import (
+    RequestTimings,
+    collect_timings,
+    get_current_timings,
+    record_time,
+    timed,
+)
+from eureka_ml_insights.models.tokenizer import count_tokens
 
+from .adaptive_concurrency import AdaptiveConcurrencyController
+from .inference_stats import InferenceStats
 from .pipeline import Component
+from .rate_limiter import RateLimiter
 from .reserved_names import INFERENCE_RESERVED_NAMES
-
-MINUTE = 60
+from .response_cache import ResponseCache, get_model_fingerprint
 
 
 class Inference(Component):
@@ -29,6 +36,14 @@ class Inference(Component):
         requests_per_minute=None,
         max_concurrent=1,
         chat_mode=False,
+        max_in_flight=None,
+        tokens_per_minute=None,
+        response_cache_path=None,
+        adaptive_concurrency=False,
+        samples_per_request=1,
+        batch_size=1,
+        max_batch_tokens=None,
+        share_cache_across_repeats=False,
     ):
         """
         Initialize the Inference component.
@@ -39,32 +54,101 @@ class Inference(Component):
             resume_from (str): optional. Path to the file where previous inference results are stored.
             new_columns (list): optional. List of new columns to be added to resume_from data to match the current inference response.
             requests_per_minute (int): optional. Number of inference requests to be made per minute, used for rate limiting. If not provided, rate limiting will not be applied.
+                The limit is shared by all concurrent workers.
             max_concurrent (int): optional. Maximum number of concurrent inferences to run. Default is 1.
             chat_mode (bool): optional. If True, the model will be used in chat mode, where a history of messages will be maintained in "previous_messages" column.
+            max_in_flight (int): optional. Maximum number of records that are read from the data loader but not yet written
+                to the output file. The data loader is only advanced when a slot frees up, so memory stays bounded
+                regardless of the dataset size. Default is 2 * max_concurrent.
+            tokens_per_minute (int): optional. Number of tokens (prompt and completion, as reported by the model usage) to be
+                consumed per minute, used for rate limiting together with requests_per_minute.
+            response_cache_path (str): optional. Path to a SQLite file used as a response cache, shared across runs and
+                experiments. Requests with the same model configuration and the same model inputs are served from the
+                cache instead of calling the model, see ResponseCache. If not provided, no cache is used.
+            adaptive_concurrency (bool): optional. If True, the number of concurrent requests is adapted to the endpoint:
+                it grows additively while latency holds steady and is cut multiplicatively on throttling errors and
+                timeouts, between 1 and max_concurrent. The concurrency over time is saved to adaptive_concurrency.json
+                in the output directory. Default is False.
+            samples_per_request (int): optional. Maximum number of repeats of a data point (see MultiplyTransform) that
+                are sampled with a single request, for models that support n sampling (see Model.supports_n_sampling):
+                consecutive records with the same data_point_id and the same model inputs are sent as one request for
+                n completions, which are written back to the rows of the repeats in order. The prompt is then only sent
+                and counted against the rate limits once. Only consecutive records are grouped: the rows of a
+                MultiplyTransform are ordered repeat by repeat, use MultiplyTransform(virtual=True), whose repeats are
+                expanded one after the other by the data loader. Ignored in chat mode. Default is 1.
+            batch_size (int): optional. Maximum number of records passed to model.generate_batch() at once, for models
+                that support batching (see Model.supports_batching), e.g. self-hosted HuggingFace and vLLM models that
+                run padded or continuously batched prompts. Consecutive records are batched in the order of the data
+                loader. Ignored in chat mode. Default is 1.
+            max_batch_tokens (int): optional. Maximum number of prompt tokens in a batch, counted as the number of
+                records times the number of tokens of the longest prompt, i.e. the size of the padded batch. Prompts
+                are counted by model.count_prompt_tokens(): self-hosted models count the templated prompt with their
+                own tokenizer, other models estimate it with tiktoken. A record whose prompt alone exceeds the budget
+                is run on its own. If not provided, batches are only bounded by batch_size.
+            share_cache_across_repeats (bool): optional. If True, the repeats of a data point (see MultiplyTransform)
+                are served the same cached response. By default every repeat gets its own response, see ResponseCache.
         """
         super().__init__(output_dir)
         self.model: Model = model_config.class_name(**model_config.init_args)
         self.data_loader = data_config.class_name(**data_config.init_args)
-        self.appender = JsonLinesWriter(os.path.join(output_dir, "inference_result.jsonl"), mode="a")
+        self.appender = BufferedJsonLinesWriter(os.path.join(output_dir, "inference_result.jsonl"), mode="a")
+        self.stats = InferenceStats(output_dir)
 
         self.resume_from = resume_from
         if resume_from and not os.path.exists(resume_from):
             raise FileNotFoundError(f"File {resume_from} not found.")
         self.new_columns = new_columns
-        self.pre_inf_results_df = None
+        self.pre_inf_results = None
         self.last_uid = None
 
         # rate limiting parameters
         self.requests_per_minute = requests_per_minute
-        self.request_times = deque()
-        self.period = MINUTE
+        self.tokens_per_minute = tokens_per_minute
+        self.rate_limiter = None
+        if requests_per_minute or tokens_per_minute:
+            self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
 
         # parallel inference parameters
         self.max_concurrent = max_concurrent
         self.chat_mode = chat_mode
         self.model.chat_mode = self.chat_mode
         self.output_dir = output_dir
-        self.writer_lock = threading.Lock()
+        if max_in_flight is not None and max_in_flight < max_concurrent:
+            raise ValueError("max_in_flight must be greater than or equal to max_concurrent.")
+        # every worker runs a group of records, see samples_per_request and batch_size
+        self.max_in_flight = max_in_flight or 2 * max_concurrent * max(samples_per_request, batch_size)
+        # keep one connection alive per concurrent request for the models that pool their http connections
+        if hasattr(self.model, "max_connections") and self.model.max_connections is None:
+            self.model.max_connections = max_concurrent
+
+        self.concurrency_controller = None
+        if adaptive_concurrency:
+            self.concurrency_controller = AdaptiveConcurrencyController(max_concurrent)
+            # throttling errors are reported by the model while it retries, before the request eventually completes
+            if hasattr(self.model, "add_request_error_listener"):
+                self.model.add_request_error_listener(self.concurrency_controller.record_throttling)
+
+        self.samples_per_request = samples_per_request
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        if batch_size > 1 and not self._batches_records():
+            logging.warning(
+                "batch_size is ignored: the model does not support batching, chat mode is enabled, "
+                "or the component sends one request per record."
+            )
+        if samples_per_request > 1 and not self._groups_samples():
+            logging.warning(
+                "samples_per_request is ignored: the model does not support n sampling, chat mode is enabled, "
+                "or the component sends one request per record."
+            )
+
+        self.response_cache = None
+        if response_cache_path:
+            self.response_cache = ResponseCache(
+                response_cache_path,
+                get_model_fingerprint(model_config),
+                share_across_repeats=share_cache_across_repeats,
+            )
 
     @classmethod
     def from_config(cls, config):
@@ -77,56 +161,94 @@ class Inference(Component):
             requests_per_minute=config.requests_per_minute,
             max_concurrent=config.max_concurrent,
             chat_mode=config.chat_mode,
+            max_in_flight=config.max_in_flight,
+            tokens_per_minute=config.tokens_per_minute,
+            response_cache_path=config.response_cache_path,
+            adaptive_concurrency=config.adaptive_concurrency,
+            samples_per_request=config.samples_per_request,
+            batch_size=config.batch_size,
+            max_batch_tokens=config.max_batch_tokens,
+            share_cache_across_repeats=config.share_cache_across_repeats,
         )
 
+    def _groups_samples(self):
+        """Whether the repeats of a data point are sampled together, see samples_per_request."""
+        return (
+            self.samples_per_request > 1
+            and getattr(self.model, "supports_n_sampling", False)
+            and not self.chat_mode
+            and not self._batches_records()
+        )
+
+    def _batches_records(self):
+        """Whether records are run in batches, see batch_size."""
+        return self.batch_size > 1 and getattr(self.model, "supports_batching", False) and not self.chat_mode
+
     def fetch_previous_inference_results(self):
-        """This method loads the contents of the resume_from file and validates if it
-        contains the required columns and keys in alignment with the current model configuration."""
+        """This method indexes the contents of the resume_from file and validates if it
+        contains the required columns and keys in alignment with the current model configuration.
+        The file is streamed once, only the uid, is_valid and byte offset of each row are kept in memory,
+        and full rows are read back from disk when they are needed."""
 
         logging.info(f"Resuming inference from {self.resume_from}")
-        # fetch previous results from the provided resume_from file.
-        pre_inf_results_df = DataReader(self.resume_from, format=".jsonl").load_dataset()
+        # index previous results from the provided resume_from file.
+        pre_inf_results = IndexedJsonLinesReader(self.resume_from, key="uid", index_columns=["is_valid"]).build_index()
 
         # add new columns listed by the user to the previous inference results, in case we know that the current model will
         # generate new columns that were not present in the previous results
         if self.new_columns:
             for col in self.new_columns:
-                if col not in pre_inf_results_df.columns:
-                    pre_inf_results_df[col] = None
+                if col not in pre_inf_results.columns:
+                    pre_inf_results.columns.append(col)
+
+        # verify that "model_output" and "is_valid" columns are present
+        if "model_output" not in pre_inf_results.columns or "is_valid" not in pre_inf_results.columns:
+            raise ValueError("Columns 'model_output' and 'is_valid' are required in the resume_from file.")
 
         # validate the resume_from contents both stand-alone and against the current model response keys
+        response_keys, optional_response_keys = self.get_model_response_keys()
         with self.data_loader as loader:
-            _, sample_model_input, sample_model_kwargs = loader.get_sample_model_input()
-            sample_data_keys = loader.reader.read().keys()
+            # rows of a virtual MultiplyTransform are compared once expanded, like they are written to the results
+            sample_data_keys = loader.get_sample_model_input()[0].keys()
 
-            # verify that "model_output" and "is_valid" columns are present
-            if "model_output" not in pre_inf_results_df.columns or "is_valid" not in pre_inf_results_df.columns:
-                raise ValueError("Columns 'model_output' and 'is_valid' are required in the resume_from file.")
+        # check if the inference response dictionary contains the same keys as the resume_from file
+        eventual_keys = set(response_keys) | set(sample_data_keys) | set(INFERENCE_RESERVED_NAMES)
 
-            # perform a sample inference call to get the model output keys and validate the resume_from contents
-            sample_response_dict = self.model.generate(*sample_model_input, **sample_model_kwargs)
-            if not sample_response_dict["is_valid"]:
-                raise ValueError(
-                    "Sample inference call for resume_from returned invalid results, please check the model configuration."
-                )
-            # check if the inference response dictionary contains the same keys as the resume_from file
-            eventual_keys = set(sample_response_dict.keys()) | set(sample_data_keys)
-
-            # in case of resuming from a file that was generated by an older version of the model,
-            # we let the discrepancy in the reserved keys slide and later set the missing keys to None
-            match_keys = set(pre_inf_results_df.columns) | set(INFERENCE_RESERVED_NAMES)
-
-            if set(eventual_keys) != match_keys:
-                diff = set(eventual_keys) ^ set(match_keys)
-                raise ValueError(
-                    f"Columns in resume_from file do not match the current input data and inference response. "
-                    f"Problemtaic columns: {diff}"
-                )
+        # in case of resuming from a file that was generated by an older version of the model,
+        # we let the discrepancy in the reserved keys slide and later set the missing keys to None
+        match_keys = set(pre_inf_results.columns) | set(INFERENCE_RESERVED_NAMES)
+
+        # keys that the model only returns when the api reports them may or may not be present in the file
+        if eventual_keys - match_keys or match_keys - eventual_keys - set(optional_response_keys):
+            diff = (eventual_keys ^ match_keys) - set(optional_response_keys)
+            raise ValueError(
+                f"Columns in resume_from file do not match the current input data and inference response. "
+                f"Problemtaic columns: {diff}"
+            )
 
         # find the last uid that was inferenced
-        last_uid = pre_inf_results_df["uid"].astype(int).max()
+        last_uid = max(int(uid) for uid in pre_inf_results.keys())
         logging.info(f"Last uid inferenced: {last_uid}")
-        return pre_inf_results_df, last_uid
+        return pre_inf_results, last_uid
+
+    def get_model_response_keys(self):
+        """Returns the keys that the model is expected to return in its response dictionary, along with the keys
+        it may optionally return. Models that declare their response keys (see Model.get_response_keys) are not
+        called, for other models a sample inference call is made to find out the response keys."""
+        if hasattr(self.model, "get_response_keys"):
+            response_keys, optional_response_keys = self.model.get_response_keys()
+            if response_keys is not None:
+                return response_keys, optional_response_keys
+
+        logging.info("The model does not declare its response keys, making a sample inference call to get them.")
+        with self.data_loader as loader:
+            _, sample_model_input, sample_model_kwargs = loader.get_sample_model_input()
+        sample_response_dict = self.model.generate(*sample_model_input, **sample_model_kwargs)
+        if not sample_response_dict["is_valid"]:
+            raise ValueError(
+                "Sample inference call for resume_from returned invalid results, please check the model configuration."
+            )
+        return set(sample_response_dict.keys()), set()
 
     def validate_response_dict(self, response_dict):
         # Validate that the response dictionary contains the required fields
@@ -134,86 +256,307 @@ class Inference(Component):
         if "model_output" not in response_dict or "is_valid" not in response_dict:
             raise ValueError("Response dictionary must contain 'model_output' and 'is_valid' keys.")
 
-    def retrieve_exisiting_result(self, data, pre_inf_results_df):
-        """Finds the previous result for the given data point from the pre_inf_results_df and returns it if it is valid
+    def retrieve_exisiting_result(self, data, pre_inf_results):
+        """Finds the previous result for the given data point from the pre_inf_results and returns it if it is valid
         data: dict, data point to be inferenced
-        pre_inf_results_df: pd.DataFrame, previous inference results
+        pre_inf_results: IndexedJsonLinesReader, index of the previous inference results
         """
-        prev_results = pre_inf_results_df[pre_inf_results_df.uid == data["uid"]]
-        if prev_results.empty:
+        prev_result_index = pre_inf_results.get_index_values(data["uid"])
+        if prev_result_index is None or not bool(prev_result_index["is_valid"]):
             return None
-        prev_result_is_valid = bool(prev_results["is_valid"].values[0])
-        prev_model_output = prev_results["model_output"].values[0]
-
-        if prev_result_is_valid:
-            logging.info(f"Skipping inference for uid: {data['uid']}. Using previous results.")
-            try:
-                prev_model_tokens = prev_results["n_output_tokens"].values[0]
-            except KeyError:
-                logging.warn(
-                    "Previous results do not contain 'n_output_tokens' column, setting to None for this data point."
-                )
-                prev_model_tokens = None
-            try:
-                prev_model_time = prev_results["response_time"].values[0]
-            except KeyError:
-                logging.warn(
-                    "Previous results do not contain 'response_time' column, setting to None for this data point."
+
+        logging.info(f"Skipping inference for uid: {data['uid']}. Using previous results.")
+        prev_result = pre_inf_results.get(data["uid"])
+        for col in ["n_output_tokens", "response_time"]:
+            if col not in pre_inf_results.columns:
+                logging.warning(
+                    f"Previous results do not contain '{col}' column, setting to None for this data point."
                 )
-                prev_model_time = None
 
-            data["model_output"], data["is_valid"], data["n_output_tokens"], data["response_time"] = (
-                prev_model_output,
-                prev_result_is_valid,
-                prev_model_tokens,
-                prev_model_time,
-            )
-            # add remaining pre_inf_results_df columns to the data point, making sure to update the previous_messages column
-            for col in pre_inf_results_df.columns:
-                if col not in data or col == "previous_messages":
-                    data[col] = prev_results[col].values[0]
+        data["model_output"], data["is_valid"], data["n_output_tokens"], data["response_time"] = (
+            prev_result["model_output"],
+            True,
+            prev_result.get("n_output_tokens"),
+            prev_result.get("response_time"),
+        )
+        # add remaining pre_inf_results columns to the data point, making sure to update the previous_messages column
+        for col in pre_inf_results.columns:
+            if col not in data or col == "previous_messages":
+                data[col] = prev_result[col]
 
-            return data
+        return data
 
     def run(self):
         if self.resume_from:
-            self.pre_inf_results_df, self.last_uid = self.fetch_previous_inference_results()
+            self.pre_inf_results, self.last_uid = self.fetch_previous_inference_results()
+        try:
+            # results are written by the appender's own thread, through a file that stays open for the whole run
+            with self.appender, self.stats:
+                self._run()
+        finally:
+            if self.pre_inf_results is not None:
+                self.pre_inf_results.close()
+            if self.response_cache:
+                self.response_cache.write_stats(self.output_dir)
+                self.response_cache.close()
+            if self.concurrency_controller:
+                self.concurrency_controller.write_history(self.output_dir)
+
+    def _run(self):
         with self.data_loader as loader, ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
-            futures = [executor.submit(self._run_single, record) for record in loader]
-            for future in tqdm(as_completed(futures), total=len(loader), mininterval=2.0, desc="Inference Progress: "):
-                result = future.result()
-                if result:
-                    self._append_threadsafe(result)
+            progress_bar = tqdm(total=len(loader), mininterval=2.0, desc="Inference Progress: ")
+            # in-flight futures and the timings of their records, every future runs a group of records
+            in_flight = {}
+            n_in_flight = 0
+            for group in self._read_groups(loader):
+                in_flight[executor.submit(self._run_group, group)] = [timings for timings, _ in group]
+                n_in_flight += len(group)
+                # records are pulled from the loader lazily: a new record is only read (and its images decoded)
+                # once one of the in-flight records has been written out.
+                if n_in_flight >= self.max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    n_in_flight -= self._write_completed_groups(done, in_flight, progress_bar)
+            self._write_completed_groups(as_completed(list(in_flight)), in_flight, progress_bar)
+            progress_bar.close()
+
+    def _read_records(self, loader):
+        """Yields the records of the loader along with the timings that are collected for each of them."""
+        records = iter(loader)
+        while True:
+            timings = RequestTimings()
+            timings.start("data_loading")
+            record = next(records, None)
+            if record is None:
+                return
+            timings.stop("data_loading")
+            timings.start("queue_wait")
+            yield timings, record
+
+    def _read_groups(self, loader):
+        """Yields the records of the loader, with their timings, in groups of records that are sent as a single
+        request: batches of consecutive records when batch_size applies, consecutive repeats of the same data point
+        when samples_per_request applies, otherwise one record per group. Records are not reordered to group the
+        repeats of a data point that are not consecutive, so that the records held back from the model stay bounded."""
+        if self._batches_records():
+            yield from self._read_batches(loader)
+            return
+        if not self._groups_samples():
+            for timings, record in self._read_records(loader):
+                yield [(timings, record)]
+            return
+        group = []
+        for timings, record in self._read_records(loader):
+            if group and not self._same_request(group[0][1], record):
+                yield group
+                group = []
+            group.append((timings, record))
+            if len(group) >= self.samples_per_request:
+                yield group
+                group = []
+        if group:
+            yield group
+
+    def _read_batches(self, loader):
+        """Yields batches of consecutive records, bounded by batch_size and max_batch_tokens."""
+        batch = []
+        max_prompt_tokens = 0
+        for timings, record in self._read_records(loader):
+            n_prompt_tokens = self._count_prompt_tokens(record) if self.max_batch_tokens else 0
+            batch_tokens = (len(batch) + 1) * max(max_prompt_tokens, n_prompt_tokens)
+            if batch and self.max_batch_tokens and batch_tokens > self.max_batch_tokens:
+                yield batch
+                batch = []
+                max_prompt_tokens = 0
+            batch.append((timings, record))
+            max_prompt_tokens = max(max_prompt_tokens, n_prompt_tokens)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+                max_prompt_tokens = 0
+        if batch:
+            yield batch
+
+    def _count_prompt_tokens(self, record):
+        _, model_args, model_kwargs = record
+        if not model_args:
+            return 0
+        if hasattr(self.model, "count_prompt_tokens"):
+            return self.model.count_prompt_tokens(*model_args, **model_kwargs)
+        return count_tokens(model_args[0]) if isinstance(model_args[0], str) else 0
+
+    def _same_request(self, record, other_record):
+        """Whether two records are repeats of the same data point with the same model inputs."""
+        data, model_args, model_kwargs = record
+        other_data, other_model_args, other_model_kwargs = other_record
+        if "data_point_id" not in data or data["data_point_id"] != other_data.get("data_point_id"):
+            return False
+        # the repeats of a virtual MultiplyTransform share their model inputs, other repeats are compared
+        if model_args is not other_model_args:
+            if len(model_args) != len(other_model_args):
+                return False
+            for arg, other_arg in zip(model_args, other_model_args):
+                if arg is not other_arg and not (type(arg) is type(other_arg) and arg == other_arg):
+                    return False
+        return model_kwargs == other_model_kwargs
+
+    def _write_completed_groups(self, futures, in_flight, progress_bar):
+        """Writes the results of the completed groups, returns the number of records written."""
+        n_records = 0
+        for future in futures:
+            results = future.result()
+            for result, timings in zip(results, in_flight.pop(future)):
+                self._write_result(result, timings, progress_bar)
+                n_records += 1
+        return n_records
+
+    def _write_completed(self, futures, in_flight, progress_bar):
+        for future in futures:
+            self._write_result(future.result(), in_flight.pop(future), progress_bar)
+
+    def _write_result(self, result, timings, progress_bar):
+        timings.start("writer_wait")
+        if result:
+            self._append_threadsafe(result)
+        timings.stop("writer_wait")
+        self.stats.add(result, timings)
+        progress_bar.update(1)
 
     def _append_threadsafe(self, data):
-        with self.writer_lock:
-            with self.appender as appender:
-                appender.write(data)
+        self.appender.write(data)
 
-    def _run_single(self, record: tuple[dict, tuple, dict]):
+    def _run_single(self, record: tuple[dict, tuple, dict], timings=None):
         """Runs model.generate() with respect to a single element of the dataloader."""
 
-        data, model_args, model_kwargs = record
-        if self.chat_mode and data.get("is_valid", True) is False:
-            return None
-        if self.resume_from and (data["uid"] <= self.last_uid):
-            prev_result = self.retrieve_exisiting_result(data, self.pre_inf_results_df)
+        timings = timings or RequestTimings()
+        timings.stop("queue_wait")
+        with collect_timings(timings):
+            data, model_args, model_kwargs = record
+            if self._skip_record(data):
+                return None
+            prev_result = self._get_previous_result(data)
             if prev_result:
+                timings.source = "resume"
                 return prev_result
 
-        # Rate limiter -- only for sequential inference
-        if self.requests_per_minute and self.max_concurrent == 1:
-            while len(self.request_times) >= self.requests_per_minute:
-                # remove the oldest request time if it is older than the rate limit period
-                if time.time() - self.request_times[0] > self.period:
-                    self.request_times.popleft()
-                else:
-                    # rate limit is reached, wait for a second
-                    time.sleep(1)
-            self.request_times.append(time.time())
-
-        response_dict = self.model.generate(*model_args, **model_kwargs)
+            response_dict = self._generate(data, model_args, model_kwargs)
+            return self._merge_response(data, response_dict)
+
+    def _run_group(self, group):
+        """Runs a group of records read by _read_groups(), returns the list of their results."""
+        if len(group) == 1:
+            timings, record = group[0]
+            return [self._run_single(record, timings)]
+        if self._batches_records():
+            return self._run_together(group, self._call_model_batch)
+        return self._run_together(group, self._call_model_n)
+
+    def _run_together(self, group, call_model):
+        """Runs a group of records with a single call to call_model(), which takes the list of the records that need a
+        response and returns their response dictionaries. Records that are skipped, resumed or cached are not sent to
+        the model. The timings of the call are collected in the first record that is sent, whose source is "model";
+        the other records sent with it have the source "grouped", so that the call is counted as a single request."""
+        results = [None] * len(group)
+        pending = []
+        for i, (timings, record) in enumerate(group):
+            timings.stop("queue_wait")
+            with collect_timings(timings):
+                data, model_args, model_kwargs = record
+                if self._skip_record(data):
+                    continue
+                prev_result = self._get_previous_result(data)
+                if prev_result:
+                    timings.source = "resume"
+                    results[i] = prev_result
+                    continue
+                key = None
+                if self.response_cache:
+                    key = self.response_cache.get_key(data, model_args, model_kwargs)
+                    response_dict = self.response_cache.get(key)
+                    if response_dict is not None:
+                        timings.source = "cache"
+                        results[i] = self._merge_response(data, response_dict)
+                        continue
+                pending.append((i, key))
+        if not pending:
+            return results
+
+        with collect_timings(group[pending[0][0]][0]):
+            response_dicts = call_model([group[i][1] for i, _ in pending])
+        for n, ((i, key), response_dict) in enumerate(zip(pending, response_dicts)):
+            timings, (data, _, _) = group[i]
+            timings.source = "model" if n == 0 else "grouped"
+            if key is not None:
+                self.response_cache.put(key, response_dict)
+            results[i] = self._merge_response(data, response_dict)
+        return results
+
+    def _generate(self, data, model_args, model_kwargs):
+        """Serves the response from the response cache if possible, otherwise calls the model and caches it."""
+        if not self.response_cache:
+            return self._call_model(model_args, model_kwargs)
+        key = self.response_cache.get_key(data, model_args, model_kwargs)
+        with self.response_cache.lock(key):
+            response_dict = self.response_cache.get(key)
+            if response_dict is None:
+                response_dict = self._call_model(model_args, model_kwargs)
+                self.response_cache.put(key, response_dict)
+            else:
+                self._set_source("cache")
+        return response_dict
+
+    def _set_source(self, source):
+        timings = get_current_timings()
+        if timings is not None:
+            timings.source = source
+
+    def _call_model(self, model_args, model_kwargs):
+        return self._send_request(lambda: [self.model.generate(*model_args, **model_kwargs)])[0]
+
+    def _call_model_n(self, records):
+        """Samples the responses of repeats of the same data point, see samples_per_request."""
+        _, model_args, model_kwargs = records[0]
+        return self._send_request(lambda: self.model.generate_n(*model_args, n=len(records), **model_kwargs))
+
+    def _call_model_batch(self, records):
+        """Runs a batch of records, see batch_size."""
+        model_inputs = [(model_args, model_kwargs) for _, model_args, model_kwargs in records]
+        return self._send_request(lambda: self.model.generate_batch(model_inputs))
+
+    def _send_request(self, generate):
+        """Calls generate(), which sends a single request to the model and returns the list of its response
+        dictionaries, within the concurrency and rate limits."""
+        self._set_source("model")
+        if self.concurrency_controller:
+            with timed("concurrency_wait"):
+                self.concurrency_controller.acquire()
+        latency = None
+        try:
+            if self.rate_limiter:
+                record_time("rate_limiter_wait", self.rate_limiter.acquire())
+            start_time = time.monotonic()
+            response_dicts = generate()
+            if any(response_dict.get("is_valid") for response_dict in response_dicts):
+                latency = time.monotonic() - start_time
+        finally:
+            if self.concurrency_controller:
+                self.concurrency_controller.release(latency)
+        if self.rate_limiter:
+            # the usage of a request for n completions is split among its response dictionaries
+            for response_dict in response_dicts:
+                self.rate_limiter.record_usage(response_dict)
+        return response_dicts
+
+    def _skip_record(self, data):
+        """In chat mode, conversations whose previous turn failed are not continued."""
+        return self.chat_mode and data.get("is_valid", True) is False
+
+    def _get_previous_result(self, data):
+        """Returns the valid result from the resume_from file for this data point, if any."""
+        if self.resume_from and (data["uid"] <= self.last_uid):
+            return self.retrieve_exisiting_result(data, self.pre_inf_results)
+        return None
+
+    def _merge_response(self, data, response_dict):
         self.validate_response_dict(response_dict)
         data.update(response_dict)
         return data
-      
\ No newline at end of file
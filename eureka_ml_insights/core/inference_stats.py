@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from eureka_ml_insights.data_utils.data import BufferedJsonLinesWriter
+
+from .rate_limiter import get_total_tokens
+
+# phases of an inference request, in the order they happen. request_serialization includes image_encoding.
+PHASES = [
+    "data_loading",
+    "queue_wait",
+    "concurrency_wait",
+    "rate_limiter_wait",
+    "request_serialization",
+    "image_encoding",
+    "network",
+    "retry_wait",
+    "writer_wait",
+    "total",
+]
+PERCENTILES = [50, 95, 99]
+
+
+class InferenceStats:
+    """
+    Collects the per-row timings of an Inference component. Every row's breakdown is appended to
+    inference_timings.jsonl, and a summary is periodically written to inference_stats.json: rows, requests and tokens
+    per second since the start, along with p50/p95/p99 latencies of every phase over the last window_size requests.
+
+    Rows that are served from the resume_from file or the response cache are counted as rows but not as requests.
+    Rows that were sent along with another row in a single request (source "grouped", see samples_per_request and
+    batch_size of Inference) count towards the tokens but not as requests, and their latencies are not recorded.
+    """
+
+    def __init__(self, output_dir, window_size=10000, write_interval=10):
+        """
+        args:
+            output_dir (str): directory where inference_timings.jsonl and inference_stats.json are written.
+            window_size (int): optional. Number of most recent requests the latency percentiles are computed over.
+            write_interval (float): optional. Minimum number of seconds between two updates of inference_stats.json.
+        """
+        self.output_dir = output_dir
+        self.stats_path = os.path.join(output_dir, "inference_stats.json")
+        self.timings_writer = BufferedJsonLinesWriter(os.path.join(output_dir, "inference_timings.jsonl"), mode="a")
+        self.window_size = window_size
+        self.write_interval = write_interval
+        self.latencies = {phase: deque(maxlen=window_size) for phase in PHASES}
+        self.n_rows = 0
+        self.n_requests = 0
+        self.n_failed_requests = 0
+        self.n_output_tokens = 0
+        self.n_total_tokens = 0
+        self.start_time = None
+        self.last_write = None
+
+    def __enter__(self):
+        self.start_time = time.monotonic()
+        self.last_write = self.start_time
+        self.timings_writer.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.write_stats()
+        finally:
+            self.timings_writer.__exit__(exc_type, exc_value, traceback)
+
+    def add(self, data, timings):
+        """
+        Records the timings of a row.
+        args:
+            data (dict): the inference result of the row, None if the row was skipped.
+            timings (RequestTimings): the timings collected while processing the row.
+        """
+        self.n_rows += 1
+        phases = dict(timings.phases)
+        phases["total"] = timings.elapsed()
+        if data is not None and timings.source in ("model", "grouped"):
+            # the usage of a grouped request is split among its rows
+            self.n_output_tokens += data.get("n_output_tokens") or 0
+            self.n_total_tokens += get_total_tokens(data) or 0
+        if data is not None and timings.source == "model":
+            self.n_requests += 1
+            if not data.get("is_valid"):
+                self.n_failed_requests += 1
+            if data.get("retry_wait_time"):
+                phases["retry_wait"] = data["retry_wait_time"]
+            for phase in PHASES:
+                if phase in phases:
+                    self.latencies[phase].append(phases[phase])
+
+        row_timings = {"uid": data.get("uid") if data else None, "source": timings.source}
+        row_timings.update({phase: round(value, 6) for phase, value in phases.items()})
+        self.timings_writer.write(row_timings)
+
+        if time.monotonic() - self.last_write >= self.write_interval:
+            self.write_stats()
+
+    def get_stats(self):
+        elapsed = time.monotonic() - self.start_time
+        stats = {
+            "elapsed_time": elapsed,
+            "n_rows": self.n_rows,
+            "n_requests": self.n_requests,
+            "n_failed_requests": self.n_failed_requests,
+            "rows_per_second": self.n_rows / elapsed if elapsed else None,
+            "requests_per_second": self.n_requests / elapsed if elapsed else None,
+            "output_tokens_per_second": self.n_output_tokens / elapsed if elapsed else None,
+            "total_tokens_per_second": self.n_total_tokens / elapsed if elapsed else None,
+            "latency_window_size": self.window_size,
+            "latency": {},
+        }
+        for phase in PHASES:
+            latencies = self.latencies[phase]
+            if latencies:
+                values = np.percentile(np.fromiter(latencies, dtype=float), PERCENTILES)
+                phase_stats = {f"p{p}": float(value) for p, value in zip(PERCENTILES, values)}
+                phase_stats["mean"] = float(np.mean(latencies))
+                stats["latency"][phase] = phase_stats
+        return stats
+
+    def write_stats(self):
+        self.last_write = time.monotonic()
+        stats = self.get_stats()
+        # write to a temporary file first, so that readers never see a partially written summary
+        temp_path = self.stats_path + ".tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(stats, f, indent=4)
+            os.replace(temp_path, self.stats_path)
+        except OSError as e:
+            logging.warning(f"Could not write inference stats to {self.stats_path}: {e}")
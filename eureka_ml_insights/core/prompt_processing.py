@@ -25,6 +25,8 @@ class PromptProcessing(DataProcessing):
             config.output_data_columns,
             config.prompt_template_path,
             config.ignore_failure,
+            config.output_format,
+            config.jsonl_side_output,
         )
 
     def __init__(
@@ -34,6 +36,8 @@ class PromptProcessing(DataProcessing):
         output_data_columns: Optional[List[str]] = None,
         prompt_template_path: Optional[str] = None,
         ignore_failure: bool = False,
+        output_format: str = "jsonl",
+        jsonl_side_output: bool = False,
     ) -> None:
         """
         args:
@@ -43,8 +47,10 @@ class PromptProcessing(DataProcessing):
             output_data_columns: Optional[List[str]] list of columns (subset of input columns)
                                       to keep in the transformed data output file.
             ignore_failure: bool whether to ignore failure in prompt generation or not.
+            output_format: str format of the transformed data output file, "jsonl", "parquet" or "arrow".
+            jsonl_side_output: bool whether to also write transformed_data.jsonl when the output format is columnar.
         """
-        super().__init__(data_reader_config, output_dir, output_data_columns)
+        super().__init__(data_reader_config, output_dir, output_data_columns, output_format, jsonl_side_output)
         self.ignore_failure = ignore_failure
         if prompt_template_path is None:
             self.prompt_data_processor = None
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+MINUTE = 60
+
+
+class TokenBucket:
+    """A token bucket that refills continuously at rate_per_minute and holds at most capacity tokens, by default one
+    second of refill (at least 1), so that a cold start does not spend a whole minute of budget at once. The balance is allowed to go negative when usage is only known after the fact (e.g. LLM tokens), in which
+    case subsequent requests wait until the debt has been repaid."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be a positive number.")
+        self.rate = rate_per_minute / MINUTE
+        self.capacity = capacity if capacity is not None else max(1, self.rate)
+        self.balance = self.capacity
+        self.last_refill = time.monotonic()
+
+    def refill(self, now):
+        self.balance = min(self.capacity, self.balance + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def time_until(self, amount):
+        """Returns the number of seconds until the balance reaches amount (0 if it already has)."""
+        if self.balance >= amount:
+            return 0
+        return (amount - self.balance) / self.rate
+
+
+class RateLimiter:
+    """Thread-safe rate limiter that enforces a requests-per-minute and/or a tokens-per-minute budget.
+    A single instance is meant to be shared by all the workers of an inference component.
+
+    Requests are admitted up front, one request token each. LLM token usage is only known once the response
+    arrives, so it is charged after the fact with record_usage(), and new requests are held back while the
+    token budget is overdrawn.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, request_burst=None, token_burst=None):
+        """
+        args:
+            requests_per_minute (int): optional. Maximum number of requests per minute.
+            tokens_per_minute (int): optional. Maximum number of tokens (prompt and completion) per minute.
+            request_burst (int): optional. Maximum number of requests that can be made at once after an idle period.
+                Default is requests_per_minute / 60, at least 1.
+            token_burst (int): optional. Maximum number of tokens that can be spent at once after an idle period.
+                Default is tokens_per_minute / 60, at least 1.
+        """
+        if requests_per_minute is None and tokens_per_minute is None:
+            raise ValueError("Either requests_per_minute or tokens_per_minute must be provided.")
+        self.request_bucket = TokenBucket(requests_per_minute, request_burst) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, token_burst) if tokens_per_minute else None
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """Admits one request if the budget allows it.
+        returns:
+            wait_time (float): 0 if the request was admitted, otherwise the number of seconds to wait before retrying.
+        """
+        with self.lock:
+            now = time.monotonic()
+            wait_time = 0
+            if self.request_bucket:
+                self.request_bucket.refill(now)
+                wait_time = self.request_bucket.time_until(1)
+            if self.token_bucket:
+                self.token_bucket.refill(now)
+                # any positive token balance admits a request, its actual cost is charged in record_usage
+                wait_time = max(wait_time, self.token_bucket.time_until(min(1, self.token_bucket.capacity)))
+            if wait_time > 0:
+                return wait_time
+            if self.request_bucket:
+                self.request_bucket.balance -= 1
+            return 0
+
+    def acquire(self):
+        """Blocks until a request is admitted.
+        returns:
+            waited (float): the number of seconds spent waiting.
+        """
+        start_time = time.monotonic()
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time == 0:
+                return time.monotonic() - start_time
+            time.sleep(wait_time)
+
+    async def acquire_async(self):
+        """Same as acquire(), but yields to the event loop while waiting."""
+        start_time = time.monotonic()
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time == 0:
+                return time.monotonic() - start_time
+            await asyncio.sleep(wait_time)
+
+    def record_usage(self, response_dict):
+        """Charges the tokens used by a response against the tokens-per-minute budget."""
+        if not self.token_bucket:
+            return
+        n_tokens = get_total_tokens(response_dict)
+        if not n_tokens:
+            return
+        with self.lock:
+            self.token_bucket.refill(time.monotonic())
+            self.token_bucket.balance -= n_tokens
+
+
+def get_total_tokens(response_dict):
+    """Returns the total number of tokens (prompt and completion) used by a response, as reported in its "usage"
+    field by the different model apis, falling back to n_output_tokens when no usage information is available."""
+    usage = response_dict.get("usage")
+    if isinstance(usage, dict):
+        if usage.get("total_tokens") is not None:
+            return usage["total_tokens"]
+        if usage.get("total_token_count") is not None:
+            return usage["total_token_count"]
+        if usage.get("input_tokens") is not None or usage.get("output_tokens") is not None:
+            return (usage.get("input_tokens") or 0) + (usage.get("output_tokens") or 0)
+    return response_dict.get("n_output_tokens")
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from hashlib import md5, sha256
+
+from eureka_ml_insights.data_utils import NumpyEncoder
+from eureka_ml_insights.models.image_encoding import ImageHandle
+
+# model arguments that hold credentials or only affect how requests are sent, not what the model returns
+NON_SEMANTIC_MODEL_ARGS = ("num_retries", "retry_policy", "timeout", "max_connections", "secret_key_params")
+
+
+def get_model_fingerprint(model_config):
+    """Returns a hash that identifies a model configuration: the model class and its init_args,
+    leaving out credentials and arguments that do not affect the model output (see NON_SEMANTIC_MODEL_ARGS)."""
+    model_class = model_config.class_name
+    init_args = {
+        name: value
+        for name, value in model_config.init_args.items()
+        if name not in NON_SEMANTIC_MODEL_ARGS and not is_secret_arg(name)
+    }
+    fingerprint = {"class": f"{model_class.__module__}.{model_class.__qualname__}", "init_args": init_args}
+    return sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def is_secret_arg(name):
+    name = name.lower()
+    return name.endswith("key") or "secret" in name or "password" in name
+
+
+def compute_images_hash(query_images):
+    """Hashes the pixels of a list of PIL images, or the bytes of the files that ImageHandles reference, so that
+    lazily loaded images are not decoded to compute the key."""
+    images_hash = md5()
+    for image in query_images or []:
+        if isinstance(image, ImageHandle):
+            images_hash.update(b"source")
+            images_hash.update(image.source.read_bytes())
+            continue
+        images_hash.update(f"{image.mode}{image.size}".encode("utf-8"))
+        images_hash.update(image.tobytes())
+    return images_hash.hexdigest()
+
+
+class KeyedLocks:
+    """A lock per key, only kept in memory while it is held or waited for."""
+
+    def __init__(self, lock_factory):
+        self.lock_factory = lock_factory
+        self.locks = {}
+        self.guard = threading.Lock()
+
+    def checkout(self, key):
+        with self.guard:
+            lock, n_users = self.locks.get(key, (None, 0))
+            if lock is None:
+                lock = self.lock_factory()
+            self.locks[key] = (lock, n_users + 1)
+            return lock
+
+    def checkin(self, key):
+        with self.guard:
+            lock, n_users = self.locks[key]
+            if n_users == 1:
+                del self.locks[key]
+            else:
+                self.locks[key] = (lock, n_users - 1)
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of model responses backed by a local SQLite database, shared across runs and experiments.
+    Responses are keyed by the model configuration fingerprint and the model inputs (the prompt hash, the images hash
+    and the remaining model arguments such as the system message). Only valid responses are cached.
+
+    The repeat id of the data point (see MultiplyTransform) is part of the key: a rerun is served from the cache, but
+    the repeats of a data point within a run are not collapsed into a single response, even for models that are
+    configured with a zero temperature, since most APIs do not return identical responses to identical requests.
+    Sharing one response across the repeats is an explicit opt-in, see share_across_repeats.
+
+    Concurrent requests for the same key are deduplicated, the first one calls the model and the others wait for its
+    response to be cached.
+    """
+
+    def __init__(self, path, model_fingerprint, share_across_repeats=False):
+        """
+        args:
+            path (str): path to the SQLite database file, created if it does not exist.
+            model_fingerprint (str): hash identifying the model configuration, see get_model_fingerprint.
+            share_across_repeats (bool): optional. If True, the repeat id of the data point is not part of the key, so
+                all the repeats of a data point get the same response. Default is False.
+        """
+        self.path = path
+        self.model_fingerprint = model_fingerprint
+        self.share_across_repeats = share_across_repeats
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.db_lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.db_lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL)"
+            )
+        self.encoder = NumpyEncoder()
+        self.locks = KeyedLocks(threading.Lock)
+        self.async_locks = KeyedLocks(asyncio.Lock)
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, data, model_args, model_kwargs):
+        """
+        Computes the cache key of a request.
+        args:
+            data (dict): the data point, used for its repeat id unless responses are shared across repeats.
+            model_args (tuple): the text prompt and optionally the query images passed to the model.
+            model_kwargs (dict): the remaining arguments passed to the model.
+        returns:
+            key (str): the cache key.
+        """
+        text_prompt = model_args[0] if model_args else None
+        query_images = model_args[1] if len(model_args) > 1 else None
+        key = {
+            "model": self.model_fingerprint,
+            "prompt_hash": md5(str(text_prompt).encode("utf-8")).hexdigest(),
+            "images_hash": compute_images_hash(query_images),
+            "model_kwargs": model_kwargs,
+        }
+        if not self.share_across_repeats:
+            key["data_repeat_id"] = data.get("data_repeat_id")
+        return sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response for the key, None if there is none."""
+        with self.db_lock:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, response_dict):
+        """Caches a response, unless it is invalid."""
+        if not response_dict.get("is_valid"):
+            return
+        response = self.encoder.encode(response_dict)
+        with self.db_lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                (key, response, time.time()),
+            )
+
+    @contextmanager
+    def lock(self, key):
+        """Holds the lock of the key, so that only one thread at a time looks up and generates a response for it."""
+        lock = self.locks.checkout(key)
+        try:
+            with lock:
+                yield
+        finally:
+            self.locks.checkin(key)
+
+    @asynccontextmanager
+    async def alock(self, key):
+        """Asyncio counterpart of lock(), to be used from a single event loop."""
+        lock = self.async_locks.checkout(key)
+        try:
+            async with lock:
+                yield
+        finally:
+            self.async_locks.checkin(key)
+
+    def get_stats(self):
+        n_requests = self.hits + self.misses
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / n_requests if n_requests else None,
+        }
+
+    def write_stats(self, output_dir):
+        stats = self.get_stats()
+        logging.info(f"Response cache hits: {stats['hits']}, misses: {stats['misses']}.")
+        with open(os.path.join(output_dir, "response_cache_stats.json"), "w") as f:
+            json.dump(stats, f, indent=4)
+
+    def close(self):
+        with self.db_lock:
+            self.connection.close()
@@ -1,17 +1,21 @@
 from .aime_utils import AIMEExtractAnswer
+from .blob_cache import BlobDiskCache
 from .data import (
     AzureDataReader,
     AzureJsonReader,
     AzureMMDataLoader,
+    BufferedJsonLinesWriter,
     DataLoader,
     DataReader,
     HFDataReader,
     HFJsonReader,
+    IndexedJsonLinesReader,
     JsonLinesWriter,
     JsonReader,
     MMDataLoader,
     TXTWriter,
 )
+from .dataframe_io import DataFrameChunkWriter, write_dataframe
 from .encoders import NumpyEncoder
 from .prompt_processing import JinjaPromptTemplate
 from .spatial_utils import (
@@ -45,8 +49,10 @@ from .transform import (
 __all__ = [
     AIMEExtractAnswer,
     JsonLinesWriter,
+    BufferedJsonLinesWriter,
     JsonReader,
     HFJsonReader,
+    IndexedJsonLinesReader,
     AzureJsonReader,
     TXTWriter,
     CopyColumn,
@@ -54,6 +60,7 @@ __all__ = [
     DataLoader,
     AzureDataReader,
     AzureMMDataLoader,
+    BlobDiskCache,
     MMDataLoader,
     HFDataReader,
     JinjaPromptTemplate,
@@ -80,4 +87,6 @@ __all__ = [
     MajorityVoteTransform,
     NumpyEncoder,
     ExtractUsageTransform,
+    write_dataframe,
+    DataFrameChunkWriter,
 ]
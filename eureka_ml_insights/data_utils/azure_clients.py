@@ -0,0 +1,76 @@
+import logging
+import threading
+from urllib.parse import unquote, urlsplit
+
+from azure.storage.blob import BlobServiceClient
+
+from eureka_ml_insights.models.auth import clear_azure_credential, get_azure_credential
+
+# number of parallel connections used to download the ranges of a large blob
+DEFAULT_MAX_CONCURRENCY = 8
+# blobs larger than this are downloaded in ranges of DEFAULT_MAX_CHUNK_GET_SIZE bytes
+DEFAULT_MAX_SINGLE_GET_SIZE = 32 * 2**20
+DEFAULT_MAX_CHUNK_GET_SIZE = 8 * 2**20
+
+_service_clients = {}
+_container_clients = {}
+_lock = threading.Lock()
+
+
+def get_blob_service_client(account_url):
+    """Returns the BlobServiceClient of a storage account, shared by all the readers and data loaders of the
+    process, along with its connection pool. It authenticates with the credential shared with the models."""
+    credential = get_azure_credential()
+    with _lock:
+        service_client = _service_clients.get(account_url)
+        if service_client is None:
+            service_client = BlobServiceClient(
+                account_url=account_url,
+                credential=credential,
+                logger=logging.getLogger("azure.storage"),
+                max_single_get_size=DEFAULT_MAX_SINGLE_GET_SIZE,
+                max_chunk_get_size=DEFAULT_MAX_CHUNK_GET_SIZE,
+            )
+            _service_clients[account_url] = service_client
+        return service_client
+
+
+def get_container_client(account_url, container):
+    """Returns the shared ContainerClient of a container, see get_blob_service_client()."""
+    service_client = get_blob_service_client(account_url)
+    with _lock:
+        container_client = _container_clients.get((account_url, container))
+        if container_client is None:
+            container_client = service_client.get_container_client(container)
+            _container_clients[(account_url, container)] = container_client
+        return container_client
+
+
+def parse_blob_url(blob_url):
+    """
+    args:
+        blob_url: str, full URL of a blob, e.g. https://account.blob.core.windows.net/container/path/to/blob.jsonl
+    returns:
+        account_url: str, URL of the storage account.
+        container: str, name of the container.
+        blob_name: str, name of the blob in the container.
+    """
+    parts = urlsplit(blob_url)
+    container, _, blob_name = parts.path.lstrip("/").partition("/")
+    if not container or not blob_name:
+        raise ValueError(f"{blob_url} is not the URL of a blob.")
+    return f"{parts.scheme}://{parts.netloc}", container, unquote(blob_name)
+
+
+def get_blob_client(blob_url):
+    """Returns a BlobClient of the blob, created from the shared ContainerClient of its container."""
+    account_url, container, blob_name = parse_blob_url(blob_url)
+    return get_container_client(account_url, container).get_blob_client(blob_name)
+
+
+def clear_azure_clients():
+    """Forgets the shared credential and clients, e.g. after the credentials of the environment changed."""
+    clear_azure_credential()
+    with _lock:
+        _service_clients.clear()
+        _container_clients.clear()
@@ -0,0 +1,95 @@
+import logging
+import os
+import tempfile
+import threading
+from hashlib import sha256
+
+log = logging.getLogger("data_reader")
+
+DEFAULT_CACHE_MAX_BYTES = 10 * 2**30
+
+
+class BlobDiskCache:
+    """
+    Size-bounded local disk cache of blob contents, shared by all the runs that use the same cache directory.
+    Entries are keyed by container, blob name and etag, so that a blob that is overwritten in the storage account is
+    downloaded again. Entries are files named after the hash of their key; reading an entry refreshes its modification
+    time, and when the cache grows larger than max_bytes the least recently used entries are deleted.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        """
+        args:
+            cache_dir (str): directory where the blobs are cached.
+            max_bytes (int): optional. Maximum total size of the cached blobs. Default is 10GB.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.n_bytes = sum(size for _, _, size in self._list_entries())
+
+    def get_path(self, container, blob_name, etag):
+        digest = sha256(f"{container}\n{blob_name}\n{etag}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def get(self, container, blob_name, etag):
+        """returns: the cached content of the blob, None if it is not cached."""
+        path = self.get_path(container, blob_name, etag)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, container, blob_name, etag, data):
+        """Caches the content of a blob, evicting the least recently used blobs if the cache is full."""
+        if len(data) > self.max_bytes:
+            return
+        path = self.get_path(container, blob_name, etag)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first, so that concurrent readers never see a partially written blob
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            log.warning(f"Could not cache blob {blob_name}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self.lock:
+            self.n_bytes += len(data)
+            if self.n_bytes > self.max_bytes:
+                self._evict()
+
+    def _list_entries(self):
+        entries = []
+        for directory, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if file_name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # evict down to 90% of the maximum size, so that the directory is not scanned after every put
+        entries = sorted(self._list_entries())
+        self.n_bytes = sum(size for _, _, size in entries)
+        target_bytes = 0.9 * self.max_bytes
+        for _, path, size in entries:
+            if self.n_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.n_bytes -= size
@@ -1,26 +1,51 @@
+import itertools
 import json
 import logging
 import os
+import queue
 import re
+import tempfile
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from typing import List, Optional
 
 import jsonlines
+import numpy as np
 import pandas as pd
-from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobClient, ContainerClient
+from azure.core import MatchConditions
 from datasets import load_dataset
 from PIL import Image
 from tqdm import tqdm
 
+from eureka_ml_insights.models.image_encoding import ImageHandle, ImageSource, set_image_source
 from eureka_ml_insights.secret_management import get_secret
 
+from .azure_clients import DEFAULT_MAX_CONCURRENCY, get_blob_client, get_container_client
+from .blob_cache import DEFAULT_CACHE_MAX_BYTES, BlobDiskCache
+from .dataframe_io import (
+    ARROW_EXTENSIONS,
+    ColumnarRecordReader,
+    DataFrameChunkWriter,
+    find_columnar_sibling,
+    iter_columnar_chunks,
+    iter_dataframe_chunks,
+    read_columnar_dataframe,
+)
 from .encoders import NumpyEncoder
-from .transform import DFTransformBase
+from .transform import N_REPEATS_COLUMN, DFTransformBase, split_transform_stages
 
 log = logging.getLogger("data_reader")
 
+JSONL_BACKENDS = ("pandas", "orjson", "pyarrow")
+# size of the chunks that jsonl files are parsed in by the orjson backend
+JSONL_CHUNK_SIZE = 8 * 2**20
+# column that holds the index of the rows spilled to disk by DataReader.iter_dataset_chunks()
+SPILL_INDEX_COLUMN = "__spill_index"
+
 
 class AzureStorageLogger:
     def get_logger(self, level=logging.WARNING):
@@ -43,7 +68,7 @@ class DataLoader:
         self.total_lines = total_lines
 
     def __enter__(self):
-        self.reader = jsonlines.open(self.path, "r")
+        self.reader = self._open_reader()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -52,13 +77,21 @@ class DataLoader:
     def __len__(self):
         if self.total_lines is None:
             log.info("Total data lines not provided, iterating through the data to get the total lines.")
-            with jsonlines.open(self.path, "r") as reader:
-                self.total_lines = sum(1 for _ in reader)
+            with self._open_reader() as reader:
+                self.total_lines = sum(get_n_repeats(row) for row in reader)
         return self.total_lines
 
+    def _open_reader(self):
+        # components that write Parquet or Arrow outputs are read from those rather than from their jsonl outputs
+        columnar_path = find_columnar_sibling(self.path)
+        if columnar_path is not None:
+            log.info(f"Loading the rows of {self.path} from {columnar_path}.")
+            return ColumnarRecordReader(columnar_path)
+        return jsonlines.open(self.path, "r")
+
     def __iter__(self):
         for data in self.reader.iter(skip_empty=True, skip_invalid=True):
-            yield self.prepare_model_input(data)
+            yield from self.expand_repeats(*self.prepare_model_input(data))
 
     def prepare_model_input(self, row):
         query_text = row["prompt"]
@@ -66,10 +99,40 @@ class DataLoader:
         model_kwargs = {}
         return row, model_args, model_kwargs
 
+    def expand_repeats(self, row, model_args, model_kwargs):
+        """
+        Expands a row written by a virtual MultiplyTransform into its repeats, which share the model inputs prepared
+        for the row. Repeat i of the row gets the data_repeat_id "repeat_i" and the uid row["uid"] * n_repeats + i, so
+        that uids are unique and increase in the order of the rows. Other rows are yielded as they are.
+        returns:
+            model_inputs: generator of (row, model_args, model_kwargs) tuples.
+        """
+        if not is_virtual_row(row):
+            yield row, model_args, model_kwargs
+            return
+        n_repeats = int(row[N_REPEATS_COLUMN])
+        for i in range(n_repeats):
+            repeat_row = {k: v for k, v in row.items() if k != N_REPEATS_COLUMN}
+            repeat_row["data_repeat_id"] = f"repeat_{i}"
+            if "uid" in row:
+                repeat_row["uid"] = int(row["uid"]) * n_repeats + i
+            yield repeat_row, model_args, dict(model_kwargs)
+
     def get_sample_model_input(self):
         """Get a sample data row and model_args from the jsonlines reader."""
         row = next(self.reader.iter(skip_empty=True, skip_invalid=True))
-        return self.prepare_model_input(row)
+        return next(self.expand_repeats(*self.prepare_model_input(row)))
+
+
+def is_virtual_row(row):
+    """returns: True if the row was written by a virtual MultiplyTransform and its repeats were not expanded yet."""
+    n_repeats = row.get(N_REPEATS_COLUMN)
+    return n_repeats is not None and not pd.isna(n_repeats) and "data_repeat_id" not in row and "data_point_id" in row
+
+
+def get_n_repeats(row):
+    """returns: the number of rows that a row stands for, i.e. its number of repeats if it is a virtual row, else 1."""
+    return int(row[N_REPEATS_COLUMN]) if is_virtual_row(row) else 1
 
 
 class MMDataLoader(DataLoader):
@@ -84,6 +147,7 @@ class MMDataLoader(DataLoader):
         image_column_names: List[str] = None,
         image_column_search_regex: str = "image",
         misc_columns: List[str] = None,
+        lazy_images: bool = False,
     ):
         super().__init__(path, total_lines)
         self.mm_data_path_prefix = mm_data_path_prefix
@@ -91,6 +155,7 @@ class MMDataLoader(DataLoader):
         self.image_column_names = image_column_names
         self.image_column_search_regex = image_column_search_regex
         self.misc_columns = misc_columns
+        self.lazy_images = lazy_images
         """
         Initializes an MMDataLoader.
         args:
@@ -101,6 +166,9 @@ class MMDataLoader(DataLoader):
             image_column_names: optional List of str, names of columns that have images in them.
             image_column_search_regex: optional Regex str, to search for which columns have images in them.
             misc_columns: optional List of str, names of other columns from the data to include in the model inputs.
+            lazy_images: optional bool, if True the model inputs hold ImageHandles that reference the image files, and
+                images are only read and decoded when the request is made. Lowers the memory used by the rows that
+                wait to be sent.
         """
 
     def prepare_model_input(self, row):
@@ -199,11 +267,29 @@ class MMDataLoader(DataLoader):
 
         query_images = []
         for image in images:
-            query_image = self.load_image(image)
+            if self.lazy_images:
+                query_image = ImageHandle(self.get_image_source(image))
+            else:
+                query_image = self.load_image(image)
             query_images.append(query_image)
 
         return query_images
 
+    def get_image_source(self, image_file_name):
+        """
+        Describes where to read an image from, without reading it.
+        args:
+            image_file_name: str, images path.
+        returns:
+            source: ImageSource.
+        """
+        # prepend the local path prefix
+        full_image_file_path = os.path.join(self.mm_data_path_prefix, image_file_name)
+        # the file path and modification time identify the content, so that the image is only encoded once
+        stat = os.stat(full_image_file_path)
+        source_key = (os.path.abspath(full_image_file_path), stat.st_mtime_ns, stat.st_size)
+        return ImageSource(source_key, path=full_image_file_path)
+
     def load_image(self, image_file_name):
         """
         Load image file from local path.
@@ -212,10 +298,11 @@ class MMDataLoader(DataLoader):
         returns:
             query_image: PIL Image.
         """
-        # prepend the local path prefix
-        full_image_file_path = os.path.join(self.mm_data_path_prefix, image_file_name)
-        query_image = Image.open(full_image_file_path).convert("RGB")
-        return query_image
+        source = self.get_image_source(image_file_name)
+        with Image.open(source.path) as source_image:
+            query_image = source_image.convert("RGB")
+            source.format = source_image.format
+        return set_image_source(query_image, source)
 
 
 class AzureDataAuthenticator:
@@ -235,7 +322,9 @@ class AzureDataAuthenticator:
 
 
 class AzureMMDataLoader(MMDataLoader):
-    """This data loader allows for loading images that are referenced in the local dataset from Azure Blob Storage."""
+    """This data loader allows for loading images that are referenced in the local dataset from Azure Blob Storage.
+    Images are downloaded ahead of the iterator by a pool of threads, and can be cached on the local disk so that
+    repeated runs over the same dataset do not download them again."""
 
     def __init__(
         self,
@@ -246,6 +335,12 @@ class AzureMMDataLoader(MMDataLoader):
         image_column_names=None,
         image_column_search_regex="image",
         misc_columns=None,
+        lazy_images=False,
+        prefetch_workers=8,
+        prefetch_size=None,
+        cache_dir=None,
+        cache_max_bytes=DEFAULT_CACHE_MAX_BYTES,
+        container_client=None,
     ):
         """
         Initializes an AzureMMDataLoader.
@@ -257,6 +352,17 @@ class AzureMMDataLoader(MMDataLoader):
             image_column_names: optional List of str, names of columns that have images in them.
             image_column_search_regex: optional Regex str, to search for which columns have images in them.
             misc_columns: optional List of str, names of other columns from the data to include in the model inputs.
+            lazy_images: optional bool, if True images are only downloaded and decoded when the request is made.
+            prefetch_workers: optional int, number of threads downloading the images of the next rows while the
+                current rows are processed. 0 to download every image when its row is read. Default is 8.
+            prefetch_size: optional int, number of rows whose images are downloaded ahead of the iterator.
+                Default is 4 * prefetch_workers.
+            cache_dir: optional str, local directory where downloaded images are cached, keyed by container, blob
+                name and etag. Default is None, no disk cache.
+            cache_max_bytes: optional int, maximum size of the disk cache, least recently used images are evicted
+                first. Default is 10GB.
+            container_client: optional, the client of the blob container, e.g. a local stand-in for tests.
+                Default is the ContainerClient of the container shared by the process, see get_container_client().
         """
         super().__init__(
             path,
@@ -264,21 +370,114 @@ class AzureMMDataLoader(MMDataLoader):
             image_column_names=image_column_names,
             image_column_search_regex=image_column_search_regex,
             misc_columns=misc_columns,
+            lazy_images=lazy_images,
         )
         self.logger = AzureStorageLogger().get_logger()
         self.account_url = account_url
         self.blob_container = blob_container
-        self.container_client = ContainerClient(
-            account_url=self.account_url,
-            container_name=self.blob_container,
-            credential=DefaultAzureCredential(),
-            logger=self.logger,
+        # the client, its credential and its connections are shared with the other loaders and readers of the account
+        self.container_client = container_client or get_container_client(self.account_url, self.blob_container)
+        self.prefetch_workers = prefetch_workers
+        self.prefetch_size = prefetch_size or 4 * prefetch_workers
+        self.disk_cache = BlobDiskCache(cache_dir, cache_max_bytes) if cache_dir else None
+        # downloads of the images of the rows ahead of the iterator: blob name -> [future, number of rows]
+        self.prefetched = {}
+
+    def __iter__(self):
+        if not self.prefetch_workers:
+            yield from super().__iter__()
+            return
+        window = deque()
+        executor = ThreadPoolExecutor(max_workers=self.prefetch_workers)
+        try:
+            for data in self.reader.iter(skip_empty=True, skip_invalid=True):
+                window.append((data, self._prefetch(executor, data)))
+                if len(window) > self.prefetch_size:
+                    yield from self.expand_repeats(*self._prepare_prefetched_model_input(*window.popleft()))
+            while window:
+                yield from self.expand_repeats(*self._prepare_prefetched_model_input(*window.popleft()))
+        finally:
+            # the downloads that have not started are cancelled, shutdown(cancel_futures=True) needs python 3.9
+            for future, _ in self.prefetched.values():
+                future.cancel()
+            executor.shutdown(wait=False)
+            self.prefetched.clear()
+
+    def _prefetch(self, executor, row):
+        """Starts downloading the images of a row. returns: the names of the blobs being downloaded."""
+        if not self.load_images:
+            return []
+        image_column_names = self.image_column_names or self._search_for_image_columns(row)
+        if not image_column_names:
+            return []
+        blob_names = self._gather_image_file_names(row, image_column_names)
+        if not isinstance(blob_names, list):
+            blob_names = [blob_names]
+        for blob_name in blob_names:
+            if blob_name in self.prefetched:
+                self.prefetched[blob_name][1] += 1
+            else:
+                self.prefetched[blob_name] = [executor.submit(self.download_blob, blob_name), 1]
+        return blob_names
+
+    def _prepare_prefetched_model_input(self, row, blob_names):
+        try:
+            return self.prepare_model_input(row)
+        finally:
+            for blob_name in blob_names:
+                self.prefetched[blob_name][1] -= 1
+                if self.prefetched[blob_name][1] == 0:
+                    del self.prefetched[blob_name]
+
+    def download_blob(self, blob_name):
+        """
+        Downloads a blob, or reads it from the disk cache if it was downloaded before and has not changed since.
+        args:
+            blob_name: str, name of the blob in the container.
+        returns:
+            data: bytes, content of the blob.
+            etag: str, etag of the blob, None if unknown.
+        """
+        if self.disk_cache is None:
+            downloader = self.container_client.download_blob(blob_name)
+            return downloader.readall(), getattr(getattr(downloader, "properties", None), "etag", None)
+        blob_client = self.container_client.get_blob_client(blob_name)
+        etag = blob_client.get_blob_properties().etag
+        data = self.disk_cache.get(self.blob_container, blob_name, etag)
+        if data is None:
+            # only download the version of the blob whose etag was checked
+            data = blob_client.download_blob(etag=etag, match_condition=MatchConditions.IfNotModified).readall()
+            self.disk_cache.put(self.blob_container, blob_name, etag, data)
+        return data, etag
+
+    def _get_blob(self, blob_name):
+        """Returns the content and etag of a blob, from the prefetched downloads if the blob was prefetched."""
+        prefetched = self.prefetched.get(blob_name)
+        if prefetched is not None:
+            return prefetched[0].result()
+        return self.download_blob(blob_name)
+
+    def _get_source_key(self, blob_name, etag):
+        # the etag changes whenever the blob is overwritten
+        return (self.account_url, self.blob_container, blob_name, etag) if etag else None
+
+    def get_image_source(self, image_file_name):
+        if image_file_name in self.prefetched:
+            data, etag = self._get_blob(image_file_name)
+            return ImageSource(self._get_source_key(image_file_name, etag), data=data)
+        # the blob is downloaded when the image is needed, so its etag is not known yet
+        return ImageSource(
+            (self.account_url, self.blob_container, image_file_name),
+            reader=lambda: self.download_blob(image_file_name)[0],
         )
 
     def load_image(self, image_file_name):
-        image_bytes = self.container_client.download_blob(image_file_name).readall()
-        query_image = Image.open(BytesIO(image_bytes)).convert("RGB")
-        return query_image
+        image_bytes, etag = self._get_blob(image_file_name)
+        with Image.open(BytesIO(image_bytes)) as source_image:
+            query_image = source_image.convert("RGB")
+            image_format = source_image.format
+        source = ImageSource(self._get_source_key(image_file_name, etag), format=image_format, data=image_bytes)
+        return set_image_source(query_image, source)
 
 
 class JsonLinesWriter:
@@ -299,6 +498,96 @@ class JsonLinesWriter:
         self.writer.close()
 
 
+class BufferedJsonLinesWriter:
+    """
+    Appends records to a jsonl file from a dedicated writer thread, through a file handle that stays open for the
+    lifetime of the context. write() encodes the record in the calling thread and hands it over through a bounded
+    queue, so callers never wait on the file system unless the queue is full. The writer thread writes the records
+    it finds in the queue in batches and flushes the file after each batch, so every record that has been written
+    survives a crash of the process. The file is also fsynced every fsync_interval seconds and on exit.
+    """
+
+    _STOP = object()
+
+    def __init__(self, out_path, mode="a", max_queue_size=1000, batch_size=100, fsync_interval=5.0):
+        """
+        args:
+            out_path (str): path to the jsonl file.
+            mode (str): optional. File mode, "a" to append to an existing file or "w" to overwrite it. Default is "a".
+            max_queue_size (int): optional. Maximum number of encoded records waiting to be written. Default is 1000.
+            batch_size (int): optional. Maximum number of records written between two flushes. Default is 100.
+            fsync_interval (float): optional. Minimum number of seconds between two fsyncs of the file, None to only
+                fsync on exit. Default is 5 seconds.
+        """
+        self.out_path = out_path
+        # if the directory does not exist, create it
+        directory = os.path.dirname(out_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.mode = mode
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.encoder = NumpyEncoder()
+        self.queue = None
+        self.thread = None
+        self.error = None
+
+    def __enter__(self):
+        self.file = open(self.out_path, mode=self.mode, encoding="utf-8")
+        self.queue = queue.Queue(maxsize=self.max_queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._write_loop, name="jsonl-writer", daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, data):
+        if self.error:
+            raise self.error
+        self.queue.put(self.encoder.encode(data) + "\n")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.queue.put(self._STOP)
+        self.thread.join()
+        try:
+            if not self.file.closed:
+                self._sync()
+        finally:
+            self.file.close()
+        if self.error and exc_type is None:
+            raise self.error
+
+    def _write_loop(self):
+        last_sync = time.monotonic()
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is self._STOP:
+                batch.pop()
+                stop = True
+            if not batch or self.error:
+                continue
+            try:
+                self.file.writelines(batch)
+                self.file.flush()
+                if self.fsync_interval is not None and time.monotonic() - last_sync >= self.fsync_interval:
+                    os.fsync(self.file.fileno())
+                    last_sync = time.monotonic()
+            except Exception as e:
+                # keep draining the queue so that writers are not blocked, the error is raised in the caller thread
+                log.error(f"Failed to write to {self.out_path}: {e}")
+                self.error = e
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+
 class JsonReader(DataReaderBase):
     """
     This is a DataReader that loads a json or jsonl data file from a local path.
@@ -321,8 +610,181 @@ class JsonReader(DataReaderBase):
         return data
 
 
+class IndexedJsonLinesReader:
+    """
+    Streams a local jsonl file once and keeps in memory only the byte offset of each record and the values of a few
+    index_columns, keyed by the key column. Full records are read back from disk on demand with get().
+    Lookups are safe to run from multiple threads, each thread reads through its own file handle.
+    """
+
+    def __init__(self, path, key="uid", index_columns=()):
+        """
+        args:
+            path (str): path to the jsonl file.
+            key (str): column used to look records up. If a key appears more than once, the first record is used.
+            index_columns (list): optional. Columns whose values are kept in memory for every record.
+        """
+        self.path = path
+        self.key = key
+        self.index_columns = list(index_columns)
+        # key -> (offset, length, {index column: value})
+        self.index = {}
+        # union of the columns of all records, in order of appearance
+        self.columns = []
+        self.n_records = 0
+        self.local = threading.local()
+        self.file_handles = []
+        self.file_handles_lock = threading.Lock()
+
+    def build_index(self):
+        columns = {}
+        offset = 0
+        with open(self.path, mode="rb") as reader:
+            for line in reader:
+                length = len(line)
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # e.g. a partially written last line if the process that wrote the file was killed
+                        log.warning(f"Skipping invalid json record at byte offset {offset} of {self.path}.")
+                        offset += length
+                        continue
+                    for col in record:
+                        columns.setdefault(col, None)
+                    if self.key not in record:
+                        raise ValueError(f"Record at byte offset {offset} of {self.path} has no '{self.key}' column.")
+                    if record[self.key] not in self.index:
+                        self.index[record[self.key]] = (
+                            offset,
+                            length,
+                            {col: record.get(col) for col in self.index_columns},
+                        )
+                    self.n_records += 1
+                offset += length
+        self.columns = list(columns)
+        return self
+
+    def keys(self):
+        return self.index.keys()
+
+    def get_index_values(self, key):
+        """Returns the in-memory index_columns values of the record with the given key, None if there is no such record."""
+        entry = self.index.get(key)
+        return None if entry is None else entry[2]
+
+    def get(self, key):
+        """Reads the full record with the given key from disk, None if there is no such record.
+        Columns that are missing from this particular record are set to None."""
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        reader = self._get_file_handle()
+        reader.seek(offset)
+        record = json.loads(reader.read(length))
+        return {col: record.get(col) for col in self.columns}
+
+    def _get_file_handle(self):
+        reader = getattr(self.local, "reader", None)
+        if reader is None:
+            reader = open(self.path, mode="rb")
+            self.local.reader = reader
+            with self.file_handles_lock:
+                self.file_handles.append(reader)
+        return reader
+
+    def close(self):
+        with self.file_handles_lock:
+            for reader in self.file_handles:
+                reader.close()
+            self.file_handles = []
+        self.local = threading.local()
+
+
+def iter_jsonl_lines(chunks):
+    """
+    Splits a stream of byte chunks into lines, without holding more than a chunk and a partial line in memory.
+    args:
+        chunks: iterable of bytes, consecutive chunks of a jsonl file.
+    returns:
+        lines: generator of bytes, the non-empty lines of the file.
+    """
+    remainder = b""
+    for chunk in chunks:
+        lines = (remainder + chunk).split(b"\n") if remainder else chunk.split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if remainder.strip():
+        yield remainder
+
+
+def read_jsonl_columns(chunks, columns=None, loads=json.loads):
+    """
+    Parses a stream of jsonl byte chunks into a DataFrame, one line at a time. Records are appended to a list per
+    column rather than kept as dicts, and the file is never decoded as a whole, so that peak memory stays close to
+    the size of the DataFrame. Invalid lines and lines that are not json objects are skipped, and the result is the
+    same as pd.DataFrame of the list of records.
+    args:
+        chunks: iterable of bytes, consecutive chunks of a jsonl file.
+        columns: optional list of str, only these columns are kept, in this order. Missing columns are ignored.
+        loads: optional callable, parses a line, e.g. orjson.loads. Default is json.loads.
+    returns:
+        df: pd.DataFrame, with the columns in order of first appearance unless columns is given.
+    """
+    selected_columns = set(columns) if columns is not None else None
+    values = {}
+    n_records = 0
+    for line in iter_jsonl_lines(chunks):
+        try:
+            record = loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict):
+            continue
+        for key, value in record.items():
+            if selected_columns is not None and key not in selected_columns:
+                continue
+            column = values.get(key)
+            if column is None:
+                # columns that appear after the first records are missing from these records
+                column = values[key] = [np.nan] * n_records
+            column.append(value)
+        n_records += 1
+        for column in values.values():
+            if len(column) < n_records:
+                column.append(np.nan)
+    if columns is not None:
+        values = {key: values[key] for key in columns if key in values}
+    return pd.DataFrame(values, index=pd.RangeIndex(n_records))
+
+
+def iter_file_chunks(path, chunk_size=JSONL_CHUNK_SIZE):
+    """Reads a local file in binary chunks."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
 class AzureBlobReader:
-    """Reads an Azure storage blob from a full URL to a str"""
+    """Reads an Azure storage blob from a full URL to a str, through the clients shared by the process."""
+
+    max_concurrency = DEFAULT_MAX_CONCURRENCY
+
+    def download_azure_blob(self, blob_url):
+        """
+        Downloads an Azure storage blob. Large blobs are downloaded in ranges over max_concurrency connections.
+        args:
+            blob_url: str, The Azure storage blob full URL.
+        returns:
+            downloader: azure.storage.blob.StorageStreamDownloader, to read the blob from, all at once or in chunks.
+        """
+        return get_blob_client(blob_url).download_blob(max_concurrency=self.max_concurrency)
 
     def read_azure_blob(self, blob_url) -> str:
         """
@@ -330,9 +792,8 @@ class AzureBlobReader:
         args:
             blob_url: str, The Azure storage blob full URL.
         """
-        blob_client = BlobClient.from_blob_url(blob_url, credential=DefaultAzureCredential(), logger=self.logger)
         # real all the bytes from the blob
-        file = blob_client.download_blob().readall()
+        file = self.download_azure_blob(blob_url).readall()
         file = file.decode("utf-8")
         return file
 
@@ -348,6 +809,7 @@ class AzureJsonReader(JsonReader, AzureBlobReader):
         account_url: str,
         blob_container: str,
         blob_name: str,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
     ):
         """
         Initializes an AzureJsonReader.
@@ -355,10 +817,12 @@ class AzureJsonReader(JsonReader, AzureBlobReader):
             account_url: str, The Azure storage account URL.
             blob_container: str, Azure storage container name.
             blob_name: str, Azure storage blob name.
+            max_concurrency: optional int, number of connections used to download the ranges of a large blob.
         """
         self.blob_url = f"{account_url}/{blob_container}/{blob_name}"
         super().__init__(self.blob_url)
         self.logger = AzureStorageLogger().get_logger()
+        self.max_concurrency = max_concurrency
 
     def read(self) -> dict:
         file = super().read_azure_blob(self.blob_url)
@@ -423,14 +887,24 @@ class DataReader:
         path: str,
         format: str = None,
         transform: Optional[DFTransformBase] = None,
+        columns: List[str] = None,
+        backend: str = "pandas",
         **kwargs,
     ):
         """
         Initializes an DataReader.
         args:
             path: str, local path to the dataset file.
-            format: optional str, to specify file format (parquet, csv, and jsonl).
+            format: optional str, to specify file format (parquet, arrow, csv, and jsonl). A jsonl path is loaded
+                from the Parquet or Arrow IPC file with the same name when a component wrote one, see
+                find_columnar_sibling().
             transform: optional Transform, to apply after loading.
+            columns: optional List of str, only these columns are loaded, before the transform is applied. Columns
+                that are not in the file are ignored.
+            backend: optional str, parser of jsonl files. "pandas" (default) uses pd.read_json. "orjson" parses the
+                file line by line with orjson and only materializes the selected columns, with the dtypes that
+                pd.DataFrame infers from the records. "pyarrow" uses pyarrow.json, which is the fastest on large files
+                but infers arrow types, e.g. lists become numpy arrays.
             kwargs: addtional arguments.
         """
         self.path = path
@@ -440,6 +914,10 @@ class DataReader:
         else:
             self.format = ext.lower()
         self.transform = transform
+        if backend not in JSONL_BACKENDS:
+            raise ValueError(f"backend must be one of {JSONL_BACKENDS}.")
+        self.columns = columns
+        self.backend = backend
         self.kwargs = kwargs
 
     def load_dataset(self) -> pd.DataFrame:
@@ -452,20 +930,170 @@ class DataReader:
         log.info(f"Transformed dataset has shape: {df.shape}")
         return df
 
+    def iter_dataset_chunks(self, chunk_size: int):
+        """
+        Loads the dataset and applies the transform chunk by chunk, for datasets whose transformed data frame does not
+        fit in memory. Transforms are applied to every chunk on its own, except the transforms that need the full data
+        frame (see DFTransformBase.needs_full_frame): the chunks that reach such a transform are spilled to a temporary
+        Arrow file, and its output is split in chunks again. Transforms that implement transform_spill(), like
+        SamplerTransform and MajorityVoteTransform, read the spilled rows in passes over their chunks; the spilled rows
+        of the other ones are loaded as a single data frame, so they need the full transformed data frame to fit in
+        memory. The rows are the rows of load_dataset(), but transforms that add rows, like MultiplyTransform, order
+        them chunk by chunk.
+        args:
+            chunk_size: int, number of rows read from the dataset at once.
+        returns:
+            chunks: generator of pd.DataFrame, the transformed chunks, indexed by row number in the transformed dataset.
+        """
+        # like the data frame of load_dataset(), chunks are indexed by row number before the transforms are applied
+        chunks = self._index_chunks(self._iter_chunks(chunk_size))
+        for needs_full_frame, transforms in split_transform_stages(self.transform):
+            if needs_full_frame:
+                chunks = self._apply_full_frame_transforms(chunks, transforms, chunk_size)
+            else:
+                chunks = self._apply_chunk_transforms(chunks, transforms)
+        n_rows = 0
+        for chunk in self._index_chunks(chunks):
+            n_rows += len(chunk)
+            yield chunk
+        log.info(f"Transformed dataset has {n_rows} rows.")
+
+    @staticmethod
+    def _index_chunks(chunks):
+        offset = 0
+        for chunk in chunks:
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+    @staticmethod
+    def _apply_chunk_transforms(chunks, transforms):
+        for chunk in chunks:
+            for transform in transforms:
+                chunk = transform.transform(chunk)
+            yield chunk
+
+    @staticmethod
+    def _apply_full_frame_transforms(chunks, transforms, chunk_size):
+        # the index is spilled along with the data, since transforms like MultiplyTransform read it
+        with tempfile.TemporaryDirectory() as spill_dir:
+            spill_path = os.path.join(spill_dir, "spill.jsonl")
+            n_rows = 0
+            with DataFrameChunkWriter(spill_path, "arrow") as writer:
+                for chunk in chunks:
+                    writer.write(chunk.rename_axis(SPILL_INDEX_COLUMN).reset_index())
+                    n_rows += len(chunk)
+            if n_rows and len(transforms) == 1 and hasattr(transforms[0], "transform_spill"):
+                log.info(f"Applying {type(transforms[0]).__name__} to {n_rows} rows spilled from the chunks.")
+
+                def read_columns(columns):
+                    df = pd.concat(DataReader._iter_spilled_chunks(spill_path, chunk_size, columns))
+                    return df.reset_index(drop=True)
+
+                def iter_chunks():
+                    return DataReader._iter_spilled_chunks(spill_path, chunk_size)
+
+                for df in transforms[0].transform_spill(read_columns, iter_chunks):
+                    yield from iter_dataframe_chunks(df, chunk_size)
+                return
+            df = DataReader(spill_path).load_dataset()
+        if SPILL_INDEX_COLUMN in df.columns:
+            df = df.set_index(SPILL_INDEX_COLUMN).rename_axis(None)
+        log.info(f"Applying {[type(t).__name__ for t in transforms]} to {len(df)} rows gathered from the chunks.")
+        for transform in transforms:
+            df = transform.transform(df)
+        yield from iter_dataframe_chunks(df, chunk_size)
+
+    @staticmethod
+    def _iter_spilled_chunks(spill_path, chunk_size, columns=None):
+        """Reads the rows spilled by _apply_full_frame_transforms() in chunks, indexed like the spilled chunks."""
+        spilled_columns = None if columns is None else [SPILL_INDEX_COLUMN] + list(columns)
+        for chunk in DataReader(spill_path, columns=spilled_columns)._iter_chunks(chunk_size):
+            yield chunk.set_index(SPILL_INDEX_COLUMN).rename_axis(None)
+
+    def _iter_chunks(self, chunk_size):
+        columnar_path = find_columnar_sibling(self.path) if self.format == ".jsonl" else None
+        if columnar_path is None and self.format in ARROW_EXTENSIONS + (".parquet",):
+            columnar_path = self.path
+        if columnar_path is not None:
+            log.info(f"Loading {self.path} from {columnar_path} in chunks of {chunk_size} rows.")
+            chunks = iter_columnar_chunks(columnar_path, chunk_size, self.columns)
+        elif self.format == ".jsonl":
+            log.info(f"Loading JSONL Data From {self.path} in chunks of {chunk_size} rows.")
+            chunks = self._iter_jsonl_chunks(chunk_size)
+        else:
+            log.info(f"Loading {self.path} as csv in chunks of {chunk_size} rows.")
+            chunks = pd.read_csv(self.path, chunksize=chunk_size, **self.kwargs)
+        for chunk in chunks:
+            yield self._select_columns(chunk)
+
+    def _iter_jsonl_chunks(self, chunk_size):
+        if self.backend == "pandas":
+            with pd.read_json(
+                self.path, lines=True, chunksize=chunk_size, convert_dates=False, convert_axes=False, **self.kwargs
+            ) as reader:
+                yield from reader
+            return
+        lines = iter_jsonl_lines(iter_file_chunks(self.path))
+        while True:
+            batch = list(itertools.islice(lines, chunk_size))
+            if not batch:
+                break
+            if self.backend == "orjson":
+                import orjson
+
+                yield read_jsonl_columns([b"\n".join(batch)], columns=self.columns, loads=orjson.loads)
+            else:
+                import pyarrow.json
+
+                yield pyarrow.json.read_json(BytesIO(b"\n".join(batch))).to_pandas()
+
     def _load_dataset(self) -> pd.DataFrame:
-        if self.format == ".parquet":
+        columnar_path = find_columnar_sibling(self.path) if self.format == ".jsonl" else None
+        if columnar_path is not None:
+            log.info(f"Loading {self.path} from {columnar_path}.")
+            df = read_columnar_dataframe(columnar_path, self.columns)
+        elif self.format in ARROW_EXTENSIONS:
+            log.info(f"Loading Arrow Data From {self.path}.")
+            df = read_columnar_dataframe(self.path, self.columns)
+        elif self.format == ".parquet":
             log.info(f"Loading Parquet Data From {self.path}.")
-            df = pd.read_parquet(self.path, **self.kwargs)
+            if self.columns is not None:
+                import pyarrow.parquet
+
+                names = pyarrow.parquet.read_schema(self.path).names
+                df = pd.read_parquet(self.path, columns=[c for c in self.columns if c in names], **self.kwargs)
+            else:
+                df = pd.read_parquet(self.path, **self.kwargs)
         elif self.format == ".csv":  # TODO: remove
             log.info(f"Loading CSV Data From {self.path}.")
             df = pd.read_csv(self.path, **self.kwargs)
         elif self.format == ".jsonl":
-            log.info(f"Loading JSONL Data From {self.path}.")
-            df = pd.read_json(self.path, lines=True, convert_dates=False, convert_axes=False, **self.kwargs)
+            log.info(f"Loading JSONL Data From {self.path} with the {self.backend} backend.")
+            df = self._load_jsonl()
         else:
             log.info(f"Data format is: {self.format}, default to read as csv.")
             df = pd.read_csv(self.path, **self.kwargs)
-        return df
+        return self._select_columns(df)
+
+    def _load_jsonl(self) -> pd.DataFrame:
+        if self.backend == "orjson":
+            import orjson
+
+            return read_jsonl_columns(iter_file_chunks(self.path), columns=self.columns, loads=orjson.loads)
+        if self.backend == "pyarrow":
+            import pyarrow.json
+
+            table = pyarrow.json.read_json(self.path)
+            if self.columns is not None:
+                table = table.select([c for c in self.columns if c in table.column_names])
+            return table.to_pandas()
+        return pd.read_json(self.path, lines=True, convert_dates=False, convert_axes=False, **self.kwargs)
+
+    def _select_columns(self, df) -> pd.DataFrame:
+        if self.columns is None:
+            return df
+        return df[[c for c in self.columns if c in df.columns]]
 
 
 class AzureDataReader(DataReader, AzureBlobReader):
@@ -478,6 +1106,7 @@ class AzureDataReader(DataReader, AzureBlobReader):
         blob_name: str,
         format: str = None,
         transform: Optional[DFTransformBase] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
         **kwargs,
     ):
         """
@@ -488,21 +1117,31 @@ class AzureDataReader(DataReader, AzureBlobReader):
             blob_name: str, Azure storage blob name.
             format: optional str, specifies file format (only jsonl currently supported).
             transform: optional Transform, to apply after loading.
+            max_concurrency: optional int, number of connections used to download the ranges of a large blob.
             kwargs: addtional arguments.
         """
         self.blob_url = f"{account_url}/{blob_container}/{blob_name}"
         super().__init__(self.blob_url, format, transform, **kwargs)
         self.logger = AzureStorageLogger().get_logger()
+        self.max_concurrency = max_concurrency
 
     def _load_dataset(self) -> pd.DataFrame:
-        file = super().read_azure_blob(self.blob_url)
         if self.format == ".jsonl":
-            jlr = jsonlines.Reader(file.splitlines())
-            df = pd.DataFrame(jlr.iter(skip_empty=True, skip_invalid=True))
+            # the blob is parsed as it is downloaded, chunk by chunk, rather than decoded to one string
+            loads = json.loads
+            if self.backend == "orjson":
+                import orjson
+
+                loads = orjson.loads
+            df = read_jsonl_columns(self.download_azure_blob(self.blob_url).chunks(), columns=self.columns, loads=loads)
         else:
             raise ValueError("AzureDataReader currently only supports jsonl format.")
         return df
 
+    def _iter_chunks(self, chunk_size):
+        # the blob is downloaded as a whole, the transforms are still applied chunk by chunk
+        yield from iter_dataframe_chunks(self._load_dataset(), chunk_size)
+
 
 class HFDataReader(DataReader):
     """This is a HuggingFace DataReader that downloads data hosted on HuggingFace to infer on
@@ -636,3 +1275,7 @@ class HFDataReader(DataReader):
                     task_df["__hf_split"] = self.split[i]
                     df_frames.append(task_df)
         return pd.concat(df_frames)
+
+    def _iter_chunks(self, chunk_size):
+        # the datasets are loaded as a whole, the transforms are still applied chunk by chunk
+        yield from iter_dataframe_chunks(self._load_dataset(), chunk_size)
@@ -0,0 +1,341 @@
+"""This module contains the reading and writing of the data frames that pipeline components pass to each other.
+Components write their output as jsonl by default, or as Parquet or Arrow IPC files, which the next component loads
+without parsing any JSON. The readers are given the path of the jsonl file, as in the pipeline configs, and load the
+columnar file with the same name instead when there is one, see find_columnar_sibling()."""
+
+import logging
+import os
+
+import pandas as pd
+
+from .encoders import NumpyEncoder
+
+log = logging.getLogger("data_reader")
+
+# output format -> extension of the file it is written to
+OUTPUT_FORMATS = {"jsonl": ".jsonl", "parquet": ".parquet", "arrow": ".arrow"}
+# extensions of the columnar files that the readers load, in order of preference
+COLUMNAR_EXTENSIONS = (".parquet", ".arrow")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+# number of rows converted to python records at once when a columnar file is iterated row by row
+RECORD_BATCH_SIZE = 1024
+# number of rows converted to python records and encoded at once when a data frame is written to jsonl
+JSONL_WRITE_CHUNK_SIZE = 10000
+
+
+def get_output_path(path, output_format):
+    """returns: the path with the extension of the output format, e.g. data.jsonl -> data.parquet."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {tuple(OUTPUT_FORMATS)}.")
+    return os.path.splitext(path)[0] + OUTPUT_FORMATS[output_format]
+
+
+def find_columnar_sibling(path):
+    """
+    Finds the Parquet or Arrow IPC file written in place of, or next to, a jsonl file by a component.
+    args:
+        path (str): path of the jsonl file.
+    returns:
+        columnar_path (str): path of the columnar file with the same name, if it exists and is at least as recent as
+            the jsonl file, None otherwise.
+    """
+    stem, ext = os.path.splitext(path)
+    if ext.lower() != ".jsonl":
+        return None
+    jsonl_mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    for columnar_ext in COLUMNAR_EXTENSIONS:
+        columnar_path = stem + columnar_ext
+        if os.path.exists(columnar_path) and (jsonl_mtime is None or os.path.getmtime(columnar_path) >= jsonl_mtime):
+            return columnar_path
+    return None
+
+
+def encode_jsonl_rows(df, encoder, chunk_size=JSONL_WRITE_CHUNK_SIZE):
+    """
+    Encodes the rows of a data frame to jsonl. The output is the same as encoding every row.to_dict() of df.iterrows()
+    with json.dumps, but rows are converted to python values in bulk, chunk by chunk, and encoded by a single encoder.
+    args:
+        df (pd.DataFrame): the data frame to encode.
+        encoder (json.JSONEncoder): the encoder of the rows.
+        chunk_size (int): optional. Number of rows converted and encoded at once.
+    returns:
+        lines (generator): the jsonl lines of every chunk of rows, as one string per chunk.
+    """
+    columns = df.columns.tolist()
+    for start in range(0, len(df), chunk_size):
+        # like iterrows, the values of the rows of frames without object columns are upcast to a common dtype,
+        # e.g. ints become floats next to float columns, and tolist() turns numpy scalars into python values
+        rows = df.iloc[start : start + chunk_size].to_numpy().tolist()
+        yield "".join(encoder.encode(dict(zip(columns, row))) + "\n" for row in rows)
+
+
+def get_jsonl_encoder():
+    return NumpyEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def write_jsonl_dataframe(df, path, chunk_size=JSONL_WRITE_CHUNK_SIZE):
+    """Writes the rows of a data frame to a jsonl file, one json object per row, see encode_jsonl_rows()."""
+    encoder = get_jsonl_encoder()
+    with open(path, "w", encoding="utf-8") as writer:
+        for lines in encode_jsonl_rows(df, encoder, chunk_size):
+            writer.write(lines)
+
+
+def write_columnar_dataframe(df, path, output_format):
+    """Writes a data frame to a Parquet file, or to an uncompressed Arrow IPC file that readers can memory-map."""
+    import pyarrow
+    import pyarrow.parquet
+
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    if output_format == "parquet":
+        pyarrow.parquet.write_table(table, path)
+    else:
+        with pyarrow.OSFile(path, "wb") as sink, pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def write_dataframe(df, path, output_format="jsonl", jsonl_side_output=False):
+    """
+    Writes the output data frame of a component.
+    args:
+        df (pd.DataFrame): the data frame to write.
+        path (str): path of the jsonl output file, e.g. output_dir/transformed_data.jsonl. Columnar outputs are written
+            to the same path with the extension of their format.
+        output_format (str): optional. "jsonl" (default), "parquet" or "arrow" (Arrow IPC).
+        jsonl_side_output (bool): optional. If True, a columnar output is also written as jsonl, for inspection.
+    returns:
+        output_path (str): the path of the file that the data frame was written to. Data frames that Arrow cannot
+            represent, e.g. columns mixing strings and dicts, are written as jsonl instead.
+    """
+    output_path = get_output_path(path, output_format)
+    if output_format == "jsonl":
+        write_jsonl_dataframe(df, output_path)
+        return output_path
+    import pyarrow
+
+    # the jsonl file is written first, so that readers pick the columnar file, which is more recent
+    jsonl_path = get_output_path(path, "jsonl")
+    if jsonl_side_output:
+        write_jsonl_dataframe(df, jsonl_path)
+    try:
+        write_columnar_dataframe(df, output_path, output_format)
+    except pyarrow.ArrowException as e:
+        log.warning(f"Could not write {output_path} as {output_format}, writing jsonl instead: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if not jsonl_side_output:
+            write_jsonl_dataframe(df, jsonl_path)
+        return jsonl_path
+    return output_path
+
+
+class DataFrameChunkWriter:
+    """
+    Writes a data frame that is produced chunk by chunk, e.g. by the chunked mode of DataProcessing, to the same files
+    as write_dataframe(). The schema of a columnar output is the schema of the first chunk. If a later chunk has new
+    columns, the rows written so far are rewritten with nulls in these columns; if it does not fit the schema, e.g. a
+    column that only held nulls so far now holds strings, the rows written so far are moved to a jsonl file and the
+    remaining chunks are written as jsonl.
+    """
+
+    def __init__(self, path, output_format="jsonl", jsonl_side_output=False):
+        """
+        args:
+            path (str): path of the jsonl output file, see write_dataframe().
+            output_format (str): optional. "jsonl" (default), "parquet" or "arrow".
+            jsonl_side_output (bool): optional. If True, a columnar output is also written as jsonl.
+        """
+        self.output_path = get_output_path(path, output_format)
+        self.jsonl_path = get_output_path(path, "jsonl")
+        self.output_format = output_format
+        self.write_jsonl = output_format == "jsonl" or jsonl_side_output
+        self.encoder = get_jsonl_encoder()
+        self.jsonl_file = None
+        self.columnar_writer = None
+        self.schema = None
+
+    def __enter__(self):
+        if self.write_jsonl:
+            self.jsonl_file = open(self.jsonl_path, "w", encoding="utf-8")
+        return self
+
+    def write(self, df):
+        if self.jsonl_file is not None:
+            for lines in encode_jsonl_rows(df, self.encoder):
+                self.jsonl_file.write(lines)
+        if self.output_format != "jsonl":
+            self._write_columnar(df)
+
+    def _write_columnar(self, df):
+        import pyarrow
+        import pyarrow.parquet
+
+        try:
+            if self.schema is not None and not set(df.columns).issubset(self.schema.names):
+                self._add_columns(df)
+            table = pyarrow.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            if self.columnar_writer is None:
+                self.schema = table.schema
+                self.columnar_writer = self._open_columnar_writer(self.schema)
+            self.columnar_writer.write_table(table)
+        except pyarrow.ArrowException as e:
+            log.warning(f"Could not write {self.output_path} as {self.output_format}, writing jsonl instead: {e}")
+            self._fall_back_to_jsonl(df)
+
+    def _open_columnar_writer(self, schema):
+        import pyarrow
+        import pyarrow.parquet
+
+        if self.output_format == "parquet":
+            return pyarrow.parquet.ParquetWriter(self.output_path, schema)
+        return pyarrow.ipc.new_file(self.output_path, schema)
+
+    def _add_columns(self, df):
+        """Rewrites the rows written so far with the columns of df that they do not have, as nulls."""
+        import pyarrow
+        import pyarrow.parquet
+
+        new_columns = [c for c in df.columns if c not in self.schema.names]
+        log.info(f"Rewriting {self.output_path} to add the columns {new_columns} of a later chunk.")
+        new_fields = list(pyarrow.Table.from_pandas(df[new_columns], preserve_index=False).schema)
+        schema = pyarrow.schema(list(self.schema) + new_fields)
+        self.columnar_writer.close()
+        previous_path = self.output_path + ".previous"
+        os.replace(self.output_path, previous_path)
+        self.columnar_writer = self._open_columnar_writer(schema)
+        if self.output_format == "parquet":
+            batches = pyarrow.parquet.ParquetFile(previous_path).iter_batches()
+        else:
+            reader = pyarrow.ipc.open_file(pyarrow.memory_map(previous_path, "r"))
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        for batch in batches:
+            nulls = [pyarrow.nulls(batch.num_rows, field.type) for field in new_fields]
+            self.columnar_writer.write_batch(pyarrow.RecordBatch.from_arrays(batch.columns + nulls, schema=schema))
+        os.remove(previous_path)
+        self.schema = schema
+
+    def _fall_back_to_jsonl(self, df):
+        if self.columnar_writer is not None:
+            self.columnar_writer.close()
+            self.columnar_writer = None
+        if self.jsonl_file is None:
+            self.jsonl_file = open(self.jsonl_path, "w", encoding="utf-8")
+            if os.path.exists(self.output_path):
+                for row in ColumnarRecordReader(self.output_path):
+                    self.jsonl_file.write(self.encoder.encode(row) + "\n")
+            for lines in encode_jsonl_rows(df, self.encoder):
+                self.jsonl_file.write(lines)
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        self.output_format = "jsonl"
+        self.output_path = self.jsonl_path
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # the jsonl file is closed first, so that readers pick the columnar file, which is more recent
+        if self.jsonl_file is not None:
+            self.jsonl_file.close()
+        if self.columnar_writer is not None:
+            self.columnar_writer.close()
+        elif self.output_format != "jsonl" and not self.write_jsonl:
+            # no chunk was written, leave an empty jsonl file for the next component
+            open(self.jsonl_path, "w").close()
+
+
+def read_arrow_table(path, columns=None):
+    """
+    Reads a Parquet or Arrow IPC file. Arrow IPC files are memory-mapped rather than read.
+    args:
+        path (str): path of the file.
+        columns (list): optional. Only these columns are read, columns that are not in the file are ignored.
+    returns:
+        table (pyarrow.Table): the content of the file.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    if os.path.splitext(path)[1].lower() in ARROW_EXTENSIONS:
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path, "r")).read_all()
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        return table
+    if columns is not None:
+        names = pyarrow.parquet.read_schema(path).names
+        columns = [c for c in columns if c in names]
+    return pyarrow.parquet.read_table(path, columns=columns)
+
+
+def arrow_table_to_dataframe(table):
+    """
+    Converts an Arrow table to a data frame with the values that the same data read from jsonl would have: list and
+    struct columns hold python lists and dicts rather than numpy arrays. Dicts hold every key of their column, None for
+    the keys that a row did not have.
+    """
+    import pyarrow
+
+    data = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pyarrow.types.is_nested(column.type):
+            data[name] = pd.Series(column.to_pylist(), dtype=object)
+        else:
+            data[name] = column.to_pandas()
+    return pd.DataFrame(data, columns=table.column_names)
+
+
+def read_columnar_dataframe(path, columns=None):
+    """Reads a Parquet or Arrow IPC file written by a component into a data frame, see arrow_table_to_dataframe()."""
+    return arrow_table_to_dataframe(read_arrow_table(path, columns))
+
+
+def iter_columnar_chunks(path, chunk_size, columns=None):
+    """
+    Reads a Parquet or Arrow IPC file in chunks of rows, see read_columnar_dataframe().
+    args:
+        path (str): path of the file.
+        chunk_size (int): maximum number of rows of every chunk.
+        columns (list): optional. Only these columns are read, columns that are not in the file are ignored.
+    returns:
+        chunks (generator): the chunks of the file, as data frames.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    if os.path.splitext(path)[1].lower() in ARROW_EXTENSIONS:
+        batches = read_arrow_table(path, columns).to_batches(max_chunksize=chunk_size)
+    else:
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        if columns is not None:
+            columns = [c for c in columns if c in parquet_file.schema_arrow.names]
+        batches = parquet_file.iter_batches(batch_size=chunk_size, columns=columns)
+    for batch in batches:
+        yield arrow_table_to_dataframe(pyarrow.Table.from_batches([batch]))
+
+
+def iter_dataframe_chunks(df, chunk_size):
+    """Splits a data frame in chunks of chunk_size rows."""
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start : start + chunk_size]
+
+
+class ColumnarRecordReader:
+    """Iterates over the rows of a Parquet or Arrow IPC file as dicts, like a jsonlines.Reader over a jsonl file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return self.iter()
+
+    def iter(self, skip_empty=False, skip_invalid=False):
+        """yields: the rows of the file. The arguments are accepted for compatibility with jsonlines.Reader.iter()."""
+        table = read_arrow_table(self.path)
+        for batch in table.to_batches(max_chunksize=RECORD_BATCH_SIZE):
+            yield from batch.to_pylist()
+
+    def close(self):
+        pass
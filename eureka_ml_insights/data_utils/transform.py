@@ -6,7 +6,6 @@ from typing import Dict, List
 
 import numpy as np
 import pandas as pd
-import tiktoken
 import json
 import logging
 
@@ -25,9 +24,20 @@ from eureka_ml_insights.models import (
     TogetherModel,
     DeepseekR1ServerlessAzureRestEndpointModel
 )
+from eureka_ml_insights.models.tokenizer import count_tokens_many
+
+# column of the rows of a virtual MultiplyTransform that holds their number of repeats
+N_REPEATS_COLUMN = "n_repeats"
+
 
 @dataclass
 class DFTransformBase:
+    # transforms whose output for a row depends on other rows, e.g. sampling or grouping, set this to True, so that
+    # data processed chunk by chunk is gathered before they are applied. The gathered rows are loaded as a single data
+    # frame, unless the transform implements transform_spill(read_columns, iter_chunks), which reads them in passes,
+    # see DataReader.iter_dataset_chunks()
+    needs_full_frame = False
+
     @abstractmethod
     def transform(self, df: pd.DataFrame) -> pd.DataFrame: ...
 
@@ -42,6 +52,36 @@ class SequenceTransform(DFTransformBase):
         return df
 
 
+def split_transform_stages(transform):
+    """
+    Splits a transform into the stages of chunked processing: runs of consecutive transforms that can be applied to
+    each chunk of the data on its own, separated by the transforms that need the full data frame.
+    args:
+        transform (DFTransformBase): the transform to split, None for no transform. Nested SequenceTransforms are
+            flattened.
+    returns:
+        stages (list): list of (needs_full_frame, transforms) tuples, in order.
+    """
+    transforms = []
+
+    def flatten(transform):
+        if isinstance(transform, SequenceTransform):
+            for child in transform.transforms:
+                flatten(child)
+        elif transform is not None:
+            transforms.append(transform)
+
+    flatten(transform)
+    stages = []
+    for transform in transforms:
+        needs_full_frame = getattr(transform, "needs_full_frame", False)
+        if stages and not needs_full_frame and not stages[-1][0]:
+            stages[-1][1].append(transform)
+        else:
+            stages.append((needs_full_frame, [transform]))
+    return stages
+
+
 @dataclass
 class ColumnRename(DFTransformBase):
     name_mapping: Dict[str, str]
@@ -59,12 +99,15 @@ class RunPythonTransform(DFTransformBase):
                        Local (to the python_code scope) imports can be included in the python_code. Such global
                        scope imports are needed when the python_code uses a lambda function, for example, since
                        imports in the python_code scope are not available to the lambda function.
+        needs_full_frame: bool: Set to True if the python_code needs all the rows of the data frame at once, e.g. to
+                       drop duplicates, so that data processed chunk by chunk is gathered first. Default is False.
     returns:
         df: pd.DataFrame: The transformed data frame.
     """
 
     python_code: str
     global_imports: list = field(default_factory=list)
+    needs_full_frame: bool = False
 
     def __post_init__(self):
         # To avoid disastrous consequences, we only allow operations on the data frame.
@@ -102,6 +145,8 @@ class RunPythonTransform(DFTransformBase):
 
 @dataclass
 class SamplerTransform(DFTransformBase):
+    needs_full_frame = True
+
     random_seed: int
     sample_count: int
     stratify_by: List[str] = None
@@ -114,6 +159,29 @@ class SamplerTransform(DFTransformBase):
         else:
             return df.sample(n=self.sample_count, random_state=self.random_seed)
 
+    def transform_spill(self, read_columns, iter_chunks):
+        """
+        Samples the rows gathered from the chunks of a chunked read, see DataReader.iter_dataset_chunks(), without
+        loading them all: the sample is drawn from the stratify_by columns only, then the sampled rows are collected
+        from the chunks. The rows and their order are the ones of transform().
+        args:
+            read_columns: function that returns a data frame of the given columns of all the rows, indexed by position.
+            iter_chunks: function that returns an iterator over the chunks of the rows, in order.
+        returns:
+            dfs: generator of pd.DataFrame, the sampled rows.
+        """
+        positions = self.transform(read_columns(self.stratify_by or [])).index
+        output_order = pd.Series(np.arange(len(positions)), index=positions)
+        samples, sample_order = [], []
+        offset = 0
+        for chunk in iter_chunks():
+            chunk_positions = pd.RangeIndex(offset, offset + len(chunk))
+            is_sampled = chunk_positions.isin(positions)
+            samples.append(chunk[is_sampled])
+            sample_order.append(output_order[chunk_positions[is_sampled]].values)
+            offset += len(chunk)
+        yield pd.concat(samples).iloc[np.argsort(np.concatenate(sample_order))]
+
 
 @dataclass
 class MultiplyTransform(DFTransformBase):
@@ -121,11 +189,22 @@ class MultiplyTransform(DFTransformBase):
     Repeats each row n times, and adds a column to the data frame indicating the repeat number.
     Also adds a column to the data frame indicating the data point id that will be the same for
     all repeats of the same data point.
+    args:
+        n_repeats: int: The number of repeats of each row.
+        virtual: bool: If True, rows are not copied: each row is kept once, with its data point id and the number of
+                 repeats in the n_repeats column, and the data loaders of the inference component expand the repeats
+                 as they read the rows, see DataLoader.expand_repeats(). Default is False.
     """
 
     n_repeats: int
+    virtual: bool = False
 
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.virtual:
+            df = df.copy()
+            df["data_point_id"] = df.index
+            df[N_REPEATS_COLUMN] = self.n_repeats
+            return df
         dfs = []
         for i in range(self.n_repeats):
             df_copy = df.copy()
@@ -392,9 +471,8 @@ class TokenCounterTransform(MultiColumnTransform):
             dataframe: the dataframe with the token count column added.
         """
         self.validate(df)
-        encoding = tiktoken.get_encoding(encoding)
         for column in self.columns:
-            token_count = df[column].apply(lambda x: len(encoding.encode(x)))
+            token_count = pd.Series(count_tokens_many(df[column], encoding_name=encoding), index=df.index)
             token_count_column = f"{column}_token_count"
             df[token_count_column] = token_count
         return df
@@ -404,6 +482,8 @@ class TokenCounterTransform(MultiColumnTransform):
 class MajorityVoteTransform:
     """Applies the majority vote transformation to the specified model output column per id_col."""
 
+    needs_full_frame = True
+
     model_output_col: str = "model_output"  # Default column name for model outputs
     id_col: str = "data_point_id"  # Default column name for IDs
     majority_vote_col: str = "majority_vote"
@@ -427,6 +507,23 @@ class MajorityVoteTransform:
 
         return df
 
+    def transform_spill(self, read_columns, iter_chunks):
+        """
+        Adds the majority vote to the rows gathered from the chunks of a chunked read, see
+        DataReader.iter_dataset_chunks(), without loading them all: the votes are computed from the id_col and
+        model_output_col columns only, then added to every chunk.
+        args:
+            read_columns: function that returns a data frame of the given columns of all the rows, indexed by position.
+            iter_chunks: function that returns an iterator over the chunks of the rows, in order.
+        returns:
+            dfs: generator of pd.DataFrame, the chunks with the majority_vote_col column.
+        """
+        votes = self.transform(read_columns([self.id_col, self.model_output_col]))
+        votes = votes.drop_duplicates(self.id_col).set_index(self.id_col)[self.majority_vote_col]
+        for chunk in iter_chunks():
+            chunk[self.majority_vote_col] = chunk[self.id_col].map(votes)
+            yield chunk
+
 @dataclass
 class ExtractUsageTransform:
     """
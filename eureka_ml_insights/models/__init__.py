@@ -21,6 +21,7 @@ from .models import (
     VLLMModel,
     TogetherModel
 )
+from .retry import RetryPolicy
 
 __all__ = [
     AzureOpenAIOModel,
@@ -43,5 +44,6 @@ __all__ = [
     RestEndpointModel,
     TestModel,
     VLLMModel,
-    TogetherModel
+    TogetherModel,
+    RetryPolicy,
 ]
@@ -0,0 +1,135 @@
+"""This module contains the cache of the Azure AD bearer tokens used by the models that authenticate with Azure
+credentials. Tokens are shared by all the model instances that request the same scope, and are refreshed in the
+background before they expire, so that requests never wait on a credential round trip. The DefaultAzureCredential
+behind them is shared with the Azure storage clients of the data readers."""
+
+import logging
+import threading
+import time
+
+from azure.identity import DefaultAzureCredential
+
+# tokens are refreshed this many seconds before they expire
+DEFAULT_REFRESH_MARGIN = 300
+# wait before retrying a background refresh that failed, in seconds
+REFRESH_RETRY_DELAY = 30
+# minimum wait between two background refreshes, in case the credential issues tokens shorter lived than the margin
+MIN_REFRESH_INTERVAL = 1
+
+_credential = None
+_credential_lock = threading.Lock()
+_token_caches = {}
+_token_caches_lock = threading.Lock()
+
+
+def get_azure_credential():
+    """Returns the DefaultAzureCredential shared by all the models and Azure storage clients of the process, so that
+    the credential providers are only probed once and their tokens are reused."""
+    global _credential
+    with _credential_lock:
+        if _credential is None:
+            _credential = DefaultAzureCredential()
+        return _credential
+
+
+def clear_azure_credential():
+    """Forgets the shared credential, e.g. after the credentials of the environment changed."""
+    global _credential
+    with _credential_lock:
+        _credential = None
+
+
+class BearerTokenCache:
+    """
+    Thread-safe cache of the bearer token of a scope. The token is fetched on first use, then a background timer
+    refreshes it refresh_margin seconds before it expires. A token that expired anyway, e.g. because background
+    refreshes kept failing, is refreshed synchronously by the next caller.
+
+    Instances are callable and return the token, so they can be passed as azure_ad_token_provider to the openai
+    clients, like the providers returned by azure.identity.get_bearer_token_provider().
+    """
+
+    def __init__(self, credential, scope, refresh_margin=DEFAULT_REFRESH_MARGIN):
+        """
+        args:
+            credential (azure.core.credentials.TokenCredential): the credential to get tokens from.
+            scope (str): the scope of the tokens, e.g. "https://cognitiveservices.azure.com/.default".
+            refresh_margin (float): optional. Number of seconds before expiry at which the token is refreshed.
+        """
+        self.credential = credential
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.token = None
+        self.expires_on = None
+        self.lock = threading.Lock()
+        self.refresh_timer = None
+
+    def __call__(self):
+        return self.get_token()
+
+    def get_token(self):
+        """Returns a valid bearer token, only blocks if there is no token yet or the cached token expired."""
+        token = self.token
+        if token is not None and time.time() < self.expires_on:
+            return token
+        with self.lock:
+            # another thread may have refreshed the token while this one was waiting for the lock
+            if self.token is None or time.time() >= self.expires_on:
+                self._refresh()
+            return self.token
+
+    def _refresh(self):
+        access_token = self.credential.get_token(self.scope)
+        self.token = access_token.token
+        self.expires_on = access_token.expires_on
+        self._schedule_refresh(max(self.expires_on - time.time() - self.refresh_margin, MIN_REFRESH_INTERVAL))
+
+    def _schedule_refresh(self, delay):
+        if self.refresh_timer is not None:
+            self.refresh_timer.cancel()
+        self.refresh_timer = threading.Timer(delay, self._background_refresh)
+        self.refresh_timer.daemon = True
+        self.refresh_timer.start()
+
+    def _background_refresh(self):
+        with self.lock:
+            try:
+                self._refresh()
+                logging.debug(f"Refreshed the bearer token of {self.scope}.")
+            except Exception as e:
+                # the current token may still be valid, try again later
+                logging.warning(f"Could not refresh the bearer token of {self.scope}: {e}")
+                self._schedule_refresh(REFRESH_RETRY_DELAY)
+
+    def close(self):
+        """Stops refreshing the token in the background."""
+        with self.lock:
+            if self.refresh_timer is not None:
+                self.refresh_timer.cancel()
+                self.refresh_timer = None
+
+
+def get_bearer_token_cache(scope, credential=None):
+    """
+    Returns the token cache of a scope, shared by all the models that authenticate with that scope.
+    args:
+        scope (str): the scope of the tokens.
+        credential (azure.core.credentials.TokenCredential): optional. The credential to get tokens from when the
+            cache of the scope is created. Default is the shared credential returned by get_azure_credential().
+    returns:
+        token_cache (BearerTokenCache): the token cache of the scope.
+    """
+    with _token_caches_lock:
+        token_cache = _token_caches.get(scope)
+        if token_cache is None:
+            token_cache = BearerTokenCache(credential or get_azure_credential(), scope)
+            _token_caches[scope] = token_cache
+        return token_cache
+
+
+def clear_bearer_token_caches():
+    """Stops the background refreshes and forgets the cached tokens of all the scopes."""
+    with _token_caches_lock:
+        for token_cache in _token_caches.values():
+            token_cache.close()
+        _token_caches.clear()
@@ -0,0 +1,140 @@
+"""This module contains the HTTP connection pools shared by the urllib-based REST endpoint models, so that
+connections are kept alive and reused across requests instead of paying a TCP and TLS handshake for every request."""
+
+import http.client
+import io
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urljoin, urlsplit
+
+import urllib3
+
+DEFAULT_MAX_CONNECTIONS = 10
+# same limit as urllib.request.HTTPRedirectHandler
+MAX_REDIRECTIONS = 10
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_proxy_url(url):
+    """
+    Returns the proxy that urllib.request.urlopen would use for the url, according to the *_proxy and no_proxy
+    environment variables (or the system settings), None if the url is reached directly.
+    args:
+        url (str): url of the endpoint.
+    returns:
+        proxy_url (str): url of the proxy, or None.
+    """
+    parts = urlsplit(url)
+    proxy_url = urllib.request.getproxies().get(parts.scheme)
+    if proxy_url is None or urllib.request.proxy_bypass(parts.netloc):
+        return None
+    return proxy_url
+
+
+def get_connection_pool(url, max_connections=None):
+    """
+    Returns the connection pool of the endpoint (scheme, host and port) of the url, shared by all the threads and
+    model instances that call the endpoint. The pool connects through the proxy returned by get_proxy_url() if there
+    is one. The pool is replaced by a larger one if more connections are requested, and the replaced pool is closed.
+    args:
+        url (str): url of the endpoint.
+        max_connections (int): optional. Number of connections kept alive, default is DEFAULT_MAX_CONNECTIONS.
+    returns:
+        pool (urllib3.HTTPConnectionPool): the connection pool of the endpoint.
+    """
+    max_connections = max_connections or DEFAULT_MAX_CONNECTIONS
+    parts = urlsplit(url)
+    proxy_url = get_proxy_url(url)
+    key = (parts.scheme, parts.hostname, parts.port, proxy_url)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pool.maxsize < max_connections:
+            # connections beyond maxsize are still opened when needed, but they are not kept alive
+            previous_pool = pool
+            pool_kwargs = dict(maxsize=max_connections, block=False, retries=False)
+            if proxy_url is None:
+                pool = urllib3.connection_from_url(url, **pool_kwargs)
+            else:
+                proxy_auth = urllib3.util.parse_url(proxy_url).auth
+                proxy_headers = urllib3.make_headers(proxy_basic_auth=proxy_auth) if proxy_auth else None
+                proxy_manager = urllib3.ProxyManager(proxy_url, proxy_headers=proxy_headers, **pool_kwargs)
+                pool = proxy_manager.connection_from_url(url)
+            _pools[key] = pool
+            if previous_pool is not None:
+                # closes the idle connections, the ones in use are closed when they are released
+                previous_pool.close()
+        return pool
+
+
+def clear_connection_pools():
+    """Closes the connections of all the pools."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def pooled_urlopen(request, timeout=None, max_connections=None):
+    """
+    Sends a urllib.request.Request through the connection pool of its endpoint and returns the response body.
+    Redirects are followed as by urllib.request.urlopen, up to MAX_REDIRECTIONS times. Errors are raised as by
+    urllib.request.urlopen: urllib.error.HTTPError for error status codes, TimeoutError for timeouts and
+    urllib.error.URLError for other connection errors, so that handle_request_error() behaves the same.
+    args:
+        request (urllib.request.Request): the request to send.
+        timeout (float): optional. Timeout for establishing the connection and for every read of the response, in
+            seconds, like the timeout of urllib.request.urlopen. It does not bound the duration of the whole request.
+        max_connections (int): optional. Size of the connection pool of the endpoint.
+    returns:
+        body (bytes): the response body.
+    """
+    for _ in range(MAX_REDIRECTIONS + 1):
+        response = _send(request, timeout, max_connections)
+        body = response.data
+        is_redirect = response.status in (301, 302, 303, 307, 308) and "location" in response.headers
+        if response.status < 400 and not is_redirect:
+            return body
+        headers = http.client.HTTPMessage()
+        for key, value in response.headers.items():
+            headers[key] = value
+        if not is_redirect:
+            raise urllib.error.HTTPError(request.full_url, response.status, response.reason, headers, io.BytesIO(body))
+        new_url = urljoin(request.full_url, response.headers["location"])
+        # raises an HTTPError for the redirects that urllib.request.urlopen does not follow either
+        request = urllib.request.HTTPRedirectHandler().redirect_request(
+            request, io.BytesIO(body), response.status, response.reason, headers, new_url
+        )
+    raise urllib.error.HTTPError(
+        request.full_url,
+        response.status,
+        f"More than {MAX_REDIRECTIONS} redirections, the last one was: {response.reason}",
+        headers,
+        io.BytesIO(body),
+    )
+
+
+def _send(request, timeout, max_connections):
+    """Sends the request once, without following redirects, and returns the urllib3 response."""
+    pool = get_connection_pool(request.full_url, max_connections)
+    url = request.full_url
+    if pool.proxy is None or pool.scheme == "https":
+        # the absolute url is only sent to a forwarding proxy, https requests are tunneled through the proxy
+        url = urllib3.util.parse_url(url).request_uri
+    try:
+        return pool.urlopen(
+            request.get_method(),
+            url,
+            body=request.data,
+            headers=dict(request.header_items()),
+            timeout=urllib3.Timeout(connect=timeout, read=timeout) if timeout else urllib3.Timeout.DEFAULT_TIMEOUT,
+            retries=False,
+            redirect=False,
+            assert_same_host=False,
+        )
+    except urllib3.exceptions.TimeoutError as e:
+        raise TimeoutError(str(e)) from e
+    except urllib3.exceptions.HTTPError as e:
+        raise urllib.error.URLError(e) from e
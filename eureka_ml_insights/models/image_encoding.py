@@ -0,0 +1,198 @@
+"""This module contains the base64 encoding of the images sent to the API-based models. Images that remember where
+they were loaded from are encoded once per source and the encoded payload is reused, e.g. by every repeat of a data
+point, and when the source file is already in a format that the APIs accept, its bytes are sent as they are instead of
+being decoded and recompressed. Data loaders can also pass ImageHandles, references to images that are only read and
+decoded when the request is made, instead of decoded images."""
+
+import base64
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import NamedTuple
+
+from PIL import Image
+
+from .telemetry import timed
+
+# formats that the APIs accept as they are, with their media types
+PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+# larger source files are recompressed to JPEG, since some APIs limit the size of every image (e.g. 5MB once encoded)
+MAX_PASSTHROUGH_BYTES = 3_500_000
+DEFAULT_CACHE_BYTES = 256 * 2**20
+
+
+class EncodedImage(NamedTuple):
+    data: str
+    media_type: str
+
+    @property
+    def data_url(self):
+        return f"data:{self.media_type};base64,{self.data}"
+
+
+class ImageSource:
+    """Describes where an image was loaded from, attached to the PIL image by the data loaders."""
+
+    def __init__(self, key, format=None, path=None, data=None, reader=None, size=None):
+        """
+        args:
+            key (hashable): identifies the content of the source, e.g. the file path and its modification time, or the
+                blob name and its etag. Images with the same key are encoded once.
+            format (str): optional. The PIL format of the source, e.g. "JPEG".
+            path (str): optional. Path of the source file, to read its bytes from.
+            data (bytes): optional. The bytes of the source, when it is not a local file.
+            reader (callable): optional. Returns the bytes of the source, when they are fetched on demand.
+            size (tuple): optional. (width, height) of the image when it was loaded, used to detect images that were
+                modified after loading, whose source no longer matches their content.
+        """
+        self.key = key
+        self.format = format
+        self.path = path
+        self.data = data
+        self.reader = reader
+        self.size = size
+
+    def read_bytes(self):
+        if self.data is not None:
+            return self.data
+        if self.reader is not None:
+            return self.reader()
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class ImageHandle:
+    """
+    A reference to an image that is read and decoded only when needed, so that the images of the rows that wait to be
+    sent do not sit in memory as decoded bitmaps. Models that send encoded images get them through encode_image(),
+    which does not decode the image at all when the source bytes can be sent as they are. Models that need the pixels
+    call decode_images().
+    """
+
+    def __init__(self, source):
+        """
+        args:
+            source (ImageSource): where to read the image from.
+        """
+        self.source = source
+
+    def decode(self):
+        """returns: the decoded RGB PIL image, with its source attached."""
+        if self.source.path is not None and self.source.data is None and self.source.reader is None:
+            source_image = Image.open(self.source.path)
+        else:
+            source_image = Image.open(BytesIO(self.source.read_bytes()))
+        with source_image:
+            image = source_image.convert("RGB")
+            self.source.format = source_image.format
+        return set_image_source(image, self.source)
+
+    def __repr__(self):
+        return f"ImageHandle({self.source.path or self.source.key!r})"
+
+
+def decode_images(query_images):
+    """Decodes the ImageHandles of a list of images, PIL images are returned as they are."""
+    if not query_images:
+        return query_images
+    return [image.decode() if isinstance(image, ImageHandle) else image for image in query_images]
+
+
+def set_image_source(image, source):
+    """Attaches the source of an image to the PIL image, and returns the image."""
+    if source.size is None:
+        source.size = image.size
+    image.eureka_source = source
+    return image
+
+
+def get_image_source(image):
+    """Returns the source of a PIL image, None if it is unknown or no longer matches the content of the image."""
+    source = getattr(image, "eureka_source", None)
+    if source is None or source.size != image.size:
+        return None
+    return source
+
+
+class EncodedImageCache:
+    """Thread-safe LRU cache of encoded images, bounded by the total size of the encoded payloads."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            encoded_image = self.entries.get(key)
+            if encoded_image is not None:
+                self.entries.move_to_end(key)
+            return encoded_image
+
+    def put(self, key, encoded_image):
+        size = len(encoded_image.data)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = encoded_image
+            self.n_bytes += size
+            while self.n_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.n_bytes -= len(evicted.data)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.n_bytes = 0
+
+
+encoded_image_cache = EncodedImageCache()
+
+
+def _encode(image, source):
+    is_handle = isinstance(image, ImageHandle)
+    if source is not None and (source.format in PASSTHROUGH_FORMATS or (is_handle and source.format is None)):
+        try:
+            source_bytes = source.read_bytes()
+        except OSError:
+            if is_handle:
+                raise
+            source_bytes = None
+        if source_bytes is not None and len(source_bytes) <= MAX_PASSTHROUGH_BYTES:
+            if source.format is None:
+                # only the header is read to find the format, the image is not decoded
+                with Image.open(BytesIO(source_bytes)) as source_image:
+                    source.format = source_image.format
+            if source.format in PASSTHROUGH_FORMATS:
+                data = base64.b64encode(source_bytes).decode("utf-8")
+                return EncodedImage(data, PASSTHROUGH_FORMATS[source.format])
+    if is_handle:
+        image = image.decode()
+    buffered = BytesIO()
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.save(buffered, format="JPEG")
+    return EncodedImage(base64.b64encode(buffered.getvalue()).decode("utf-8"), "image/jpeg")
+
+
+def encode_image(image):
+    """
+    Encodes an image to base64. The source bytes are kept if the image was loaded from a file in a format that the
+    APIs accept, otherwise the image is compressed to JPEG. Images whose source is known are encoded once.
+    args:
+        image (PIL.Image or ImageHandle): the image to encode.
+    returns:
+        encoded_image (EncodedImage): the base64 data and the media type of the encoded image.
+    """
+    with timed("image_encoding"):
+        source = image.source if isinstance(image, ImageHandle) else get_image_source(image)
+        if source is None or source.key is None:
+            return _encode(image, source)
+        encoded_image = encoded_image_cache.get(source.key)
+        if encoded_image is None:
+            encoded_image = _encode(image, source)
+            encoded_image_cache.put(source.key, encoded_image)
+        return encoded_image
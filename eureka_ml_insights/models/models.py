@@ -1,21 +1,34 @@
 """This module contains classes for interacting with various models, including API-based models and HuggingFace models."""
 
+import asyncio
+import http.client
+import io
 import json
 import logging
 import random
 import requests
 import threading
 import time
+import urllib.error
 import urllib.request
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import ClassVar
 
 import anthropic
-import tiktoken
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 
 from eureka_ml_insights.secret_management import get_secret
 
+from .auth import get_bearer_token_cache
+from .http_pool import pooled_urlopen
+from .image_encoding import decode_images, encode_image
+from .retry import RetryPolicy
+from .telemetry import run_in_thread, timed
+from .tokenizer import count_tokens
+
+
+RESPONSE_KEYS = ("model_output", "is_valid", "response_time", "n_output_tokens")
+
 
 @dataclass
 class Model(ABC):
@@ -25,11 +38,55 @@ class Model(ABC):
     """
 
     chat_mode: bool = False
+    # keys of the response dictionary returned by generate(), declared so that previous inference results can be
+    # validated without making a request. None means that the model does not declare its response keys.
+    response_keys: ClassVar[tuple] = None
+    # keys that are only present in the response dictionary when the api reports them, e.g. token usage
+    optional_response_keys: ClassVar[tuple] = ()
+    # whether generate_n() gets its n completions from a single request rather than from n calls to generate()
+    supports_n_sampling: ClassVar[bool] = False
+    # whether generate_batch() runs its inputs as a single batch rather than with one call to generate() per input
+    supports_batching: ClassVar[bool] = False
 
     @abstractmethod
     def generate(self, text_prompt, *args, **kwargs):
         raise NotImplementedError
 
+    def generate_n(self, text_prompt, *args, n=1, **kwargs):
+        """
+        Generates n responses to the same inputs. Models that support n sampling (see supports_n_sampling) request
+        the n completions at once, so that the prompt is only sent and processed once; by default generate() is
+        called n times.
+        args:
+            text_prompt (str): the text prompt to generate the responses.
+            n (int): the number of responses.
+        returns:
+            response_dicts (list): n response dictionaries, as returned by generate().
+        """
+        return [self.generate(text_prompt, *args, **kwargs) for _ in range(n)]
+
+    def generate_batch(self, model_inputs):
+        """
+        Generates the responses to a batch of inputs. Models that support batching (see supports_batching) run the
+        batch at once, e.g. as a padded batch or through the continuous batching of their engine; by default
+        generate() is called for every input.
+        args:
+            model_inputs (list): (model_args, model_kwargs) tuples, the arguments of generate() for every input.
+        returns:
+            response_dicts (list): the response dictionaries of the inputs, as returned by generate(), in order.
+        """
+        return [self.generate(*model_args, **model_kwargs) for model_args, model_kwargs in model_inputs]
+
+    def get_response_keys(self):
+        """
+        returns:
+            response_keys (set): keys that are always present in the response dictionary, None if not declared.
+            optional_response_keys (set): keys that may or may not be present in the response dictionary.
+        """
+        if self.response_keys is None:
+            return None, set()
+        return set(self.response_keys), set(self.optional_response_keys)
+
     def count_tokens(self, model_output: str = None, is_valid: bool = False):
         """
         This method uses tiktoken tokenizer to count the number of tokens in the response.
@@ -40,28 +97,33 @@ class Model(ABC):
         returns:
             n_output_tokens (int): the number of tokens in the text response.
         """
-        encoding = tiktoken.get_encoding("cl100k_base")
         if model_output is None or not is_valid:
             return None
         else:
-            n_output_tokens = len(encoding.encode(model_output))
+            n_output_tokens = count_tokens(model_output)
             return n_output_tokens
 
-    def base64encode(self, query_images):
-        import base64
-        from io import BytesIO
-
-        encoded_images = []
-
-        for query_image in query_images:
-
-            buffered = BytesIO()
-            query_image.save(buffered, format="JPEG")
-            base64_bytes = base64.b64encode(buffered.getvalue())
-            base64_string = base64_bytes.decode("utf-8")
-            encoded_images.append(base64_string)
+    def count_prompt_tokens(self, text_prompt, *args, **kwargs):
+        """
+        Counts the tokens of the prompt of an input, e.g. to bound the size of the batches of the inference component.
+        By default the text prompt is counted with the tiktoken tokenizer; self-hosted models count the prompt they run
+        with their own tokenizer, template included.
+        args:
+            text_prompt (str): the text prompt, followed by the other arguments of generate().
+        returns:
+            n_prompt_tokens (int): the number of tokens of the prompt, 0 if there is no text prompt.
+        """
+        return count_tokens(text_prompt) if isinstance(text_prompt, str) else 0
 
-        return encoded_images
+    def base64encode(self, query_images):
+        """
+        Encodes images to base64, see encode_image() for how the encoding is chosen and reused.
+        args:
+            query_images (list): list of PIL images.
+        returns:
+            encoded_images (list): list of EncodedImage, with the base64 data and the media type of every image.
+        """
+        return [encode_image(query_image) for query_image in query_images]
 
 
 @dataclass
@@ -87,11 +149,67 @@ class KeyBasedAuthMixIn:
         return self.api_key
 
 
+async def async_urlopen(session, request, timeout=None):
+    """
+    Sends a urllib.request.Request through an aiohttp session and returns the response body.
+    Like urllib.request.urlopen, a urllib.error.HTTPError is raised for error status codes, so that
+    handle_request_error() behaves the same for the blocking and the async code paths.
+    args:
+        session (aiohttp.ClientSession): the session to send the request with.
+        request (urllib.request.Request): the request to send.
+        timeout (float): optional. Total timeout of the request in seconds.
+    returns:
+        body (bytes): the response body.
+    """
+    import aiohttp
+
+    async with session.request(
+        request.get_method(),
+        request.full_url,
+        data=request.data,
+        headers=dict(request.header_items()),
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    ) as response:
+        body = await response.read()
+        if response.status >= 400:
+            headers = http.client.HTTPMessage()
+            for key, value in response.headers.items():
+                headers[key] = value
+            raise urllib.error.HTTPError(
+                request.full_url, response.status, response.reason, headers, io.BytesIO(body)
+            )
+        return body
+
+
+@dataclass
+class PooledHTTPMixIn:
+    """This class is used by the models that send raw http requests to their endpoint, so that connections are kept
+    alive and shared by all the threads (and the event loop) that call the same endpoint."""
+
+    # number of connections kept alive to the endpoint, Inference sets it to max_concurrent if left to None
+    max_connections: int = None
+
+    def urlopen(self, request):
+        """Sends a urllib.request.Request through the connection pool of the endpoint and returns the response body."""
+        return pooled_urlopen(request, timeout=self.timeout, max_connections=self.max_connections)
+
+    def get_async_client(self):
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections or 100, keepalive_timeout=30)
+        return aiohttp.ClientSession(connector=connector)
+
+
 @dataclass
 class EndpointModel(Model):
     """This class is used to interact with API-based models."""
 
     num_retries: int = 3
+    retry_policy: RetryPolicy = field(default_factory=RetryPolicy)
+    response_keys: ClassVar[tuple] = RESPONSE_KEYS
+    # the retry statistics are always returned, but results written before they were reported do not have them
+    optional_response_keys: ClassVar[tuple] = ("usage", "n_retries", "retry_wait_time")
+    request_error_listeners: list = field(default_factory=list, init=False, repr=False, compare=False)
 
     @abstractmethod
     def create_request(self, text_prompt, *args, **kwargs):
@@ -102,6 +220,12 @@ class EndpointModel(Model):
         # must return the model output and the response time
         raise NotImplementedError
 
+    def get_response_keys(self):
+        response_keys, optional_response_keys = super().get_response_keys()
+        if response_keys is not None and self.chat_mode:
+            response_keys.add("previous_messages")
+        return response_keys, optional_response_keys
+
     def update_chat_history(self, query_text, model_output, *args, **kwargs):
         """
         This method is used to update the chat history with the model response.
@@ -127,35 +251,159 @@ class EndpointModel(Model):
             response_dict (dict): a dictionary containing the model_output, is_valid, response_time, and n_output_tokens,
                                   and any other relevant information returned by the model.
         """
-        response_dict = {}
-        request = self.create_request(query_text, *args, **kwargs)
-        attempts = 0
-        model_output = None
-        is_valid = False
-        response_time = None
-        n_output_tokens = None
+        with timed("request_serialization"):
+            request = self.create_request(query_text, *args, **kwargs)
+        model_response, is_valid, retry_state = self.get_response_with_retries(self.get_response, request)
+        response_dict = self.compose_response_dict(model_response, is_valid, query_text, *args, **kwargs)
+        response_dict.update({"n_retries": retry_state.n_retries, "retry_wait_time": retry_state.wait_time})
+        return response_dict
 
-        while attempts < self.num_retries:
+    def generate_n(self, query_text, *args, n=1, **kwargs):
+        """
+        Generates n responses to the same inputs. Models that support n sampling send a single request for the n
+        completions through get_n_responses(), which is retried as a whole; the n_retries and retry_wait_time of the
+        request are reported in every response dictionary. Every response dictionary holds its share of the usage of
+        the request, so that the usage summed over the responses is the usage of the request, see
+        OpenAICommonRequestResponseMixIn.split_n_completions_usage().
+        args:
+            query_text (str): the text prompt to generate the responses.
+            n (int): the number of responses.
+        returns:
+            response_dicts (list): n response dictionaries, as returned by generate().
+        """
+        if not self.supports_n_sampling or n == 1:
+            return super().generate_n(query_text, *args, n=n, **kwargs)
+        with timed("request_serialization"):
+            request = self.create_request(query_text, *args, **kwargs)
+        model_responses, is_valid, retry_state = self.get_response_with_retries(
+            lambda request: self.get_n_responses(request, n), request
+        )
+        model_responses = list(model_responses or [])
+        if len(model_responses) < n:
+            logging.warning(f"Requested {n} completions, received {len(model_responses)}.")
+        response_dicts = []
+        for i in range(n):
+            model_response = model_responses[i] if i < len(model_responses) else None
+            response_dict = self.compose_response_dict(
+                model_response, is_valid and model_response is not None, query_text, *args, **kwargs
+            )
+            response_dict.update({"n_retries": retry_state.n_retries, "retry_wait_time": retry_state.wait_time})
+            response_dicts.append(response_dict)
+        return response_dicts
+
+    def get_n_responses(self, request, n):
+        """Sends a request for n completions. Must return a list of n dictionaries like the ones of get_response().
+        Implemented by the models that support n sampling."""
+        raise NotImplementedError
+
+    def get_response_with_retries(self, get_response, request):
+        """
+        Calls get_response(request), retrying according to num_retries and the retry_policy.
+        returns:
+            model_response: the return value of get_response(), None if all attempts failed.
+            is_valid (bool): whether an attempt succeeded.
+            retry_state: the state of the retries, with their number and total wait time.
+        """
+        model_response = None
+        is_valid = False
+        retry_state = self.retry_policy.start()
+        for attempt in range(1, self.num_retries + 1):
             try:
-                model_response = self.get_response(request)
-                if model_response:
-                    response_dict.update(model_response)
-                    model_output = model_response["model_output"]
-                    response_time = model_response["response_time"]
-                    n_output_tokens = model_response.get("n_output_tokens", None)
-                if self.chat_mode:
-                    previous_messages = self.update_chat_history(query_text, model_output, *args, **kwargs)
+                with timed("network"):
+                    model_response = get_response(request)
+                is_valid = True
+                break
+            except Exception as e:
+                delay = self.handle_failed_attempt(e, attempt, retry_state)
+                if delay is None:
+                    break
+                time.sleep(delay)
+        return model_response, is_valid, retry_state
 
+    async def aget_response_with_retries(self, aget_response, request):
+        """Asyncio counterpart of get_response_with_retries(), awaits aget_response(request) and the waits between
+        the attempts."""
+        model_response = None
+        is_valid = False
+        retry_state = self.retry_policy.start()
+        for attempt in range(1, self.num_retries + 1):
+            try:
+                with timed("network"):
+                    model_response = await aget_response(request)
                 is_valid = True
                 break
             except Exception as e:
-                logging.warning(f"Attempt {attempts+1}/{self.num_retries} failed: {e}")
-                do_return = self.handle_request_error(e)
-                if do_return:
+                delay = self.handle_failed_attempt(e, attempt, retry_state)
+                if delay is None:
                     break
-                attempts += 1
-        else:
+                await asyncio.sleep(delay)
+        return model_response, is_valid, retry_state
+
+    def handle_failed_attempt(self, e, attempt, retry_state):
+        """
+        Decides what to do after an attempt of a request failed, for both the blocking and the async retry loops.
+        args:
+            e (Exception): the exception raised by the attempt.
+            attempt (int): the number of the attempt, starting at 1.
+            retry_state: the state of the retries of the request, see RetryPolicy.start().
+        returns:
+            delay (float): the number of seconds to wait before the next attempt, None if the request is given up.
+        """
+        logging.warning(f"Attempt {attempt}/{self.num_retries} failed: {e}")
+        do_return = self.handle_request_error(e)
+        self.notify_request_error(e)
+        if do_return:
+            return None
+        if attempt >= self.num_retries:
             logging.warning("All attempts failed.")
+            return None
+        return self.get_retry_delay(retry_state, e)
+
+    async def agenerate(self, query_text, *args, **kwargs):
+        """
+        Asyncio counterpart of generate(). Calls the endpoint through aget_response(), so that many requests can wait
+        on the same event loop. Takes the same arguments and returns the same response dictionary as generate().
+        """
+        with timed("request_serialization"):
+            request = self.create_request(query_text, *args, **kwargs)
+        model_response, is_valid, retry_state = await self.aget_response_with_retries(self.aget_response, request)
+        response_dict = self.compose_response_dict(model_response, is_valid, query_text, *args, **kwargs)
+        response_dict.update({"n_retries": retry_state.n_retries, "retry_wait_time": retry_state.wait_time})
+        return response_dict
+
+    def get_retry_delay(self, retry_state, e):
+        """Returns how long to wait before retrying a request that failed with the exception e, according to the
+        retry_policy, None if the request should be given up."""
+        delay = retry_state.next_delay(e)
+        if delay is None:
+            logging.warning(
+                f"Giving up after {retry_state.n_retries} retries, the maximum elapsed time of "
+                f"{self.retry_policy.max_elapsed_time} seconds would be exceeded."
+            )
+        else:
+            logging.info(f"Retrying in {delay:.2f} seconds.")
+        return delay
+
+    def compose_response_dict(self, model_response, is_valid, query_text, *args, **kwargs):
+        """
+        Builds the response dictionary returned by generate() and agenerate() from the output of get_response().
+        args:
+            model_response (dict): the dictionary returned by get_response(), None if all attempts failed.
+            is_valid (bool): whether the request succeeded.
+            query_text (str): the text prompt of the request.
+        returns:
+            response_dict (dict): a dictionary containing the model_output, is_valid, response_time, and n_output_tokens,
+                                  and any other relevant information returned by the model.
+        """
+        response_dict = {}
+        model_output = None
+        response_time = None
+        n_output_tokens = None
+        if model_response:
+            response_dict.update(model_response)
+            model_output = model_response["model_output"]
+            response_time = model_response["response_time"]
+            n_output_tokens = model_response.get("n_output_tokens", None)
 
         response_dict.update(
             {
@@ -166,16 +414,61 @@ class EndpointModel(Model):
             }
         )
         if self.chat_mode:
+            if is_valid:
+                previous_messages = self.update_chat_history(query_text, model_output, *args, **kwargs)
+            else:
+                previous_messages = kwargs.get("previous_messages", [])
             response_dict.update({"previous_messages": previous_messages})
         return response_dict
 
+    async def aget_response(self, request):
+        """
+        Asyncio counterpart of get_response(). Models that have a native async client override this method,
+        by default the blocking get_response() is run in a worker thread.
+        """
+        return await run_in_thread(self.get_response, request)
+
+    @property
+    def async_client(self):
+        """The native async client of the model, created lazily for the running event loop,
+        since async clients hold connections that are bound to the loop they were first used in."""
+        loop = asyncio.get_running_loop()
+        if getattr(self, "_async_client_loop", None) is not loop:
+            self._async_client = self.get_async_client()
+            self._async_client_loop = loop
+        return self._async_client
+
+    def get_async_client(self):
+        """Creates the native async client of the model, None if the model does not have one."""
+        return None
+
+    async def close_async_client(self):
+        """Closes the async client created for the running event loop, if any."""
+        async_client = getattr(self, "_async_client", None)
+        if async_client is not None:
+            await async_client.close()
+        self._async_client = None
+        self._async_client_loop = None
+
     @abstractmethod
     def handle_request_error(self, e):
         raise NotImplementedError
 
+    def add_request_error_listener(self, listener):
+        """Registers a callable that is called with every exception raised while getting a response, after it has
+        been handled by handle_request_error(), e.g. to adapt the request concurrency to throttling errors."""
+        self.request_error_listeners.append(listener)
+
+    def notify_request_error(self, e):
+        for listener in self.request_error_listeners:
+            try:
+                listener(e)
+            except Exception as listener_error:
+                logging.warning(f"Request error listener failed: {listener_error}")
+
 
 @dataclass
-class RestEndpointModel(EndpointModel, KeyBasedAuthMixIn):
+class RestEndpointModel(PooledHTTPMixIn, EndpointModel, KeyBasedAuthMixIn):
     url: str = None
     model_name: str = None
     temperature: float = 0
@@ -221,12 +514,19 @@ class RestEndpointModel(EndpointModel, KeyBasedAuthMixIn):
     def get_response(self, request):
         # Get the model response and measure the time taken.
         start_time = time.time()
-        response = urllib.request.urlopen(request, timeout=self.timeout)
+        body = self.urlopen(request)
         end_time = time.time()
+        return self.parse_response(json.loads(body), end_time - start_time)
+
+    async def aget_response(self, request):
+        start_time = time.time()
+        body = await async_urlopen(self.async_client, request, timeout=self.timeout)
+        end_time = time.time()
+        return self.parse_response(json.loads(body), end_time - start_time)
+
+    def parse_response(self, res, response_time):
         # Parse the response and return the model output.
-        res = json.loads(response.read())
         model_output = res["output"]
-        response_time = end_time - start_time
         return {"model_output": model_output, "response_time": response_time}
 
     def handle_request_error(self, e):
@@ -241,7 +541,7 @@ class RestEndpointModel(EndpointModel, KeyBasedAuthMixIn):
 
 
 @dataclass
-class ServerlessAzureRestEndpointModel(EndpointModel, KeyBasedAuthMixIn):
+class ServerlessAzureRestEndpointModel(PooledHTTPMixIn, EndpointModel, KeyBasedAuthMixIn):
     """This class can be used for serverless Azure model deployments."""
 
     """https://learn.microsoft.com/en-us/azure/ai-studio/how-to/deploy-models-serverless?tabs=azure-ai-studio"""
@@ -254,26 +554,28 @@ class ServerlessAzureRestEndpointModel(EndpointModel, KeyBasedAuthMixIn):
     def __post_init__(self):
         try:
             super().__post_init__()
-            self.headers = {
-                "Content-Type": "application/json",
-                "Authorization": ("Bearer " + self.api_key),
-                # The behavior of the API when extra parameters are indicated in the payload.
-                # Using pass-through makes the API to pass the parameter to the underlying model.
-                # Use this value when you want to pass parameters that you know the underlying model can support.
-                # https://learn.microsoft.com/en-us/azure/machine-learning/reference-model-inference-chat-completions?view=azureml-api-2
-                "extra-parameters": "pass-through",
-            }
+            self.bearer_token_provider = None
         except ValueError:
-            self.bearer_token_provider = get_bearer_token_provider(DefaultAzureCredential(), self.auth_scope)
-            self.headers = {
-                "Content-Type": "application/json",
-                "Authorization": ("Bearer " + self.bearer_token_provider()),
-                # The behavior of the API when extra parameters are indicated in the payload.
-                # Using pass-through makes the API to pass the parameter to the underlying model.
-                # Use this value when you want to pass parameters that you know the underlying model can support.
-                # https://learn.microsoft.com/en-us/azure/machine-learning/reference-model-inference-chat-completions?view=azureml-api-2
-                "extra-parameters": "pass-through",
-            }
+            # tokens are cached and refreshed in the background, shared by all the models that use the same scope
+            self.bearer_token_provider = get_bearer_token_cache(self.auth_scope)
+
+    @property
+    def headers(self):
+        """The request headers, with a bearer token that is valid at the time they are created."""
+        return {
+            "Content-Type": "application/json",
+            "Authorization": self.get_authorization(),
+            # The behavior of the API when extra parameters are indicated in the payload.
+            # Using pass-through makes the API to pass the parameter to the underlying model.
+            # Use this value when you want to pass parameters that you know the underlying model can support.
+            # https://learn.microsoft.com/en-us/azure/machine-learning/reference-model-inference-chat-completions?view=azureml-api-2
+            "extra-parameters": "pass-through",
+        }
+
+    def get_authorization(self):
+        if self.bearer_token_provider is None:
+            return "Bearer " + self.api_key
+        return "Bearer " + self.bearer_token_provider()
 
     @abstractmethod
     def create_request(self, text_prompt, query_images=None, system_message=None, previous_messages=None):
@@ -282,12 +584,22 @@ class ServerlessAzureRestEndpointModel(EndpointModel, KeyBasedAuthMixIn):
         raise NotImplementedError
 
     def get_response(self, request):
+        # the token may have been refreshed since the request was created, e.g. when the request is retried
+        request.add_header("Authorization", self.get_authorization())
         start_time = time.time()
-        response = urllib.request.urlopen(request, timeout=self.timeout)
+        body = self.urlopen(request)
         end_time = time.time()
-        res = json.loads(response.read())
+        return self.parse_response(json.loads(body), end_time - start_time)
+
+    async def aget_response(self, request):
+        request.add_header("Authorization", self.get_authorization())
+        start_time = time.time()
+        body = await async_urlopen(self.async_client, request, timeout=self.timeout)
+        end_time = time.time()
+        return self.parse_response(json.loads(body), end_time - start_time)
+
+    def parse_response(self, res, response_time):
         model_output = res["choices"][0]["message"]["content"]
-        response_time = end_time - start_time
         response_dict = {
             "model_output": model_output,
             "response_time": response_time,
@@ -339,7 +651,7 @@ class LlamaServerlessAzureRestEndpointModel(ServerlessAzureRestEndpointModel):
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/png;base64,{encoded_images[0]}",
+                        "url": encoded_images[0].data_url,
                     },
                 },
             ]
@@ -437,6 +749,8 @@ class OpenAICommonRequestResponseMixIn:
     This mixin class defines the request and response handling for most OpenAI models.
     """
 
+    supports_n_sampling: ClassVar[bool] = True
+
     def create_request(self, text_prompt, query_images=None, system_message=None, previous_messages=None):
         messages = []
         if system_message:
@@ -451,16 +765,15 @@ class OpenAICommonRequestResponseMixIn:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/png;base64,{encoded_images[0]}",
+                        "url": encoded_images[0].data_url,
                     },
                 },
             ]
         messages.append({"role": "user", "content": user_content})
         return {"messages": messages}
 
-    def get_response(self, request):
-        start_time = time.time()
-        completion = self.client.chat.completions.create(
+    def get_completion_args(self, request):
+        return dict(
             model=self.model_name,
             top_p=self.top_p,
             # seed=self.seed,
@@ -470,10 +783,30 @@ class OpenAICommonRequestResponseMixIn:
             max_tokens=self.max_tokens,
             **request,
         )
+
+    def get_response(self, request):
+        start_time = time.time()
+        completion = self.client.chat.completions.create(**self.get_completion_args(request))
         end_time = time.time()
+        return self.parse_completion(completion, end_time - start_time)
+
+    def get_n_responses(self, request, n):
+        start_time = time.time()
+        completion = self.client.chat.completions.create(**self.get_completion_args(request), n=n)
+        end_time = time.time()
+        return self.parse_n_completions(completion, end_time - start_time)
+
+    async def aget_response(self, request):
+        if self.async_client is None:
+            return await super().aget_response(request)
+        start_time = time.time()
+        completion = await self.async_client.chat.completions.create(**self.get_completion_args(request))
+        end_time = time.time()
+        return self.parse_completion(completion, end_time - start_time)
+
+    def parse_completion(self, completion, response_time):
         openai_response = completion.model_dump()
         model_output = openai_response["choices"][0]["message"]["content"]
-        response_time = end_time - start_time
         response_dict = {
             "model_output": model_output,
             "response_time": response_time,
@@ -485,6 +818,54 @@ class OpenAICommonRequestResponseMixIn:
                 response_dict.update({"n_output_tokens": usage["completion_tokens"]})
         return response_dict
 
+    def parse_n_completions(self, completion, response_time):
+        openai_response = completion.model_dump()
+        choices = sorted(openai_response["choices"], key=lambda choice: choice["index"])
+        response_dicts = [
+            {"model_output": choice["message"]["content"], "response_time": response_time} for choice in choices
+        ]
+        usage = openai_response.get("usage")
+        if isinstance(usage, dict) and "completion_tokens" in usage and response_dicts:
+            outputs = [response_dict["model_output"] for response_dict in response_dicts]
+            for response_dict, choice_usage in zip(response_dicts, self.split_n_completions_usage(usage, outputs)):
+                response_dict.update({"usage": choice_usage, "n_output_tokens": choice_usage["completion_tokens"]})
+        return response_dicts
+
+    def split_n_completions_usage(self, usage, outputs):
+        """
+        Splits the usage of a request for n completions, which the api reports for all the completions together,
+        into the usage of every completion, so that per-completion statistics are not skewed and the usages summed
+        over the completions are the usage of the request. The completion tokens are split in proportion to the
+        number of tokens of every output; the prompt tokens are attributed to the first completion only.
+        args:
+            usage (dict): the usage of the request.
+            outputs (list): the outputs of the n completions, in order.
+        returns:
+            usages (list): the usage of every completion, with "prompt_tokens", "completion_tokens", "total_tokens"
+                and "n_request_completions", the number of completions of the request that the usage was split among.
+        """
+        completion_tokens = usage["completion_tokens"] or 0
+        weights = [count_tokens(output) if isinstance(output, str) else 0 for output in outputs]
+        if not sum(weights):
+            weights = [1] * len(outputs)
+        shares = [completion_tokens * weight // sum(weights) for weight in weights]
+        # the tokens left over by the rounding down go to the longest outputs
+        by_weight = sorted(range(len(outputs)), key=lambda i: weights[i], reverse=True)
+        for i in by_weight[: completion_tokens - sum(shares)]:
+            shares[i] += 1
+        usages = []
+        for i, share in enumerate(shares):
+            prompt_tokens = (usage.get("prompt_tokens") or 0) if i == 0 else 0
+            usages.append(
+                {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": share,
+                    "total_tokens": prompt_tokens + share,
+                    "n_request_completions": len(outputs),
+                }
+            )
+        return usages
+
 
 class AzureOpenAIClientMixIn:
     """This mixin provides some methods to interact with Azure OpenAI models."""
@@ -492,13 +873,23 @@ class AzureOpenAIClientMixIn:
     def get_client(self):
         from openai import AzureOpenAI
 
-        token_provider = get_bearer_token_provider(DefaultAzureCredential(), self.auth_scope)
+        token_provider = get_bearer_token_cache(self.auth_scope)
         return AzureOpenAI(
             azure_endpoint=self.url,
             api_version=self.api_version,
             azure_ad_token_provider=token_provider,
         )
 
+    def get_async_client(self):
+        from openai import AsyncAzureOpenAI
+
+        token_provider = get_bearer_token_cache(self.auth_scope)
+        return AsyncAzureOpenAI(
+            azure_endpoint=self.url,
+            api_version=self.api_version,
+            azure_ad_token_provider=token_provider,
+        )
+
     def handle_request_error(self, e):
         # if the error is due to a content filter, there is no need to retry
         if hasattr(e, "code") and e.code == "content_filter":
@@ -521,6 +912,14 @@ class DirectOpenAIClientMixIn(KeyBasedAuthMixIn):
             api_key=self.api_key,
         )
 
+    def get_async_client(self):
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(
+            base_url=self.base_url,
+            api_key=self.api_key,
+        )
+
     def handle_request_error(self, e):
         logging.warning(e)
         return False
@@ -587,7 +986,7 @@ class OpenAIOModelsRequestResponseMixIn:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/png;base64,{encoded_images[0]}",
+                        "url": encoded_images[0].data_url,
                     },
                 },
             ]
@@ -595,35 +994,45 @@ class OpenAIOModelsRequestResponseMixIn:
         messages.append({"role": "user", "content": user_content})
         return {"messages": messages}
 
-    def get_response(self, request):
-        start_time = time.time()
+    def get_completion_args(self, request):
         if "o1-preview" in self.model_name:
             if self.reasoning_effort == "high":
                 logging.error("Reasoning effort is not supported by OpenAI O1 preview model.")
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                seed=self.seed,
-                temperature=self.temperature,
-                top_p=self.top_p,
-                frequency_penalty=self.frequency_penalty,
-                presence_penalty=self.presence_penalty,
-                **request,
-            )
-        else:
-            completion = self.client.chat.completions.create(
+            return dict(
                 model=self.model_name,
                 seed=self.seed,
                 temperature=self.temperature,
                 top_p=self.top_p,
                 frequency_penalty=self.frequency_penalty,
                 presence_penalty=self.presence_penalty,
-                reasoning_effort=self.reasoning_effort,
                 **request,
             )
+        return dict(
+            model=self.model_name,
+            seed=self.seed,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            frequency_penalty=self.frequency_penalty,
+            presence_penalty=self.presence_penalty,
+            reasoning_effort=self.reasoning_effort,
+            **request,
+        )
+
+    def get_response(self, request):
+        start_time = time.time()
+        completion = self.client.chat.completions.create(**self.get_completion_args(request))
         end_time = time.time()
+        return self.parse_completion(completion, end_time - start_time)
+
+    async def aget_response(self, request):
+        start_time = time.time()
+        completion = await self.async_client.chat.completions.create(**self.get_completion_args(request))
+        end_time = time.time()
+        return self.parse_completion(completion, end_time - start_time)
+
+    def parse_completion(self, completion, response_time):
         openai_response = completion.model_dump()
         model_output = openai_response["choices"][0]["message"]["content"]
-        response_time = end_time - start_time
         response_dict = {
             "model_output": model_output,
             "response_time": response_time,
@@ -712,7 +1121,7 @@ class GeminiModel(EndpointModel, KeyBasedAuthMixIn):
             self.model = genai.GenerativeModel(self.model_name, system_instruction=system_message)
 
         if query_images:
-            return [text_prompt] + query_images
+            return [text_prompt] + decode_images(query_images)
         else:
             return text_prompt
 
@@ -808,9 +1217,9 @@ class TogetherModel(OpenAICommonRequestResponseMixIn, KeyBasedAuthMixIn, Endpoin
         self.api_key = self.get_api_key()
         self.client = Together(api_key=self.api_key)
 
-    def get_response(self, request):
-        start_time = time.time()
-        completion = self.client.chat.completions.create(
+    def get_completion_args(self, request):
+        # used by get_n_responses() too, so that n-sampled requests are sent with the same arguments
+        return dict(
             model=self.model_name,
             top_p=self.top_p,
             presence_penalty=self.presence_penalty,
@@ -820,6 +1229,9 @@ class TogetherModel(OpenAICommonRequestResponseMixIn, KeyBasedAuthMixIn, Endpoin
             **request,
         )
 
+    def get_response(self, request):
+        start_time = time.time()
+        completion = self.client.chat.completions.create(**self.get_completion_args(request))
         end_time = time.time()
         openai_response = completion.model_dump()
         model_output = openai_response["choices"][0]["message"]["content"]
@@ -836,10 +1248,62 @@ class TogetherModel(OpenAICommonRequestResponseMixIn, KeyBasedAuthMixIn, Endpoin
         return False
 
 
+class OfflineBatchMixIn:
+    """This mixin is used by the self-hosted models whose engine runs many prompts at once, so that generate_batch()
+    makes a single call to the engine for the whole batch. Models implement prepare_batch_prompt(), which takes the
+    arguments of generate() and returns the prompt passed to the engine, and _generate_batch(), which runs the prompts.
+    """
+
+    supports_batching: ClassVar[bool] = True
+
+    def prepare_batch_prompt(self, text_prompt, query_images=None, system_message=None):
+        raise NotImplementedError
+
+    def _generate_batch(self, prompts):
+        # must return the model_output and response_time of every prompt, in order
+        raise NotImplementedError
+
+    def count_batch_prompt_tokens(self, prompt):
+        # must return the number of tokens of a prompt returned by prepare_batch_prompt(), as run by the engine
+        raise NotImplementedError
+
+    def count_prompt_tokens(self, text_prompt, *args, **kwargs):
+        if not self.supports_batching:
+            return super().count_prompt_tokens(text_prompt, *args, **kwargs)
+        prompt = self.prepare_batch_prompt(text_prompt, *args, **kwargs)
+        return self.count_batch_prompt_tokens(prompt) if prompt else 0
+
+    def generate_batch(self, model_inputs):
+        if not self.supports_batching:
+            return super().generate_batch(model_inputs)
+        prompts = [self.prepare_batch_prompt(*model_args, **model_kwargs) for model_args, model_kwargs in model_inputs]
+        response_dicts = [
+            {"model_output": None, "is_valid": False, "response_time": None, "n_output_tokens": None}
+            for _ in model_inputs
+        ]
+        indices = [i for i, prompt in enumerate(prompts) if prompt]
+        if not indices:
+            return response_dicts
+        try:
+            model_responses = self._generate_batch([prompts[i] for i in indices])
+        except Exception as e:
+            # e.g. the batch does not fit in memory, the inputs are retried one at a time
+            logging.warning(f"Batch of {len(indices)} prompts failed, generating them one at a time: {e}")
+            return super().generate_batch(model_inputs)
+        for i, model_response in zip(indices, model_responses):
+            response_dicts[i] = {
+                **model_response,
+                "is_valid": True,
+                "n_output_tokens": self.count_tokens(model_response["model_output"], True),
+            }
+        return response_dicts
+
+
 @dataclass
-class HuggingFaceModel(Model):
+class HuggingFaceModel(OfflineBatchMixIn, Model):
     """This class is used to run a self-hosted language model via HuggingFace apis."""
 
+    response_keys: ClassVar[tuple] = RESPONSE_KEYS
     model_name: str = None
     device: str = "cpu"
     max_tokens: int = 2000
@@ -880,6 +1344,10 @@ class HuggingFaceModel(Model):
         )
 
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=False)
+        # batched prompts are padded on the left, so that the generated tokens follow the prompts of all the rows
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
 
     def pick_available_device(self):
         """
@@ -909,13 +1377,7 @@ class HuggingFaceModel(Model):
 
         inputs = self.tokenizer(text_prompt, return_tensors="pt").to(self.device)
         start_time = time.time()
-        output_ids = self.model.generate(
-            inputs["input_ids"],
-            max_new_tokens=self.max_tokens,
-            temperature=self.temperature,
-            top_p=self.top_p,
-            do_sample=self.do_sample,
-        )
+        output_ids = self.model.generate(inputs["input_ids"], **self.get_generation_kwargs())
         end_time = time.time()
         sequence_length = inputs["input_ids"].shape[1]
         new_output_ids = output_ids[:, sequence_length:]
@@ -929,6 +1391,38 @@ class HuggingFaceModel(Model):
             "response_time": response_time,
         }
 
+    def _generate_batch(self, prompts):
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+        start_time = time.time()
+        output_ids = self.model.generate(
+            **inputs, **self.get_generation_kwargs(), pad_token_id=self.tokenizer.pad_token_id
+        )
+        end_time = time.time()
+        sequence_length = inputs["input_ids"].shape[1]
+        model_outputs = self.tokenizer.batch_decode(
+            output_ids[:, sequence_length:], skip_special_tokens=True, clean_up_tokenization_spaces=False
+        )
+        # every row waits for the whole batch
+        response_time = end_time - start_time
+        return [{"model_output": model_output, "response_time": response_time} for model_output in model_outputs]
+
+    def get_generation_kwargs(self):
+        """returns: the sampling arguments of model.generate(), for single prompts and batches alike."""
+        return {
+            "max_new_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "do_sample": self.do_sample,
+        }
+
+    def prepare_batch_prompt(self, text_prompt, query_images=None, system_message=None):
+        if text_prompt and self.apply_model_template:
+            return self.model_template_fn(text_prompt, system_message)
+        return text_prompt
+
+    def count_batch_prompt_tokens(self, prompt):
+        return len(self.tokenizer(prompt)["input_ids"])
+
     def generate(self, text_prompt, query_images=None, system_message=None):
         response_dict = {}
 
@@ -937,7 +1431,7 @@ class HuggingFaceModel(Model):
                 text_prompt = self.model_template_fn(text_prompt, system_message)
 
             try:
-                model_response = self._generate(text_prompt, query_images=query_images)
+                model_response = self._generate(text_prompt, query_images=decode_images(query_images))
                 if model_response:
                     response_dict.update(model_response)
                 is_valid = True
@@ -998,6 +1492,9 @@ class Phi4HFModel(HuggingFaceModel):
 class LLaVAHuggingFaceModel(HuggingFaceModel):
     """This class is used to run a self-hosted LLaVA model via HuggingFace apis."""
 
+    # the images of the prompts are not batched, every input is run on its own
+    supports_batching: ClassVar[bool] = False
+
     def __post_init__(self):
         super().__post_init__()
         if "llava" not in self.model_name:
@@ -1177,12 +1674,13 @@ class LLaVAModel(LLaVAHuggingFaceModel):
 
 
 @dataclass
-class VLLMModel(Model):
+class VLLMModel(OfflineBatchMixIn, Model):
     """This class is used to run a self-hosted language model via vLLM apis.
     This class uses the chat() functionality of vLLM which applies a template included in the HF model files.
     If the model files do not include a template, no template will be applied.
     """
 
+    response_keys: ClassVar[tuple] = RESPONSE_KEYS
     model_name: str = None
     trust_remote_code: bool = False
     tensor_parallel_size: int = 1
@@ -1215,18 +1713,20 @@ class VLLMModel(Model):
             cpu_offload_gb=self.cpu_offload_gb,
         )
 
-    def _generate(self, text_prompt, query_images=None):
+    def get_sampling_params(self):
+        """returns: the vllm.SamplingParams of the model, for single conversations and batches alike."""
         from vllm import SamplingParams
 
-        sampling_params = SamplingParams(
+        return SamplingParams(
             temperature=self.temperature,
             top_p=self.top_p,
             top_k=self.top_k,
             max_tokens=self.max_tokens,
         )
 
+    def _generate(self, text_prompt, query_images=None):
         start_time = time.time()
-        outputs = self.model.chat(text_prompt, sampling_params)
+        outputs = self.model.chat(text_prompt, self.get_sampling_params())
         end_time = time.time()
 
         model_output = outputs[0].outputs[0].text
@@ -1236,6 +1736,23 @@ class VLLMModel(Model):
             "response_time": response_time,
         }
 
+    def _generate_batch(self, prompts):
+        # the conversations are scheduled together by the continuous batching of vLLM
+        start_time = time.time()
+        outputs = self.model.chat(prompts, self.get_sampling_params())
+        end_time = time.time()
+        return [{"model_output": output.outputs[0].text, "response_time": end_time - start_time} for output in outputs]
+
+    def prepare_batch_prompt(self, text_prompt, query_images=None, system_message=None):
+        if not text_prompt:
+            return None
+        return self.create_request(text_prompt, system_message)
+
+    def count_batch_prompt_tokens(self, prompt):
+        # the conversation is counted with the chat template that model.chat() applies
+        tokenizer = self.model.get_tokenizer()
+        return len(tokenizer.apply_chat_template(prompt, add_generation_prompt=True, tokenize=True))
+
     def generate(self, text_prompt, query_images=None, system_message=None):
         response_dict = {}
         model_output = None
@@ -1532,8 +2049,8 @@ class ClaudeModel(EndpointModel, KeyBasedAuthMixIn):
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/jpeg",
-                        "data": encoded_images[0],
+                        "media_type": encoded_images[0].media_type,
+                        "data": encoded_images[0].data,
                     },
                 },
             ]
@@ -1544,18 +2061,35 @@ class ClaudeModel(EndpointModel, KeyBasedAuthMixIn):
         else:
             return {"messages": messages}
 
-    def get_response(self, request):
-        start_time = time.time()
-        completion = self.client.messages.create(
+    def get_async_client(self):
+        return anthropic.AsyncAnthropic(
+            api_key=self.api_key,
+            timeout=self.timeout,
+        )
+
+    def get_completion_args(self, request):
+        return dict(
             model=self.model_name,
             **request,
             temperature=self.temperature,
             top_p=self.top_p,
             max_tokens=self.max_tokens,
         )
+
+    def get_response(self, request):
+        start_time = time.time()
+        completion = self.client.messages.create(**self.get_completion_args(request))
+        end_time = time.time()
+        return self.parse_completion(completion, end_time - start_time)
+
+    async def aget_response(self, request):
+        start_time = time.time()
+        completion = await self.async_client.messages.create(**self.get_completion_args(request))
         end_time = time.time()
+        return self.parse_completion(completion, end_time - start_time)
+
+    def parse_completion(self, completion, response_time):
         model_output = completion.content[0].text
-        response_time = end_time - start_time
         response_dict = {
             "model_output": model_output,
             "response_time": response_time,
@@ -1572,6 +2106,7 @@ class ClaudeModel(EndpointModel, KeyBasedAuthMixIn):
 class ClaudeReasoningModel(ClaudeModel):
     """This class is used to interact with Claude reasoning models through the python api."""
 
+    response_keys: ClassVar[tuple] = ClaudeModel.response_keys + ("thinking_output", "redacted_thinking_output")
     model_name: str = None
     temperature: float = 1.0
     max_tokens: int = 20000
@@ -1580,25 +2115,22 @@ class ClaudeReasoningModel(ClaudeModel):
     thinking_budget: int = 16000
     top_p: float = None
 
-    def get_response(self, request):
-        model_output = None
-        response_time = None
-        thinking_output = None
-        redacted_thinking_output = None
-        response_dict = {}
+    def get_completion_args(self, request):
         if self.top_p is not None:
             logging.warning("top_p is not supported for claude reasoning models as of 03/08/2025. It will be ignored.")
-
-        start_time = time.time()
         thinking = {"type": "enabled", "budget_tokens": self.thinking_budget} if self.thinking_enabled else None
-        completion = self.client.messages.create(
+        return dict(
             model=self.model_name,
             **request,
             temperature=self.temperature,
             thinking=thinking,
             max_tokens=self.max_tokens,
         )
-        end_time = time.time()
+
+    def parse_completion(self, completion, response_time):
+        model_output = None
+        thinking_output = None
+        redacted_thinking_output = None
 
         # Loop through completion.content to find the text output
         for content in completion.content:
@@ -1609,7 +2141,6 @@ class ClaudeReasoningModel(ClaudeModel):
             elif content.type == "redacted_thinking":
                 redacted_thinking_output = content.data
 
-        response_time = end_time - start_time
         response_dict = {
             "model_output": model_output,
             "response_time": response_time,
@@ -1624,6 +2155,7 @@ class ClaudeReasoningModel(ClaudeModel):
 @dataclass
 class TestModel(Model):
     # This class is used for testing purposes only. It only waits for a specified time and returns a response.
+    response_keys: ClassVar[tuple] = RESPONSE_KEYS
 
     def generate(self, text_prompt, **kwargs):
         output = "This is a test response."
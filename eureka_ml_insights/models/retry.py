@@ -0,0 +1,174 @@
+"""This module contains the retry policy shared by the API-based models to space out the attempts of a request."""
+
+import email.utils
+import logging
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+# headers that endpoints use to tell clients how long to wait before retrying, in order of precedence
+RETRY_AFTER_MS_HEADERS = ("retry-after-ms",)
+RETRY_AFTER_HEADERS = (
+    "retry-after",
+    "x-ratelimit-reset-requests",
+    "x-ratelimit-reset-tokens",
+    "x-ratelimit-reset",
+    "anthropic-ratelimit-requests-reset",
+    "anthropic-ratelimit-tokens-reset",
+)
+
+# durations as reported in the x-ratelimit-reset-* headers of openai, e.g. "1s", "6m0s" or "20ms"
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATIONS_PATTERN = re.compile(r"(?:\d+(?:\.\d+)?(?:ms|h|m|s))+")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def get_error_headers(e):
+    """Returns the headers of the http response that caused an exception raised by urllib or by the openai and
+    anthropic clients, None if the exception does not carry a response."""
+    # urllib.error.HTTPError
+    headers = getattr(e, "headers", None)
+    if headers is None:
+        # openai.APIStatusError and anthropic.APIStatusError
+        headers = getattr(getattr(e, "response", None), "headers", None)
+    return headers
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parses the value of a retry header into a number of seconds to wait.
+    args:
+        value (str): a number of seconds, an http date, a unix timestamp, an RFC 3339 timestamp or a duration such
+            as "6m0s".
+        now (float): optional. The current unix time, used for the absolute formats. Default is time.time().
+    returns:
+        seconds (float): the number of seconds to wait, None if the value could not be parsed.
+    """
+    value = str(value).strip()
+    now = time.time() if now is None else now
+    try:
+        seconds = float(value)
+        # some endpoints report the unix time at which the limit resets rather than a delay
+        return max(seconds - now, 0) if seconds > 1e9 else max(seconds, 0)
+    except ValueError:
+        pass
+    if DURATIONS_PATTERN.fullmatch(value):
+        return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in DURATION_PATTERN.findall(value))
+    try:
+        reset_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            reset_time = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if reset_time.tzinfo is None:
+        reset_time = reset_time.replace(tzinfo=timezone.utc)
+    return max(reset_time.timestamp() - now, 0)
+
+
+def get_retry_after(e):
+    """Returns the number of seconds the endpoint asked to wait before retrying, as reported in the headers of the
+    response that caused the exception, None if the endpoint did not say."""
+    headers = get_error_headers(e)
+    if not headers:
+        return None
+    try:
+        for header in RETRY_AFTER_MS_HEADERS:
+            if headers.get(header) is not None:
+                return max(float(headers.get(header)) / 1000, 0)
+        for header in RETRY_AFTER_HEADERS:
+            if headers.get(header) is not None:
+                seconds = parse_retry_after(headers.get(header))
+                if seconds is not None:
+                    return seconds
+    except (AttributeError, TypeError, ValueError) as parse_error:
+        logging.debug(f"Could not parse the retry headers of the response: {parse_error}")
+    return None
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Decides how long to wait between the attempts of a request: exponential backoff with jitter, unless the endpoint
+    tells how long to wait through a Retry-After (or x-ratelimit-reset) header, in which case that wait is honored.
+
+    args:
+        base_delay (float): wait before the first retry, in seconds.
+        max_delay (float): maximum wait between two attempts, in seconds.
+        multiplier (float): factor by which the wait grows after every attempt.
+        jitter (str): "decorrelated" (each wait is drawn between base_delay and 3 times the previous wait),
+            "full" (each wait is drawn between 0 and the exponential backoff) or None for plain exponential backoff.
+        max_elapsed_time (float): the request is given up when the next attempt would start later than this many
+            seconds after the first one, including the time spent in the attempts. None (default) for no limit, in
+            which case only num_retries bounds the retries.
+        honor_retry_after (bool): whether to wait as long as the endpoint asks to, up to max_retry_after seconds.
+        max_retry_after (float): maximum wait honored from a Retry-After header, in seconds.
+    """
+
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    multiplier: float = 2.0
+    jitter: str = "decorrelated"
+    max_elapsed_time: float = None
+    honor_retry_after: bool = True
+    max_retry_after: float = 300.0
+
+    def __post_init__(self):
+        if self.jitter not in ("decorrelated", "full", None):
+            raise ValueError("jitter must be one of 'decorrelated', 'full' or None.")
+
+    def start(self):
+        """Returns the state of the retries of a new request."""
+        return RetryState(self)
+
+    def get_delay(self, n_retries, previous_delay, error=None):
+        """
+        args:
+            n_retries (int): number of retries made so far.
+            previous_delay (float): the previous wait, None before the first retry.
+            error (Exception): optional. The exception raised by the last attempt.
+        returns:
+            delay (float): the number of seconds to wait before the next attempt.
+        """
+        if self.honor_retry_after and error is not None:
+            retry_after = get_retry_after(error)
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+        backoff = min(self.base_delay * self.multiplier**n_retries, self.max_delay)
+        if self.jitter == "full":
+            return random.uniform(0, backoff)
+        if self.jitter == "decorrelated":
+            previous_delay = previous_delay or self.base_delay
+            return min(random.uniform(self.base_delay, previous_delay * 3), self.max_delay)
+        return backoff
+
+
+class RetryState:
+    """Keeps track of the retries of a single request."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.start_time = time.monotonic()
+        self.n_retries = 0
+        self.wait_time = 0.0
+        self.previous_delay = None
+
+    def next_delay(self, error=None):
+        """
+        Counts a retry and returns how long to wait before making it.
+        args:
+            error (Exception): optional. The exception raised by the last attempt.
+        returns:
+            delay (float): the number of seconds to wait, None if the request should be given up because the
+                maximum elapsed time would be exceeded.
+        """
+        delay = self.policy.get_delay(self.n_retries, self.previous_delay, error)
+        if self.policy.max_elapsed_time is not None:
+            if time.monotonic() - self.start_time + delay > self.policy.max_elapsed_time:
+                return None
+        self.n_retries += 1
+        self.wait_time += delay
+        self.previous_delay = delay
+        return delay
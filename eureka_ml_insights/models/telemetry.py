@@ -0,0 +1,88 @@
+"""This module contains utilities to break down where the time of an inference request is spent.
+The timings of the request being processed are kept in a context variable, so that they can be collected from deep
+inside the models without passing them around, both from worker threads and from asyncio tasks."""
+
+import asyncio
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Accumulates the time spent in each phase of a single inference request, in seconds."""
+
+    def __init__(self, **phases):
+        self.created = time.perf_counter()
+        self.phases = dict(phases)
+        # where the result came from, e.g. "model" or "cache", None if the request was skipped
+        self.source = None
+        self.started = {}
+
+    def add(self, phase, seconds):
+        if seconds is None:
+            return
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def start(self, phase):
+        """Starts timing a phase that ends with a call to stop(), possibly in another thread."""
+        self.started[phase] = time.perf_counter()
+
+    def stop(self, phase):
+        start_time = self.started.pop(phase, None)
+        if start_time is not None:
+            self.add(phase, time.perf_counter() - start_time)
+
+    def elapsed(self):
+        """Returns the number of seconds since the timings were created."""
+        return time.perf_counter() - self.created
+
+
+@contextmanager
+def collect_timings(timings):
+    """Makes timings the timings of the current request for the duration of the context."""
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def get_current_timings():
+    """Returns the timings of the request being processed, None if no timings are being collected."""
+    return _current_timings.get()
+
+
+def record_time(phase, seconds):
+    """Adds seconds to a phase of the current request, if timings are being collected."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase):
+    """Adds the time spent in the context to a phase of the current request, if timings are being collected."""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start_time)
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    Runs the blocking func(*args, **kwargs) in the default executor of the running event loop and returns its result.
+    Like asyncio.to_thread(), which requires python 3.9, func runs in a copy of the current context so that it
+    records its timings in the request being processed.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func, *args, **kwargs))
@@ -0,0 +1,67 @@
+"""This module contains the process-wide registry of tiktoken encodings used to count tokens, so that encodings are
+loaded once, lazily, and shared by all the models and transforms that count tokens."""
+
+import threading
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+# texts are encoded in chunks, so that the tokens of a whole column are never held in memory at once
+BATCH_SIZE = 1000
+# below this number of texts, the overhead of the thread pool of encode_batch is not worth it
+MIN_BATCH_SIZE = 16
+DEFAULT_NUM_THREADS = 8
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(encoding_name=DEFAULT_ENCODING):
+    """Returns the tiktoken encoding of that name, loaded on first use and then shared by all the threads."""
+    encoding = _encodings.get(encoding_name)
+    if encoding is None:
+        with _encodings_lock:
+            encoding = _encodings.get(encoding_name)
+            if encoding is None:
+                encoding = tiktoken.get_encoding(encoding_name)
+                _encodings[encoding_name] = encoding
+    return encoding
+
+
+def count_tokens(text, encoding_name=DEFAULT_ENCODING):
+    """
+    args:
+        text (str): the text to count the tokens of.
+        encoding_name (str): optional. The tiktoken encoding to use. Default is "cl100k_base".
+    returns:
+        n_tokens (int): the number of tokens in the text, None if the text is None.
+    """
+    if text is None:
+        return None
+    return len(get_encoding(encoding_name).encode(text))
+
+
+def count_tokens_many(texts, encoding_name=DEFAULT_ENCODING, num_threads=DEFAULT_NUM_THREADS):
+    """
+    Counts the tokens of many texts at once, encoding them in parallel with tiktoken's encode_batch.
+    args:
+        texts (iterable): the texts to count the tokens of. None values are allowed.
+        encoding_name (str): optional. The tiktoken encoding to use. Default is "cl100k_base".
+        num_threads (int): optional. Number of threads used by encode_batch.
+    returns:
+        n_tokens (list): the number of tokens of every text, None for the texts that are None.
+    """
+    encoding = get_encoding(encoding_name)
+    texts = list(texts)
+    counts = [None] * len(texts)
+    indices = [i for i, text in enumerate(texts) if text is not None]
+    for start in range(0, len(indices), BATCH_SIZE):
+        batch_indices = indices[start : start + BATCH_SIZE]
+        batch = [texts[i] for i in batch_indices]
+        if len(batch) < MIN_BATCH_SIZE:
+            batch_tokens = [encoding.encode(text) for text in batch]
+        else:
+            batch_tokens = encoding.encode_batch(batch, num_threads=num_threads)
+        for i, tokens in zip(batch_indices, batch_tokens):
+            counts[i] = len(tokens)
+    return counts
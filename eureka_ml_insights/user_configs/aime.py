@@ -34,6 +34,11 @@ from eureka_ml_insights.metrics.reports import (
 
 # from eureka_ml_insights.data_utils.transform import MajorityVoteTransform
 
+# The pipelines that run AIME several times multiply the data virtually: the data loader expands the repeats of a data
+# point one after the other, so that the models that support n sampling sample them with requests for up to this many
+# completions, see Inference.samples_per_request. Rows that are not repeats are still sent one by one.
+MAX_SAMPLES_PER_REQUEST = 16
+
 
 class AIME_PIPELINE(ExperimentConfig):
     """This class specifies the config for running AIME benchmark on any model"""
@@ -79,6 +84,7 @@ class AIME_PIPELINE(ExperimentConfig):
             output_dir=os.path.join(self.log_dir, "inference_result"),
             resume_from=resume_from,
             max_concurrent=10,
+            samples_per_request=MAX_SAMPLES_PER_REQUEST,
         )
         # post process the response to extract the answer
         self.data_post_processing = DataProcessingConfig(
@@ -211,7 +217,7 @@ class AIME_PIPELINE5Run(AIME_PIPELINE):
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
         self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=5)
+            MultiplyTransform(n_repeats=5, virtual=True)
         )
         return pipeline
 
@@ -225,7 +231,7 @@ class AIME_PIPELINE16Run(AIME_PIPELINE):
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
         self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=16)
+            MultiplyTransform(n_repeats=16, virtual=True)
         )
         return pipeline
 
@@ -239,7 +245,7 @@ class AIME_PIPELINE32Run(AIME_PIPELINE):
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
         self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=32)
+            MultiplyTransform(n_repeats=32, virtual=True)
         )
         return pipeline
 
@@ -253,7 +259,7 @@ class AIME_PIPELINE64Run(AIME_PIPELINE):
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
         self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=64)
+            MultiplyTransform(n_repeats=64, virtual=True)
         )
         return pipeline
 
@@ -267,7 +273,7 @@ class AIME_PIPELINE128Run(AIME_PIPELINE):
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
         self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=128)
+            MultiplyTransform(n_repeats=128, virtual=True)
         )
         return pipeline
 
@@ -281,7 +287,7 @@ class AIME_PIPELINE256Run(AIME_PIPELINE):
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
         self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=256)
+            MultiplyTransform(n_repeats=256, virtual=True)
         )
         return pipeline
 
@@ -295,7 +301,7 @@ class AIME_PIPELINE512Run(AIME_PIPELINE):
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
         self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=512)
+            MultiplyTransform(n_repeats=512, virtual=True)
         )
         return pipeline
 
@@ -309,6 +315,6 @@ class AIME_PIPELINE1024Run(AIME_PIPELINE):
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
         self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=1024)
+            MultiplyTransform(n_repeats=1024, virtual=True)
         )
         return pipeline
@@ -177,10 +177,11 @@ class GPQA_Experiment_Pipeline(ExperimentConfig):
                 {
                     "path": os.path.join(self.inference_llm_answer_extract.output_dir, "inference_result.jsonl"),
                     "format": ".jsonl",
+                    # only load the uid and model_output columns
+                    "columns": ["data_repeat_id", "data_point_id", "model_output"],
+                    "backend": "orjson",
                     "transform": SequenceTransform(
                         [
-                            # drop all columns except the uid and model_output
-                            RunPythonTransform("df = df[[col for col in ['data_repeat_id','data_point_id', 'model_output'] if col in df.columns]]"),
                             RegexTransform(
                                 columns="model_output",
                                 prompt_pattern=r"Final Answer: (\w)(?=\s|\W|$)",
@@ -515,7 +516,10 @@ class GPQA_PIPELINE_5Run(GPQA_Experiment_Pipeline):
     ) -> PipelineConfig:
         pipeline = super().configure_pipeline(model_config=model_config, resume_from=resume_from)
         # data preprocessing
-        self.data_processing_comp.data_reader_config.init_args["transform"].transforms.append(
-            MultiplyTransform(n_repeats=5)
+        # the repeats of a data point are expanded one after the other by the data loader, so that the models that
+        # support n sampling sample them with a single request, see Inference.samples_per_request
+        self.data_processing_comp.data_reader_config.init_args["transform"].transforms[-1] = MultiplyTransform(
+            n_repeats=5, virtual=True
         )
+        self.inference_comp.samples_per_request = 5
         return pipeline
\ No newline at end of file
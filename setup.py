@@ -13,6 +13,7 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=[
+        'aiohttp>=3.9.0',
         'anthropic>=0.49.0',
         'azure-ai-textanalytics>=5.3.0',
         'azure-core>=1.29.5',
@@ -22,11 +23,14 @@ setup(
         'datasets>=3.2.0',
         'fuzzywuzzy>=0.18.0',
         'jsonlines>=2.0.0',
+        'orjson>=3.8.0',
         'pandas>=2.2.1',
+        'pyarrow>=14.0.1',
         'pillow>=10.0.1',
         'torch==2.5.1',
         'numpy==1.26.4',
         'tqdm>=4.65.0',
+        'urllib3>=2.0.0',
         'jinja2>=3.1.3',
         'transformers>=4.40.2',
         'immutabledict>=4.2.0',
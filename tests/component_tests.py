@@ -1,6 +1,10 @@
+import json
 import os
 import time
 import unittest
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
 import pandas as pd
 
@@ -14,19 +18,37 @@ from eureka_ml_insights.configs import (
     create_logdir,
 )
 from eureka_ml_insights.core import (
+    AsyncInference,
     DataJoin,
     DataProcessing,
     Inference,
     PromptProcessing,
 )
+from eureka_ml_insights.core.adaptive_concurrency import (
+    AdaptiveConcurrencyController,
+    is_throttling_error,
+)
+from eureka_ml_insights.core.rate_limiter import RateLimiter
+from eureka_ml_insights.core.response_cache import get_model_fingerprint
+from eureka_ml_insights.models.tokenizer import count_tokens
 from eureka_ml_insights.data_utils import (
     ColumnRename,
+    DataLoader,
     DataReader,
+    MultiplyTransform,
     ReplaceStringsTransform,
     RunPythonTransform,
     SequenceTransform,
 )
-from tests.test_utils import TestDataLoader, TestModel
+from tests.test_utils import (
+    BatchTestModel,
+    DeclaredResponseKeysTestModel,
+    NSamplingTestModel,
+    TemplatedBatchTestModel,
+    TestAsyncModel,
+    TestDataLoader,
+    TestModel,
+)
 
 
 class TestPromptProcessing(unittest.TestCase):
@@ -99,6 +121,104 @@ class TestDataProcessing(unittest.TestCase):
         self.assertSetEqual(set(df.columns.tolist()), set(["query_text", "ground_truth"]))
         self.assertEqual(df["query_text"].str.contains("\n").sum(), 0)
 
+    def test_retry_columns_are_not_reserved(self):
+        # the retry statistics of the models are dropped like any other column that is not asked for
+        data_path = os.path.join(self.log_dir, "inference_result.jsonl")
+        pd.DataFrame(
+            {"uid": range(3), "model_output": "output", "is_valid": True, "n_retries": 0, "retry_wait_time": 0.0}
+        ).to_json(data_path, orient="records", lines=True)
+        config = DataProcessingConfig(
+            component_type=DataProcessing,
+            data_reader_config=DataSetConfig(DataReader, {"path": data_path}),
+            output_dir=os.path.join(self.log_dir, "retry_columns_output"),
+            output_data_columns=["uid", "model_output"],
+        )
+        DataProcessing.from_config(config).run()
+        df = pd.read_json(os.path.join(config.output_dir, "transformed_data.jsonl"), lines=True)
+        self.assertSetEqual(set(df.columns), {"uid", "model_output", "is_valid"})
+
+
+class TestColumnarDataProcessing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = create_logdir("TestColumnarDataProcessing")
+        self.config = DataProcessingConfig(
+            component_type=DataProcessing,
+            data_reader_config=DataSetConfig(
+                DataReader,
+                {"path": "./sample_data/sample_data.jsonl", "format": ".jsonl"},
+            ),
+            output_dir=os.path.join(self.log_dir, "data_processing_output"),
+            output_data_columns=["query_text", "images"],
+            output_format="parquet",
+        )
+        component = DataProcessing.from_config(self.config)
+        component.run()
+
+    def test_columnar_data_processing(self):
+        self.assertTrue(os.path.exists(os.path.join(self.config.output_dir, "transformed_data.parquet")))
+        self.assertFalse(os.path.exists(os.path.join(self.config.output_dir, "transformed_data.jsonl")))
+        # the next component is configured with the jsonl path and reads the parquet file
+        df = DataReader(os.path.join(self.config.output_dir, "transformed_data.jsonl")).load_dataset()
+        expected = DataReader("./sample_data/sample_data.jsonl", columns=["query_text", "images"]).load_dataset()
+        pd.testing.assert_frame_equal(df[expected.columns], expected)
+
+
+class TestChunkedDataProcessing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = create_logdir("TestChunkedDataProcessing")
+        transform = SequenceTransform(
+            [
+                ColumnRename(name_mapping={"target_text": "ground_truth"}),
+                MultiplyTransform(n_repeats=3),
+            ]
+        )
+        self.configs = {}
+        for chunk_size in [None, 2]:
+            self.configs[chunk_size] = DataProcessingConfig(
+                component_type=DataProcessing,
+                data_reader_config=DataSetConfig(
+                    DataReader,
+                    {"path": "./sample_data/sample_data.jsonl", "format": ".jsonl", "transform": transform},
+                ),
+                output_dir=os.path.join(self.log_dir, f"data_processing_output_{chunk_size}"),
+                output_data_columns=["query_text", "ground_truth"],
+                output_format="arrow",
+                chunk_size=chunk_size,
+            )
+            DataProcessing.from_config(self.configs[chunk_size]).run()
+
+    def test_chunked_data_processing(self):
+        dfs = []
+        for config in self.configs.values():
+            df = DataReader(os.path.join(config.output_dir, "transformed_data.jsonl")).load_dataset()
+            dfs.append(df.sort_values(["data_point_id", "data_repeat_id"]).reset_index(drop=True))
+        pd.testing.assert_frame_equal(dfs[1][dfs[0].columns], dfs[0])
+
+    def test_late_columns(self):
+        data_path = os.path.join(self.log_dir, "late_columns.jsonl")
+        with open(data_path, "w") as f:
+            for i in range(5):
+                record = {"uid": i, "prompt": f"prompt {i}"}
+                # the "hint" key only appears in the second chunk
+                if i in [2, 3]:
+                    record["hint"] = f"hint {i}"
+                f.write(json.dumps(record) + "\n")
+        for output_format in ["jsonl", "parquet", "arrow"]:
+            with self.subTest(output_format=output_format):
+                output_dir = os.path.join(self.log_dir, f"late_columns_{output_format}")
+                config = DataProcessingConfig(
+                    component_type=DataProcessing,
+                    data_reader_config=DataSetConfig(DataReader, {"path": data_path, "format": ".jsonl"}),
+                    output_dir=output_dir,
+                    output_format=output_format,
+                    chunk_size=2,
+                )
+                DataProcessing.from_config(config).run()
+                df = DataReader(os.path.join(output_dir, "transformed_data.jsonl")).load_dataset()
+                self.assertListEqual(df["uid"].tolist(), list(range(5)))
+                self.assertListEqual(df["hint"].tolist()[2:4], ["hint 2", "hint 3"])
+                self.assertTrue(df["hint"].iloc[[0, 1, 4]].isna().all())
+
 
 class TestDataJoin(unittest.TestCase):
     def setUp(self) -> None:
@@ -231,6 +351,353 @@ class TestParallelInference(unittest.TestCase):
         self.assertGreaterEqual(len(df), len(resume_from_df))
 
 
+class TestResumeWithDeclaredResponseKeys(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = create_logdir("TestInference")
+        self.config = InferenceConfig(
+            component_type=Inference,
+            data_loader_config=DataSetConfig(
+                TestDataLoader,
+                {
+                    "path": "./tests/test_assets/transformed_data.jsonl",
+                    "n_iter": 40,
+                },
+            ),
+            model_config=ModelConfig(DeclaredResponseKeysTestModel, {}),
+            output_dir=os.path.join(self.log_dir, "model_output"),
+            resume_from="./tests/test_assets/resume_from.jsonl",
+            max_concurrent=4,
+        )
+        self.component = Inference.from_config(self.config)
+        self.component.run()
+
+    def test_inference(self):
+        df = pd.read_json(os.path.join(self.config.output_dir, "inference_result.jsonl"), lines=True)
+        resume_from_df = pd.read_json(self.config.resume_from, lines=True)
+        valid_uids = set(resume_from_df[resume_from_df["is_valid"]]["uid"])
+        # the model is only called for the rows that need to be inferenced, not for a sample call
+        self.assertEqual(len(self.component.model.prompts), len(df) - len(set(df["uid"]) & valid_uids))
+
+        # valid previous results are read back from disk in full
+        merged_df = df.merge(resume_from_df[resume_from_df["is_valid"]], on="uid", suffixes=("_new", "_old"))
+        self.assertEqual(len(merged_df), len(set(df["uid"]) & valid_uids))
+        self.assertListEqual(list(merged_df["model_output_new"]), list(merged_df["model_output_old"]))
+        self.assertListEqual(list(merged_df["images_new"]), list(merged_df["images_old"]))
+
+
+class TestResponseCacheInference(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = create_logdir("TestInference")
+
+    def run_inference(self, run_name, component_type=Inference):
+        config = InferenceConfig(
+            component_type=component_type,
+            data_loader_config=DataSetConfig(
+                TestDataLoader,
+                {
+                    "path": "./tests/test_assets/transformed_data.jsonl",
+                    "n_iter": 40,
+                },
+            ),
+            model_config=ModelConfig(DeclaredResponseKeysTestModel, {}),
+            output_dir=os.path.join(self.log_dir, run_name),
+            max_concurrent=4,
+            response_cache_path=os.path.join(self.log_dir, "response_cache.sqlite"),
+        )
+        component = component_type.from_config(config)
+        component.run()
+        df = pd.read_json(os.path.join(config.output_dir, "inference_result.jsonl"), lines=True)
+        with open(os.path.join(config.output_dir, "response_cache_stats.json")) as f:
+            stats = json.load(f)
+        return component, df, stats
+
+    def test_response_cache(self):
+        # all the prompts in the test data are identical, so concurrent requests are deduplicated
+        component, df, stats = self.run_inference("first_run")
+        self.assertEqual(len(component.model.prompts), 1)
+        self.assertEqual(len(df), 40)
+        self.assertTrue(df["is_valid"].all())
+        self.assertEqual((stats["hits"], stats["misses"]), (39, 1))
+
+        # a rerun with the same model configuration is entirely served from the cache
+        component, df, stats = self.run_inference("second_run", component_type=AsyncInference)
+        self.assertEqual(len(component.model.prompts), 0)
+        self.assertEqual(len(df), 40)
+        self.assertTrue((df["model_output"] == "model output").all())
+        self.assertEqual((stats["hits"], stats["misses"]), (40, 0))
+
+    def test_repeats(self):
+        # the repeats of a data point get their own responses, unless they explicitly share them
+        data_path = os.path.join(self.log_dir, "repeats.jsonl")
+        repeat_ids = [f"repeat_{i}" for i in range(6)]
+        df = pd.DataFrame({"prompt": "same prompt", "uid": range(6), "data_point_id": 0, "data_repeat_id": repeat_ids})
+        df.to_json(data_path, orient="records", lines=True)
+        for share_cache_across_repeats, n_calls in [(False, 6), (True, 1)]:
+            config = InferenceConfig(
+                component_type=Inference,
+                data_loader_config=DataSetConfig(DataLoader, {"path": data_path}),
+                model_config=ModelConfig(DeclaredResponseKeysTestModel, {}),
+                output_dir=os.path.join(self.log_dir, f"repeats_{share_cache_across_repeats}"),
+                response_cache_path=os.path.join(self.log_dir, f"repeats_{share_cache_across_repeats}.sqlite"),
+                share_cache_across_repeats=share_cache_across_repeats,
+            )
+            component = Inference.from_config(config)
+            component.run()
+            self.assertEqual(len(component.model.prompts), n_calls)
+
+    def test_model_fingerprint(self):
+        fingerprint = get_model_fingerprint(ModelConfig(TestModel, {"model_name": "a", "api_key": "secret"}))
+        self.assertEqual(
+            fingerprint, get_model_fingerprint(ModelConfig(TestModel, {"model_name": "a", "api_key": "other"}))
+        )
+        self.assertNotEqual(fingerprint, get_model_fingerprint(ModelConfig(TestModel, {"model_name": "b"})))
+
+
+class TestInferenceTelemetry(unittest.TestCase):
+    def test_timings_and_stats(self):
+        log_dir = create_logdir("TestInference")
+        config = InferenceConfig(
+            component_type=Inference,
+            data_loader_config=DataSetConfig(
+                TestDataLoader,
+                {
+                    "path": "./tests/test_assets/transformed_data.jsonl",
+                    "n_iter": 40,
+                },
+            ),
+            model_config=ModelConfig(TestModel, {}),
+            output_dir=os.path.join(log_dir, "model_output"),
+            resume_from="./tests/test_assets/resume_from.jsonl",
+            requests_per_minute=6000,
+            max_concurrent=4,
+        )
+        Inference.from_config(config).run()
+        timings_df = pd.read_json(os.path.join(config.output_dir, "inference_timings.jsonl"), lines=True)
+        self.assertEqual(len(timings_df), 40)
+        self.assertSetEqual(set(timings_df["source"]), {"model", "resume"})
+        for phase in ["data_loading", "queue_wait", "writer_wait", "total"]:
+            self.assertTrue((timings_df[phase] >= 0).all())
+        model_rows = timings_df[timings_df["source"] == "model"]
+        self.assertTrue(model_rows["rate_limiter_wait"].notna().all())
+        # the test model sleeps for 0.1 seconds
+        self.assertTrue((model_rows["total"] >= 0.1).all())
+
+        with open(os.path.join(config.output_dir, "inference_stats.json")) as f:
+            stats = json.load(f)
+        self.assertEqual(stats["n_rows"], 40)
+        self.assertEqual(stats["n_requests"], len(model_rows))
+        self.assertGreater(stats["requests_per_second"], 0)
+        self.assertSetEqual(set(stats["latency"]["total"]), {"p50", "p95", "p99", "mean"})
+
+
+class TestBoundedInFlightInference(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = create_logdir("TestInference")
+        self.config = InferenceConfig(
+            component_type=Inference,
+            data_loader_config=DataSetConfig(
+                TestDataLoader,
+                {
+                    "path": "./tests/test_assets/transformed_data.jsonl",
+                    "n_iter": 40,
+                },
+            ),
+            model_config=ModelConfig(TestModel, {}),
+            output_dir=os.path.join(self.log_dir, "model_output"),
+            max_concurrent=2,
+            max_in_flight=4,
+        )
+        component = Inference.from_config(self.config)
+        # track how many records have been read from the loader but not yet written out
+        self.n_read = 0
+        self.n_written = 0
+        self.max_outstanding = 0
+        loader_iter = TestDataLoader.__iter__
+
+        def counting_iter(loader):
+            for record in loader_iter(loader):
+                self.n_read += 1
+                yield record
+
+        append = component._append_threadsafe
+
+        def counting_append(data):
+            self.max_outstanding = max(self.max_outstanding, self.n_read - self.n_written)
+            self.n_written += 1
+            append(data)
+
+        component._append_threadsafe = counting_append
+        # special methods are looked up on the class, not on the instance
+        with patch.object(TestDataLoader, "__iter__", counting_iter):
+            component.run()
+
+    def test_inference(self):
+        df = pd.read_json(os.path.join(self.config.output_dir, "inference_result.jsonl"), lines=True)
+        self.assertEqual(len(df), 40)
+        self.assertEqual(self.n_read, 40)
+        self.assertGreater(self.max_outstanding, 0)
+        self.assertLessEqual(self.max_outstanding, self.config.max_in_flight)
+
+
+class TestNSamplingInference(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = create_logdir("TestInference")
+        # rows written by a virtual MultiplyTransform, each expanded into 3 repeats by the data loader
+        self.data_path = os.path.join(self.log_dir, "virtual_repeats.jsonl")
+        pd.DataFrame(
+            {"prompt": [f"prompt {i}" for i in range(4)], "uid": range(4), "data_point_id": range(4), "n_repeats": 3}
+        ).to_json(self.data_path, orient="records", lines=True)
+
+    def run_inference(self, data_path, run_name):
+        config = InferenceConfig(
+            component_type=Inference,
+            data_loader_config=DataSetConfig(DataLoader, {"path": data_path}),
+            model_config=ModelConfig(NSamplingTestModel, {}),
+            output_dir=os.path.join(self.log_dir, run_name),
+            max_concurrent=2,
+            samples_per_request=3,
+        )
+        component = Inference.from_config(config)
+        component.run()
+        return component, config
+
+    def test_inference(self):
+        component, config = self.run_inference(self.data_path, "model_output")
+        # the 3 repeats of every data point are sampled with a single request
+        self.assertListEqual(component.model.calls, [3, 3, 3, 3])
+        df = pd.read_json(os.path.join(config.output_dir, "inference_result.jsonl"), lines=True)
+        self.assertEqual(len(df), 12)
+        self.assertListEqual(sorted(df["uid"]), list(range(12)))
+        # the completions are written back to the repeats in order
+        expected_outputs = df.apply(
+            lambda row: f"prompt {row['data_point_id']} sample {row['data_repeat_id'][len('repeat_'):]}", axis=1
+        )
+        self.assertListEqual(list(df["model_output"]), list(expected_outputs))
+        # every request is counted once, along with the tokens of all its completions
+        self.assertEqual(component.stats.n_rows, 12)
+        self.assertEqual(component.stats.n_requests, 4)
+        self.assertEqual(component.stats.n_output_tokens, 12)
+        timings_df = pd.read_json(os.path.join(config.output_dir, "inference_timings.jsonl"), lines=True)
+        self.assertEqual(timings_df["source"].value_counts().to_dict(), {"grouped": 8, "model": 4})
+
+    def test_physical_repeats(self):
+        # the rows of a MultiplyTransform that is not virtual are ordered repeat by repeat
+        data_path = os.path.join(self.log_dir, "physical_repeats.jsonl")
+        df = pd.DataFrame({"prompt": [f"prompt {i}" for i in range(4)]})
+        df = MultiplyTransform(n_repeats=3).transform(df)
+        df["uid"] = df.index
+        df.to_json(data_path, orient="records", lines=True)
+        component, config = self.run_inference(data_path, "physical_repeats")
+        # the repeats of a data point are not consecutive, every repeat is sampled on its own
+        self.assertListEqual(component.model.calls, [])
+        self.assertEqual(len(pd.read_json(os.path.join(config.output_dir, "inference_result.jsonl"), lines=True)), 12)
+
+
+class TestBatchedInference(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = create_logdir("TestInference")
+        self.data_path = os.path.join(self.log_dir, "batched_prompts.jsonl")
+        pd.DataFrame({"prompt": [f"prompt {i}" for i in range(10)], "uid": range(10)}).to_json(
+            self.data_path, orient="records", lines=True
+        )
+
+    def run_inference(self, run_name, **kwargs):
+        config = InferenceConfig(
+            component_type=Inference,
+            data_loader_config=DataSetConfig(DataLoader, {"path": self.data_path}),
+            model_config=ModelConfig(BatchTestModel, {}),
+            output_dir=os.path.join(self.log_dir, run_name),
+            **kwargs,
+        )
+        component = Inference.from_config(config)
+        component.run()
+        df = pd.read_json(os.path.join(config.output_dir, "inference_result.jsonl"), lines=True)
+        # batches are written in the order they complete
+        df = df.sort_values("uid")
+        self.assertListEqual(list(df["uid"]), list(range(10)))
+        self.assertListEqual(list(df["model_output"]), [f"prompt {i} output" for i in range(10)])
+        return component
+
+    def test_batch_size(self):
+        component = self.run_inference("batch_size", batch_size=4)
+        self.assertListEqual(component.model.batch_sizes, [4, 4, 2])
+
+    def test_max_batch_tokens(self):
+        # all the prompts have the same number of tokens, the budget fits 3 of them
+        n_prompt_tokens = count_tokens("prompt 0")
+        component = self.run_inference("max_batch_tokens", batch_size=4, max_batch_tokens=3 * n_prompt_tokens)
+        # the last record is run on its own, with generate()
+        self.assertListEqual(component.model.batch_sizes, [3, 3, 3])
+
+    def test_model_prompt_tokens(self):
+        config = InferenceConfig(
+            component_type=Inference,
+            data_loader_config=DataSetConfig(DataLoader, {"path": self.data_path}),
+            model_config=ModelConfig(TemplatedBatchTestModel, {}),
+            output_dir=os.path.join(self.log_dir, "model_prompt_tokens"),
+            batch_size=4,
+            max_batch_tokens=2 * len("<user>prompt 0</user>"),
+        )
+        component = Inference.from_config(config)
+        component.run()
+        # the prompts are counted by the model, template included: the budget fits 2 of them
+        self.assertListEqual(component.model.batch_sizes, [2] * 5)
+        df = pd.read_json(os.path.join(config.output_dir, "inference_result.jsonl"), lines=True).sort_values("uid")
+        self.assertListEqual(list(df["model_output"]), [f"<user>prompt {i}</user> output" for i in range(10)])
+
+
+class TestAsyncInference(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = create_logdir("TestInference")
+
+    def test_resume_with_blocking_model(self):
+        config = InferenceConfig(
+            component_type=AsyncInference,
+            data_loader_config=DataSetConfig(
+                TestDataLoader,
+                {
+                    "path": "./tests/test_assets/transformed_data.jsonl",
+                    "n_iter": 40,
+                },
+            ),
+            model_config=ModelConfig(TestModel, {}),
+            output_dir=os.path.join(self.log_dir, "model_output"),
+            resume_from="./tests/test_assets/resume_from.jsonl",
+            max_concurrent=5,
+        )
+        AsyncInference.from_config(config).run()
+        df = pd.read_json(os.path.join(config.output_dir, "inference_result.jsonl"), lines=True)
+        resume_from_df = pd.read_json(config.resume_from, lines=True)
+        self.assertEqual(len(df), 40)
+        # valid results from the resume_from file are kept as they are
+        merged_df = df.merge(resume_from_df[resume_from_df["is_valid"]], on="uid", suffixes=("_new", "_old"))
+        self.assertTrue((merged_df["model_output_new"] == merged_df["model_output_old"]).all())
+
+    def test_native_async_model(self):
+        config = InferenceConfig(
+            component_type=AsyncInference,
+            data_loader_config=DataSetConfig(
+                TestDataLoader,
+                {
+                    "path": "./tests/test_assets/transformed_data.jsonl",
+                    "n_iter": 40,
+                },
+            ),
+            model_config=ModelConfig(TestAsyncModel, {"delay": 0.5}),
+            output_dir=os.path.join(self.log_dir, "async_model_output"),
+            max_concurrent=40,
+        )
+        component = AsyncInference.from_config(config)
+        start = time.time()
+        component.run()
+        duration = time.time() - start
+        df = pd.read_json(os.path.join(config.output_dir, "inference_result.jsonl"), lines=True)
+        self.assertEqual(len(df), 40)
+        self.assertTrue(df["is_valid"].all())
+        # all 40 requests wait on the event loop at the same time, sequentially this would take 20 seconds
+        self.assertLess(duration, 5)
+
+
 class TestRateLimitedInference(unittest.TestCase):
     def setUp(self) -> None:
         self.log_dir = create_logdir("TestInference")
@@ -266,5 +733,114 @@ class TestRateLimitedInference(unittest.TestCase):
         self.assertGreaterEqual(self.duration, (40 / 20 - 1) * 60)
 
 
+class TestRateLimiter(unittest.TestCase):
+    def test_requests_per_minute_across_threads(self):
+        # 600 requests per minute is one request every 0.1 seconds, with a burst of 2
+        rate_limiter = RateLimiter(requests_per_minute=600, request_burst=2)
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: rate_limiter.acquire(), range(12)))
+        # the first 2 requests are admitted right away, the remaining 10 are spaced 0.1 seconds apart
+        self.assertGreaterEqual(time.time() - start, 0.95)
+        self.assertLess(time.time() - start, 3)
+
+    def test_tokens_per_minute(self):
+        # 6000 tokens per minute is 100 tokens per second
+        rate_limiter = RateLimiter(tokens_per_minute=6000, token_burst=100)
+        self.assertEqual(rate_limiter.try_acquire(), 0)
+        rate_limiter.record_usage({"usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}})
+        # the budget is overdrawn by 50 tokens, the next request has to wait roughly half a second
+        self.assertGreater(rate_limiter.try_acquire(), 0.4)
+        waited = rate_limiter.acquire()
+        self.assertGreater(waited, 0.4)
+
+    def test_default_burst(self):
+        # 120 requests per minute: after a cold start, 2 requests are admitted at once, not a whole minute of them
+        rate_limiter = RateLimiter(requests_per_minute=120)
+        self.assertEqual(rate_limiter.try_acquire(), 0)
+        self.assertEqual(rate_limiter.try_acquire(), 0)
+        self.assertGreater(rate_limiter.try_acquire(), 0.4)
+        # below 60 requests per minute, a single request is admitted at once
+        rate_limiter = RateLimiter(requests_per_minute=30)
+        self.assertEqual(rate_limiter.try_acquire(), 0)
+        self.assertGreater(rate_limiter.try_acquire(), 1)
+
+
+class TestAdaptiveConcurrencyController(unittest.TestCase):
+    def complete_window(self, controller, latency):
+        for _ in range(controller.limit):
+            self.assertTrue(controller.try_acquire())
+        for _ in range(controller.in_flight):
+            controller.release(latency)
+
+    def test_additive_increase_multiplicative_decrease(self):
+        controller = AdaptiveConcurrencyController(max_concurrent=8)
+        self.assertEqual(controller.limit, 1)
+        for expected_limit in range(2, 9):
+            self.complete_window(controller, latency=0.1)
+            self.assertEqual(controller.limit, expected_limit)
+        # the limit never exceeds max_concurrent
+        self.complete_window(controller, latency=0.1)
+        self.assertEqual(controller.limit, 8)
+        for _ in range(8):
+            self.assertTrue(controller.try_acquire())
+        self.assertFalse(controller.try_acquire())
+        for _ in range(8):
+            controller.release()
+
+        controller.record_throttling(urllib.error.HTTPError("url", 429, "Too Many Requests", {}, None))
+        self.assertEqual(controller.limit, 4)
+        # errors that are not related to throttling are ignored
+        controller.record_throttling(ValueError("bad request"))
+        self.assertEqual(controller.limit, 4)
+        # the window during which throttling happened does not increase the limit
+        self.complete_window(controller, latency=0.1)
+        self.assertEqual(controller.limit, 4)
+        # high latencies hold the limit
+        self.complete_window(controller, latency=1.0)
+        self.assertEqual(controller.limit, 4)
+        self.complete_window(controller, latency=0.1)
+        self.assertEqual(controller.limit, 5)
+        self.assertListEqual(
+            [entry["reason"] for entry in controller.history], ["initial"] + ["increase"] * 7 + ["decrease", "increase"]
+        )
+
+    def test_throttling_errors(self):
+        self.assertTrue(is_throttling_error(TimeoutError()))
+        self.assertTrue(is_throttling_error(urllib.error.HTTPError("url", 503, "Service Unavailable", {}, None)))
+        self.assertFalse(is_throttling_error(urllib.error.HTTPError("url", 400, "Bad Request", {}, None)))
+
+        class RateLimitError(Exception):
+            status_code = 429
+
+        self.assertTrue(is_throttling_error(RateLimitError()))
+
+    def test_adaptive_inference(self):
+        log_dir = create_logdir("TestInference")
+        config = InferenceConfig(
+            component_type=Inference,
+            data_loader_config=DataSetConfig(
+                TestDataLoader,
+                {
+                    "path": "./tests/test_assets/transformed_data.jsonl",
+                    "n_iter": 40,
+                },
+            ),
+            model_config=ModelConfig(TestModel, {}),
+            output_dir=os.path.join(log_dir, "model_output"),
+            max_concurrent=4,
+            adaptive_concurrency=True,
+        )
+        Inference.from_config(config).run()
+        df = pd.read_json(os.path.join(config.output_dir, "inference_result.jsonl"), lines=True)
+        self.assertEqual(len(df), 40)
+        with open(os.path.join(config.output_dir, "adaptive_concurrency.json")) as f:
+            history = json.load(f)
+        concurrency = [entry["concurrency"] for entry in history]
+        self.assertEqual(concurrency[0], 1)
+        self.assertGreater(max(concurrency), 1)
+        self.assertLessEqual(max(concurrency), 4)
+
+
 if __name__ == "__main__":
     unittest.main()
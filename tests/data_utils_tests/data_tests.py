@@ -1,28 +1,54 @@
 # write unit tests for the classes in data_utils
+import json
 import os
+import tempfile
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
 import numpy as np
 import pandas as pd
 from PIL import Image
 
 from eureka_ml_insights.data_utils import (
+    AzureDataReader,
+    AzureMMDataLoader,
+    BlobDiskCache,
     ColumnMatchMapTransform,
     ColumnRename,
+    DataReader,
     HFDataReader,
+    BufferedJsonLinesWriter,
+    DataFrameChunkWriter,
+    DataLoader,
     ImputeNA,
+    IndexedJsonLinesReader,
+    JsonLinesWriter,
     JinjaPromptTemplate,
     MajorityVoteTransform,
     MapStringsTransform,
     MMDataLoader,
     MultiplyTransform,
+    NumpyEncoder,
     RegexTransform,
     ReplaceStringsTransform,
     RunPythonTransform,
+    SamplerTransform,
     SequenceTransform,
     ShuffleColumnsTransform,
     TokenCounterTransform,
+    write_dataframe,
 )
+from eureka_ml_insights.data_utils.azure_clients import (
+    clear_azure_clients,
+    get_blob_client,
+    get_container_client,
+    parse_blob_url,
+)
+from eureka_ml_insights.models.auth import get_azure_credential
+from eureka_ml_insights.models.image_encoding import ImageHandle
+from tests.test_utils import LocalContainerClient
 
 
 class TestDataTransform(unittest.TestCase):
@@ -87,6 +113,33 @@ class TestDataTransform(unittest.TestCase):
         self.assertListEqual(list(result["B"]), ["a", "b", "c", "a", "b", "c"])
         self.assertEqual(len(result["A"]), len(self.df) * n_repeats)
 
+    def test_virtual_multiply_transform(self):
+        # jsonlines does not read NaN values
+        df = self.df[["B", "D"]]
+        result = MultiplyTransform(n_repeats=3, virtual=True).transform(df)
+        self.assertListEqual(list(result["B"]), ["a", "b", "c"])
+        self.assertListEqual(list(result["n_repeats"]), [3, 3, 3])
+        self.assertListEqual(list(result["data_point_id"]), [0, 1, 2])
+        self.assertNotIn("data_repeat_id", result.columns)
+        # the loaders expand the repeats into the rows of the physical transform, in a different order
+        expected = MultiplyTransform(n_repeats=3).transform(df)
+        expected["prompt"] = expected["B"]
+        expected["uid"] = expected["data_point_id"] * 3 + expected["data_repeat_id"].str[len("repeat_") :].astype(int)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "transformed_data.jsonl")
+            result["prompt"] = result["B"]
+            result["uid"] = result.index
+            write_dataframe(result, path)
+            with DataLoader(path) as loader:
+                self.assertEqual(loader.get_sample_model_input()[0]["data_repeat_id"], "repeat_0")
+            with DataLoader(path) as loader:
+                self.assertEqual(len(loader), 9)
+                rows = [row for row, _, _ in loader]
+        self.assertListEqual([row["uid"] for row in rows], list(range(9)))
+        self.assertTrue(all("n_repeats" not in row for row in rows))
+        df = pd.DataFrame(rows)[expected.columns].sort_values("uid").reset_index(drop=True)
+        pd.testing.assert_frame_equal(df, expected.sort_values("uid").reset_index(drop=True))
+
     def test_majorityvote_transform(self):
         df1 = pd.DataFrame(
             {"data_point_id": [1, 1, 1, 2, 2, 2, 3, 3, 3], "model_output": [100, 100, 99, 5, 4, 1, 2, np.nan, np.nan]}
@@ -130,6 +183,15 @@ class TestTokenCounterTransform(unittest.TestCase):
         self.assertEqual(result["B"][0], self.df.loc[0, "B"])
         self.assertEqual(result["A"][0], self.df.loc[0, "A"])
 
+    def test_token_transform_batched(self):
+        # enough rows for the texts to be encoded in parallel batches, with a missing value
+        texts = ["tiktoken is great!", "antidisestablishmentarianism"] * 1500 + [None]
+        df = pd.DataFrame({"A": texts}, index=range(10, 10 + len(texts)))
+        result = TokenCounterTransform("A").transform(df)
+        self.assertListEqual(result["A_token_count"].tolist()[:4], [6, 6, 6, 6])
+        self.assertEqual(result["A_token_count"].count(), len(texts) - 1)
+        self.assertTrue(pd.isna(result["A_token_count"].iloc[-1]))
+
 
 class JinjaPromptTemplateTest(unittest.TestCase):
     def setUp(self):
@@ -169,6 +231,419 @@ class TestMMDataLoader(unittest.TestCase):
                 self.assertTrue(isinstance(model_args[1][0], Image.Image))
 
 
+class TestAzureMMDataLoader(unittest.TestCase):
+    """Testing AzureMMDataLoader against a local stand-in for the blob container."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.blob_dir = os.path.join(self.temp_dir.name, "container")
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        os.makedirs(self.blob_dir)
+        self.colors = [(i * 50, 0, 0) for i in range(5)]
+        for i, color in enumerate(self.colors):
+            Image.new("RGB", (4, 4), color=color).save(os.path.join(self.blob_dir, f"image_{i}.png"))
+        self.path = os.path.join(self.temp_dir.name, "data.jsonl")
+        with open(self.path, "w") as f:
+            for i in range(20):
+                f.write(json.dumps({"prompt": f"prompt {i}", "image": f"image_{i % 5}.png"}) + "\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_loader(self, container_client, **kwargs):
+        return AzureMMDataLoader(
+            self.path,
+            "https://account.blob.core.windows.net",
+            "container",
+            image_column_names=["image"],
+            container_client=container_client,
+            **kwargs,
+        )
+
+    def load_colors(self, data_loader):
+        colors = []
+        with data_loader:
+            for _, model_args, _ in data_loader:
+                image = model_args[1][0]
+                if isinstance(image, ImageHandle):
+                    image = image.decode()
+                colors.append(image.getpixel((0, 0)))
+        return colors
+
+    def test_prefetch(self):
+        container_client = LocalContainerClient(self.blob_dir)
+        colors = self.load_colors(self.get_loader(container_client, prefetch_workers=4, prefetch_size=8))
+        self.assertListEqual(colors, [self.colors[i % 5] for i in range(20)])
+        # the rows that use the same image while it is being prefetched share the download
+        self.assertLess(len(container_client.downloaded_blobs), 20)
+
+    def test_prefetch_cancelled(self):
+        container_client = LocalContainerClient(self.blob_dir)
+        download_blob = container_client.download_blob
+
+        def slow_download_blob(blob_name, **kwargs):
+            time.sleep(0.2)
+            return download_blob(blob_name, **kwargs)
+
+        data_loader = self.get_loader(container_client, prefetch_workers=1, prefetch_size=8)
+        with patch.object(container_client, "download_blob", slow_download_blob):
+            with data_loader:
+                iterator = iter(data_loader)
+                next(iterator)
+                iterator.close()
+            time.sleep(1.2)
+        # stopping the iteration cancels the downloads that have not started
+        self.assertLessEqual(len(container_client.downloaded_blobs), 2)
+        self.assertDictEqual(data_loader.prefetched, {})
+
+    def test_disk_cache(self):
+        container_client = LocalContainerClient(self.blob_dir)
+        expected_colors = [self.colors[i % 5] for i in range(20)]
+        for lazy_images in [False, True]:
+            data_loader = self.get_loader(container_client, cache_dir=self.cache_dir, lazy_images=lazy_images)
+            self.assertListEqual(self.load_colors(data_loader), expected_colors)
+        # every blob is downloaded once, the second run reads them from the disk cache
+        self.assertCountEqual(container_client.downloaded_blobs, [f"image_{i}.png" for i in range(5)])
+
+        # an overwritten blob has a new etag and is downloaded again
+        Image.new("RGB", (4, 4), color=(0, 255, 0)).save(os.path.join(self.blob_dir, "image_0.png"))
+        os.utime(os.path.join(self.blob_dir, "image_0.png"), ns=(0, 0))
+        colors = self.load_colors(self.get_loader(container_client, cache_dir=self.cache_dir, prefetch_workers=0))
+        self.assertEqual(colors[0], (0, 255, 0))
+        self.assertEqual(len(container_client.downloaded_blobs), 6)
+
+    def test_disk_cache_eviction(self):
+        disk_cache = BlobDiskCache(self.cache_dir, max_bytes=250)
+        for i in range(5):
+            disk_cache.put("container", f"blob_{i}", "etag", bytes(100))
+            # reading blob_0 makes it the most recently used entry
+            os.utime(disk_cache.get_path("container", "blob_0", "etag"), (time.time() + i, time.time() + i))
+        self.assertIsNotNone(disk_cache.get("container", "blob_0", "etag"))
+        self.assertIsNotNone(disk_cache.get("container", "blob_4", "etag"))
+        self.assertIsNone(disk_cache.get("container", "blob_1", "etag"))
+        self.assertLessEqual(disk_cache.n_bytes, 250)
+        self.assertIsNone(disk_cache.get("container", "blob_4", "other_etag"))
+
+
+class TestDataReaderBackends(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "data.jsonl")
+        self.records = [
+            {"uid": i, "prompt": f"prompt {i}", "score": i / 10, "usage": {"total_tokens": i}} for i in range(100)
+        ]
+        with open(self.path, "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_backends(self):
+        expected = pd.DataFrame(self.records)
+        # pd.read_json does not round-trip every float exactly
+        pd.testing.assert_frame_equal(DataReader(self.path).load_dataset(), expected)
+        pd.testing.assert_frame_equal(DataReader(self.path, backend="orjson").load_dataset(), expected, check_exact=True)
+        pd.testing.assert_frame_equal(DataReader(self.path, backend="pyarrow").load_dataset(), expected)
+
+    def test_columns(self):
+        for backend in ["pandas", "orjson", "pyarrow"]:
+            # columns that are not in the file are ignored
+            df = DataReader(self.path, backend=backend, columns=["prompt", "uid", "missing"]).load_dataset()
+            self.assertListEqual(df.columns.tolist(), ["prompt", "uid"])
+            self.assertEqual(len(df), 100)
+        with self.assertRaises(ValueError):
+            DataReader(self.path, backend="unknown")
+
+
+class TestColumnarOutputs(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "transformed_data.jsonl")
+        self.df = pd.DataFrame(
+            {
+                "uid": range(5),
+                "prompt": [f"prompt {i} é" for i in range(5)],
+                "score": [0.1, 0.2, 0.3, 0.4, 0.5],
+                "choices": [["a", "b"], ["c"], [], ["d"], ["e", "f"]],
+                "usage": [{"total_tokens": i} for i in range(5)],
+            }
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_columnar_outputs(self):
+        write_dataframe(self.df, self.path)
+        expected = DataReader(self.path).load_dataset()
+        with DataLoader(self.path) as loader:
+            expected_rows = [row for row, _, _ in loader]
+        for output_format in ["parquet", "arrow"]:
+            with self.subTest(output_format=output_format):
+                output_path = write_dataframe(self.df, self.path, output_format)
+                self.assertEqual(os.path.splitext(output_path)[1], "." + output_format)
+                # readers configured with the jsonl path load the more recent columnar file
+                df = DataReader(self.path).load_dataset()
+                pd.testing.assert_frame_equal(df, expected)
+                self.assertListEqual(df["choices"].tolist(), self.df["choices"].tolist())
+                df = DataReader(self.path, columns=["uid", "usage"]).load_dataset()
+                self.assertListEqual(df.columns.tolist(), ["uid", "usage"])
+                with DataLoader(self.path) as loader:
+                    rows = [row for row, _, _ in loader]
+                    self.assertEqual(len(loader), 5)
+                self.assertListEqual(rows, expected_rows)
+                os.remove(output_path)
+
+    def test_jsonl_side_output(self):
+        output_path = write_dataframe(self.df, self.path, "arrow", jsonl_side_output=True)
+        self.assertTrue(os.path.exists(self.path))
+        self.assertTrue(os.path.exists(output_path))
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 5)
+        # a jsonl file written after the columnar file is read instead
+        time.sleep(0.01)
+        write_dataframe(self.df.head(2), self.path)
+        self.assertEqual(len(DataReader(self.path).load_dataset()), 2)
+        self.assertEqual(len(DataReader(output_path, format=".arrow").load_dataset()), 5)
+
+    def test_jsonl_output_matches_iterrows(self):
+        frames = [
+            self.df,
+            # frames without object columns are upcast to a common dtype by iterrows
+            pd.DataFrame({"uid": [1, 2, 3], "score": [0.1, np.nan, 1e16]}),
+            pd.DataFrame({"value": [np.bool_(True), np.int64(2), np.array([1, 2]), None]}),
+            pd.DataFrame(index=range(3)),
+        ]
+        for df in frames:
+            write_dataframe(df, self.path)
+            with open(self.path, encoding="utf-8") as f:
+                content = f.read()
+            expected = "".join(
+                json.dumps(row.to_dict(), ensure_ascii=False, separators=(",", ":"), cls=NumpyEncoder) + "\n"
+                for _, row in df.iterrows()
+            )
+            self.assertEqual(content, expected)
+
+    def test_chunk_writer(self):
+        chunks = [self.df.iloc[:2], self.df.iloc[2:]]
+        with DataFrameChunkWriter(self.path, "parquet") as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        self.assertEqual(writer.output_path, os.path.join(self.temp_dir.name, "transformed_data.parquet"))
+        pd.testing.assert_frame_equal(DataReader(self.path).load_dataset(), self.df)
+        # a column that only holds nulls in the first chunk does not fit the schema of the later chunks
+        os.remove(writer.output_path)
+        with DataFrameChunkWriter(self.path, "arrow") as writer:
+            writer.write(pd.DataFrame({"uid": [0, 1], "model_output": [None, None]}))
+            writer.write(pd.DataFrame({"uid": [2], "model_output": ["text"]}))
+        self.assertEqual(writer.output_path, self.path)
+        self.assertListEqual(DataReader(self.path).load_dataset()["model_output"].tolist(), [None, None, "text"])
+
+    def test_fallback_to_jsonl(self):
+        # arrow cannot represent a column that mixes strings and dicts
+        df = pd.DataFrame({"uid": [0, 1], "model_output": ["text", {"answer": "A"}]})
+        output_path = write_dataframe(df, self.path, "parquet")
+        self.assertEqual(output_path, self.path)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir.name, "transformed_data.parquet")))
+        self.assertListEqual(DataReader(self.path).load_dataset()["model_output"].tolist(), ["text", {"answer": "A"}])
+
+
+class TestChunkedDataReader(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "data.jsonl")
+        self.df = pd.DataFrame(
+            {"uid": range(25), "prompt": [f"prompt {i}" for i in range(25)], "category": ["a", "b", "c", "d", "e"] * 5}
+        )
+        write_dataframe(self.df, self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assert_same_rows(self, df, expected):
+        sort_columns = [c for c in ["uid", "data_repeat_id"] if c in df.columns]
+        df = df.sort_values(sort_columns).reset_index(drop=True)
+        pd.testing.assert_frame_equal(df, expected.sort_values(sort_columns).reset_index(drop=True))
+
+    def test_row_local_transforms(self):
+        transform = SequenceTransform(
+            [
+                RunPythonTransform("df['uid_str'] = df['uid'].astype(str)"),
+                MultiplyTransform(n_repeats=3),
+                ColumnRename(name_mapping={"prompt": "query"}),
+            ]
+        )
+        expected = DataReader(self.path, transform=transform).load_dataset()
+        for backend in ["pandas", "orjson", "pyarrow"]:
+            with self.subTest(backend=backend):
+                chunks = list(DataReader(self.path, transform=transform, backend=backend).iter_dataset_chunks(10))
+                # every chunk of 10 input rows is multiplied on its own
+                self.assertListEqual([len(chunk) for chunk in chunks], [30, 30, 15])
+                df = pd.concat(chunks)
+                self.assertListEqual(df.index.tolist(), list(range(75)))
+                self.assert_same_rows(df, expected)
+
+    def test_full_frame_transforms(self):
+        self.assertTrue(SamplerTransform(random_seed=0, sample_count=1).needs_full_frame)
+        self.assertTrue(MajorityVoteTransform().needs_full_frame)
+        transform = SequenceTransform(
+            [
+                ColumnRename(name_mapping={"prompt": "query"}),
+                SamplerTransform(random_seed=0, sample_count=2, stratify_by=["category"]),
+                MultiplyTransform(n_repeats=2),
+            ]
+        )
+        expected = DataReader(self.path, transform=transform).load_dataset()
+        # the chunks are gathered before sampling, so the sample is the same as without chunks
+        df = pd.concat(DataReader(self.path, transform=transform).iter_dataset_chunks(4))
+        self.assert_same_rows(df, expected)
+        self.assertEqual(len(df), 20)
+
+    def test_full_frame_transforms_from_spill(self):
+        self.df["data_point_id"] = self.df["uid"] // 3
+        self.df["model_output"] = (self.df["uid"] % 2).astype(str)
+        write_dataframe(self.df, self.path)
+        for transform in [
+            SamplerTransform(random_seed=0, sample_count=7),
+            SamplerTransform(random_seed=1, sample_count=2, stratify_by=["category"]),
+            MajorityVoteTransform(),
+        ]:
+            with self.subTest(transform=type(transform).__name__):
+                expected = DataReader(self.path, transform=transform).load_dataset()
+                # the spilled rows are read in chunks, they are never loaded as a single data frame
+                with patch.object(DataReader, "load_dataset", side_effect=AssertionError):
+                    chunks = list(DataReader(self.path, transform=transform).iter_dataset_chunks(4))
+                self.assertTrue(all(len(chunk) <= 4 for chunk in chunks))
+                # the sampled rows are in the order of the sample
+                pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+    def test_columnar_chunks(self):
+        write_dataframe(self.df, self.path, "parquet")
+        chunks = list(DataReader(self.path, columns=["uid", "category"]).iter_dataset_chunks(10))
+        self.assertListEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        pd.testing.assert_frame_equal(pd.concat(chunks), self.df[["uid", "category"]])
+
+
+class TestAzureClients(unittest.TestCase):
+    account_url = "https://account.blob.core.windows.net"
+
+    def tearDown(self):
+        clear_azure_clients()
+
+    def test_parse_blob_url(self):
+        self.assertEqual(
+            parse_blob_url(f"{self.account_url}/container/path/to/my%20data.jsonl"),
+            (self.account_url, "container", "path/to/my data.jsonl"),
+        )
+        with self.assertRaises(ValueError):
+            parse_blob_url(f"{self.account_url}/container")
+
+    def test_clients_are_shared(self):
+        container_client = get_container_client(self.account_url, "container")
+        self.assertIs(get_container_client(self.account_url, "container"), container_client)
+        other_container_client = get_container_client(self.account_url, "other")
+        self.assertIsNot(other_container_client, container_client)
+        # clients of the same account share the credential
+        self.assertIs(other_container_client.credential, container_client.credential)
+        blob_client = get_blob_client(f"{self.account_url}/container/data.jsonl")
+        self.assertEqual(blob_client.blob_name, "data.jsonl")
+        self.assertIs(blob_client.credential, container_client.credential)
+        # and the models authenticate with the same credential
+        self.assertIs(container_client.credential, get_azure_credential())
+
+    def test_azure_data_reader(self):
+        records = [{"uid": i, "prompt": f"prompt {i} é", "is_valid": i % 2 == 0} for i in range(10)]
+        # a column that only appears after the first records, an explicit null and a missing value
+        records[3]["usage"] = {"total_tokens": 3}
+        records[4]["prompt"] = None
+        del records[5]["is_valid"]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, "data.jsonl"), "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    if record["uid"] == 6:
+                        f.write("\n[1, 2]\n{invalid\n")
+            container_client = LocalContainerClient(temp_dir)
+            reader = AzureDataReader(self.account_url, "container", "data.jsonl", max_concurrency=4)
+            with patch(
+                "eureka_ml_insights.data_utils.data.get_blob_client",
+                side_effect=lambda blob_url: container_client.get_blob_client(parse_blob_url(blob_url)[2]),
+            ):
+                df = reader.load_dataset()
+        pd.testing.assert_frame_equal(df, pd.DataFrame(records))
+        self.assertEqual(container_client.max_concurrency, 4)
+
+
+class TestIndexedJsonLinesReader(unittest.TestCase):
+    def setUp(self):
+        records = [{"uid": i, "is_valid": i % 2 == 0, "model_output": f"output {i}"} for i in range(100)]
+        # a duplicate uid, the first occurrence is used, and a record with an extra column
+        records.append({"uid": 3, "is_valid": True, "model_output": "duplicate"})
+        records.append({"uid": 100, "is_valid": True, "model_output": "output 100", "usage": {"total_tokens": 5}})
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "results.jsonl")
+        with open(self.path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.write("\n")
+            # partially written last record
+            f.write('{"uid": 101, "is_val')
+        self.reader = IndexedJsonLinesReader(self.path, key="uid", index_columns=["is_valid"]).build_index()
+
+    def tearDown(self):
+        self.reader.close()
+        self.temp_dir.cleanup()
+
+    def test_index(self):
+        self.assertEqual(self.reader.n_records, 102)
+        self.assertEqual(len(self.reader.keys()), 101)
+        self.assertListEqual(self.reader.columns, ["uid", "is_valid", "model_output", "usage"])
+        self.assertDictEqual(self.reader.get_index_values(3), {"is_valid": False})
+        self.assertIsNone(self.reader.get_index_values(101))
+
+    def test_get(self):
+        self.assertDictEqual(
+            self.reader.get(3), {"uid": 3, "is_valid": False, "model_output": "output 3", "usage": None}
+        )
+        self.assertEqual(self.reader.get(100)["usage"], {"total_tokens": 5})
+        self.assertIsNone(self.reader.get(101))
+
+    def test_get_from_threads(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            outputs = list(executor.map(lambda uid: self.reader.get(uid)["model_output"], range(100)))
+        self.assertListEqual(outputs, [f"output {i}" for i in range(100)])
+
+
+class TestBufferedJsonLinesWriter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.records = [{"uid": np.int64(i), "score": np.float32(0.5), "model_output": f"output {i}"} for i in range(500)]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_same_output_as_jsonlines_writer(self):
+        path = os.path.join(self.temp_dir.name, "buffered.jsonl")
+        expected_path = os.path.join(self.temp_dir.name, "expected.jsonl")
+        with BufferedJsonLinesWriter(path, mode="w", batch_size=16) as writer:
+            for record in self.records:
+                writer.write(record)
+        with JsonLinesWriter(expected_path, mode="w") as writer:
+            for record in self.records:
+                writer.write(record)
+        with open(path) as f, open(expected_path) as expected_f:
+            self.assertEqual(f.read(), expected_f.read())
+
+    def test_append_from_threads(self):
+        path = os.path.join(self.temp_dir.name, "appended.jsonl")
+        for records in [self.records[:250], self.records[250:]]:
+            with BufferedJsonLinesWriter(path, mode="a", max_queue_size=8) as writer:
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    list(executor.map(writer.write, records))
+        df = pd.read_json(path, lines=True)
+        self.assertListEqual(sorted(df["uid"]), list(range(500)))
+
+
 class TestShuffleColumns(unittest.TestCase):
     """Testing the ShuffleColumnsTransform used in MCQ benchmarks to shuffle answer choices."""
 
@@ -1,5 +1,10 @@
+import asyncio
+import os
 import random
+import threading
 import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
 
 from eureka_ml_insights.data_utils import (
     AzureMMDataLoader,
@@ -8,6 +13,7 @@ from eureka_ml_insights.data_utils import (
     MMDataLoader,
 )
 from eureka_ml_insights.metrics import ClassicMetric, CompositeMetric
+from eureka_ml_insights.models.models import Model, OfflineBatchMixIn
 
 
 class TestModel:
@@ -19,6 +25,87 @@ class TestModel:
         return {"model_output": "model output", "is_valid": True, "response_time": 0, "n_output_tokens": 0}
 
 
+class TestAsyncModel(TestModel):
+    def __init__(self, model_name="generic_async_test_model", delay=0.5):
+        super().__init__(model_name)
+        self.delay = delay
+
+    async def agenerate(self, text_prompt, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return {"model_output": "model output", "is_valid": True, "response_time": self.delay, "n_output_tokens": 0}
+
+
+class DeclaredResponseKeysTestModel(TestModel):
+    """Declares its response keys, so resuming from previous results does not need a sample inference call.
+    Keeps track of the prompts it was called with."""
+
+    def __init__(self, model_name="declared_keys_test_model"):
+        super().__init__(model_name)
+        self.prompts = []
+
+    def get_response_keys(self):
+        return {"model_output", "is_valid", "response_time", "n_output_tokens"}, set()
+
+    def generate(self, text_prompt, *args, **kwargs):
+        self.prompts.append(text_prompt)
+        return super().generate(text_prompt, *args, **kwargs)
+
+
+class NSamplingTestModel(TestModel):
+    """Samples n responses with a single call to generate_n(), and keeps track of the n of every call."""
+
+    supports_n_sampling = True
+
+    def __init__(self, model_name="n_sampling_test_model"):
+        super().__init__(model_name)
+        self.calls = []
+
+    def generate_n(self, text_prompt, *args, n=1, **kwargs):
+        self.calls.append(n)
+        return [
+            {"model_output": f"{text_prompt} sample {i}", "is_valid": True, "response_time": 0, "n_output_tokens": 1}
+            for i in range(n)
+        ]
+
+
+class BatchTestModel(TestModel):
+    """Runs a batch of inputs with a single call to generate_batch(), and keeps track of the size of every batch."""
+
+    supports_batching = True
+
+    def __init__(self, model_name="batch_test_model"):
+        super().__init__(model_name)
+        self.batch_sizes = []
+
+    def generate(self, text_prompt, *args, **kwargs):
+        return {"model_output": f"{text_prompt} output", "is_valid": True, "response_time": 0, "n_output_tokens": 0}
+
+    def generate_batch(self, model_inputs):
+        self.batch_sizes.append(len(model_inputs))
+        return [self.generate(*model_args, **model_kwargs) for model_args, model_kwargs in model_inputs]
+
+
+@dataclass
+class TemplatedBatchTestModel(OfflineBatchMixIn, Model):
+    """Stand-in for a self-hosted model that applies a template to its prompts and runs them as a batch. Its tokens are
+    the characters of the templated prompts; the size of every batch is kept track of."""
+
+    batch_sizes: list = field(default_factory=list)
+
+    def prepare_batch_prompt(self, text_prompt, query_images=None, system_message=None):
+        return f"<user>{text_prompt}</user>" if text_prompt else None
+
+    def count_batch_prompt_tokens(self, prompt):
+        return len(prompt)
+
+    def _generate_batch(self, prompts):
+        self.batch_sizes.append(len(prompts))
+        return [{"model_output": f"{prompt} output", "response_time": 0} for prompt in prompts]
+
+    def generate(self, text_prompt, query_images=None, system_message=None):
+        return self.generate_batch([((text_prompt,), {"system_message": system_message})])[0]
+
+
 class TestHFDataReader(HFDataReader):
     def __init__(self, path, **kwargs):
         super().__init__(path, **kwargs)
@@ -278,6 +365,48 @@ class TestMMDataLoader(EarlyStoppableIterable, MMDataLoader):
         self.n_iter = n_iter
 
 
+class LocalContainerClient:
+    """Stand-in for azure.storage.blob.ContainerClient that serves the files of a local directory as blobs,
+    and counts the blobs it downloads."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.downloaded_blobs = []
+        # max_concurrency of the last download
+        self.max_concurrency = None
+        self.lock = threading.Lock()
+
+    def get_blob_client(self, blob_name):
+        return LocalBlobClient(self, blob_name)
+
+    def download_blob(self, blob_name, **kwargs):
+        return self.get_blob_client(blob_name).download_blob(**kwargs)
+
+
+class LocalBlobClient:
+    def __init__(self, container_client, blob_name):
+        self.container_client = container_client
+        self.path = os.path.join(container_client.directory, blob_name)
+        self.blob_name = blob_name
+
+    def get_blob_properties(self):
+        stat = os.stat(self.path)
+        return SimpleNamespace(etag=f"{stat.st_mtime_ns}-{stat.st_size}")
+
+    def download_blob(self, etag=None, match_condition=None, max_concurrency=1):
+        self.container_client.max_concurrency = max_concurrency
+        properties = self.get_blob_properties()
+        if etag is not None and etag != properties.etag:
+            raise ValueError(f"The blob {self.blob_name} was modified.")
+        with self.container_client.lock:
+            self.container_client.downloaded_blobs.append(self.blob_name)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        # small chunks, so that lines and multi-byte characters are split across chunks
+        chunks = lambda: (data[i : i + 64] for i in range(0, len(data), 64))
+        return SimpleNamespace(readall=lambda: data, chunks=chunks, properties=properties)
+
+
 class TestAzureMMDataLoader(EarlyStoppableIterable, AzureMMDataLoader):
     def __init__(self, path, n_iter, account_url, blob_container, image_column_names=None):
         super().__init__(path, account_url, blob_container, image_column_names=image_column_names)
@@ -0,0 +1,61 @@
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from eureka_ml_insights.data_utils import NumpyEncoder
+from eureka_ml_insights.data_utils.dataframe_io import write_jsonl_dataframe
+
+# Usage instructions:
+# Run 'python utils/benchmark_jsonl_writer.py --rows 1000000' from the root of the repository.
+# Compares the rows/s of the per-row iterrows writer that the components used to write their jsonl outputs with
+# write_jsonl_dataframe(), and checks that both write the same bytes.
+
+
+def write_jsonl_iterrows(df, path):
+    with open(path, "w", encoding="utf-8") as writer:
+        for _, row in df.iterrows():
+            content = row.to_dict()
+            writer.write(json.dumps(content, ensure_ascii=False, separators=(",", ":"), cls=NumpyEncoder) + "\n")
+
+
+def make_dataframe(n_rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "data_point_id": np.arange(n_rows) // 5,
+            "data_repeat_id": [f"repeat_{i % 5}" for i in range(n_rows)],
+            "prompt": [f"Question {i}: what is the answer? é" for i in range(n_rows)],
+            "model_output": [f"The answer is {i % 4}." for i in range(n_rows)],
+            "score": rng.random(n_rows),
+            "is_valid": rng.random(n_rows) > 0.1,
+            "usage": [{"prompt_tokens": 12, "completion_tokens": i % 100} for i in range(n_rows)],
+        }
+    )
+
+
+def benchmark(writer, df, path):
+    gc.collect()
+    start = time.perf_counter()
+    writer(df, path)
+    elapsed = time.perf_counter() - start
+    print(f"{writer.__name__}: {elapsed:.1f}s, {len(df) / elapsed:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    df = make_dataframe(args.rows)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        before_path = os.path.join(temp_dir, "before.jsonl")
+        after_path = os.path.join(temp_dir, "after.jsonl")
+        benchmark(write_jsonl_iterrows, df, before_path)
+        benchmark(write_jsonl_dataframe, df, after_path)
+        with open(before_path, "rb") as before, open(after_path, "rb") as after:
+            print("identical outputs:", before.read() == after.read())